@@ -3,24 +3,27 @@
 """
 import asyncio
 import sys
+from contextlib import aclosing
 import os
 from pathlib import Path
 import typer
 from rich.console import Console, Group
-from rich.live import Live
-from rich.markdown import Markdown
 from rich.panel import Panel
 from rich.text import Text
 from rich.style import Style
 from rich.align import Align
 from rich.table import Table
 
+from refrain.core.llm.chat.context import ContextWindow
 from refrain.core.llm.chat.factory import get_llm_backend
+from refrain.core.llm.chat.prompt import PromptBuilder, UsageMeter
+from refrain.core.llm.chat.transport import aclose_http_clients
 from refrain.core.config import (
     user_config, settings, interactive_add_model_async, 
     get_api_key_from_keyring
 )
 from refrain.core.logger import log
+from refrain.utils.ui import AsyncPrompt, StreamRenderer, cancel_on_interrupt
 
 app = typer.Typer(help="与 AI 助手直接对话")
 console = Console()
@@ -35,20 +38,28 @@ def get_minimal_logo():
 
 class ChatSession:
     def __init__(self):
-        self.messages = []
+        # 对话历史按 token 预算管理（预算随当前 Profile 的上下文窗口调整）
+        self.context = ContextWindow()
+        self.prompt = PromptBuilder()  # 系统提示已固定在 context 中，这里只负责规范化
+        self.meter = UsageMeter()
+        self.input = AsyncPrompt("❯ ")
         self.llm = None
         self._load_system_prompt()
-        
+
+    @property
+    def messages(self) -> list[dict]:
+        return self.context.messages
+
     def _load_system_prompt(self):
         try:
             system_path = Path(settings.PROJECT_ROOT) / "src" / "refrain" / "resources" / "system.md"
             if system_path.exists():
                 content = system_path.read_text(encoding="utf-8")
-                self.messages.append({"role": "system", "content": content})
+                self.context.pin({"role": "system", "content": content})
             else:
-                self.messages.append({"role": "system", "content": "You are Refrain, a helpful AI code assistant."})
+                self.context.pin({"role": "system", "content": "You are Refrain, a helpful AI code assistant."})
         except Exception:
-            self.messages.append({"role": "system", "content": "You are Refrain, a helpful AI code assistant."})
+            self.context.pin({"role": "system", "content": "You are Refrain, a helpful AI code assistant."})
 
     def _has_valid_auth(self, profile) -> bool:
         # 如果 api_key_env 看起来像个 Key（以 sk- 开头），判定为配置错误
@@ -104,6 +115,7 @@ class ChatSession:
                 return False
             
             self.llm = get_llm_backend()
+            self.context.budget = ContextWindow.from_profile(profile).budget
             return True
         except Exception as e:
             console.print(f"[red]初始化失败: {e}[/]")
@@ -118,76 +130,106 @@ class ChatSession:
         
         await self._check_and_init_llm()
         
-        while True:
-            try:
-                # 极简 Prompt
-                user_input = console.input("[bold cyan]❯ [/]").strip()
+        try:
+            while True:
+                try:
+                    # 极简 Prompt（异步读取，等待输入时事件循环上的后台任务照常运行）
+                    user_input = (await self.input.ask()).strip()
                 
-                if not user_input:
-                    continue
+                    if not user_input:
+                        continue
                     
-                if user_input.lower() in ["/exit", "exit", "quit", ":q"]:
-                    console.print("[dim]Goodbye.[/]")
-                    break
+                    if user_input.lower() in ["/exit", "exit", "quit", ":q"]:
+                        console.print("[dim]Goodbye.[/]")
+                        break
                     
-                if user_input.lower() == "/clear":
-                    self.messages = [self.messages[0]] if self.messages else []
-                    console.print("[dim]Context cleared.[/]")
-                    continue
+                    if user_input.lower() == "/clear":
+                        self.context.clear()
+                        console.print("[dim]Context cleared.[/]")
+                        continue
 
-                if user_input.lower() == "/config":
-                    new_p = await interactive_add_model_async()
-                    if new_p:
-                        user_config.config.profiles[new_p.name] = new_p
-                        user_config.current_model_name = new_p.name
-                        self.llm = None
-                        console.print("[dim]Profile updated.[/]")
-                    continue
+                    if user_input.lower() == "/usage":
+                        console.print(f"[dim]{self.meter.summary()}[/]")
+                        continue
+
+                    if user_input.lower() == "/stats":
+                        from refrain.core.llm.chat.metrics import MetricsRegistry, get_metrics, metrics_path
+                        from .stats import stats_table
+                        # 已持久化的历史指标 + 本次会话尚未落盘的指标
+                        registry = MetricsRegistry.load(metrics_path())
+                        registry.merge(get_metrics())
+                        console.print(stats_table(registry))
+                        continue
 
-                if not self.llm:
-                    if not await self._check_and_init_llm(): continue
+                    if user_input.lower() == "/config":
+                        new_p = await interactive_add_model_async()
+                        if new_p:
+                            user_config.config.profiles[new_p.name] = new_p
+                            user_config.current_model_name = new_p.name
+                            self.llm = None
+                            console.print("[dim]Profile updated.[/]")
+                        continue
 
-                self.messages.append({"role": "user", "content": user_input})
-                await self._process_response()
+                    if not self.llm:
+                        if not await self._check_and_init_llm(): continue
+
+                    self.context.append({"role": "user", "content": user_input})
+                    await self._process_response()
                 
-            except KeyboardInterrupt:
-                console.print("\n[dim]Use /exit to quit.[/]")
-                continue
-            except EOFError:
-                break
+                except KeyboardInterrupt:
+                    console.print("\n[dim]Use /exit to quit.[/]")
+                    continue
+                except EOFError:
+                    break
+        finally:
+            # 退出会话时释放共享连接池
+            await aclose_http_clients()
 
     async def _process_response(self):
-        full_content = ""
-        full_reasoning = ""
-        
-        # 使用更低调的 Live 状态
-        with Live(Text("Thinking...", style="dim italic"), console=console, transient=True) as live:
-            try:
-                async for chunk in self.llm.stream_chat(self.messages):
-                    if chunk.reasoning_content:
-                        full_reasoning += chunk.reasoning_content
-                    if chunk.content:
-                        full_content += chunk.content
-                    
-                    elements = []
-                    if full_reasoning:
-                        elements.append(Panel(
-                            Text(full_reasoning, style="dim italic"),
-                            title="Thinking", title_align="left",
-                            border_style="dim", padding=(0, 1)
-                        ))
-                    
-                    if full_content:
-                        elements.append(Markdown(full_content))
-                    
-                    if elements:
-                        live.update(Group(*elements))
-                
-                self.messages.append({"role": "assistant", "content": full_content})
-                    
-            except Exception as e:
-                console.print(f"\n[bold red]Error:[/] {e}")
-                log.error(f"Chat Error: {e}")
+        # 发送前按预算裁剪历史（必要时先摘要较早的轮次）
+        messages, _ = self.prompt.build(await self.context.fit(self.llm))
+        partial: list[str] = []
+
+        # 渲染器按固定帧率刷新，已完成的 Markdown 块冻结到滚动区
+        with StreamRenderer(console) as renderer:
+            # 流在独立任务中消费：Ctrl-C 只取消该任务，流的 finally 随即关闭 HTTP 响应
+            task = asyncio.create_task(self._consume_stream(messages, renderer, partial))
+            with cancel_on_interrupt(task) as interrupt:
+                try:
+                    final = await task
+                except asyncio.CancelledError:
+                    if not interrupt.interrupted:
+                        raise
+                    final = None
+                except Exception as e:
+                    console.print(f"\n[bold red]Error:[/] {e}")
+                    log.error(f"Chat Error: {e}")
+                    return
+
+        if final is None:
+            # 保留已生成的部分回答，下一轮可以在此基础上继续
+            console.print("[dim]（已中断）[/]")
+            if partial:
+                self.context.append({"role": "assistant", "content": "".join(partial)})
+            return
+
+        self.meter.add(final.usage)
+        message = {"role": "assistant", "content": final.final_content or ""}
+        if final.final_reasoning:
+            message["reasoning_content"] = final.final_reasoning  # 下一轮开始时由 DropStaleReasoning 移除
+        self.context.append(message)
+
+    async def _consume_stream(self, messages: list[dict], renderer: StreamRenderer, partial: list[str]):
+        """消费流并实时渲染，返回终局帧"""
+        final = None
+        async with aclosing(self.llm.stream_chat(messages, delta_only=True)) as stream:
+            async for chunk in stream:
+                if chunk.final_content is not None:
+                    final = chunk
+                elif chunk.content:
+                    partial.append(chunk.content)
+                renderer.feed(chunk.content, chunk.reasoning_content)
+        return final
 
 @app.callback(invoke_without_command=True)
 def main(ctx: typer.Context):
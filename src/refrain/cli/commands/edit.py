@@ -0,0 +1,148 @@
+"""
+编辑命令 - 由编排器驱动模型读取并修改文件
+修改先暂存在 FileTransaction 中，展示差异并经用户确认后才写入工作区
+"""
+import json
+from contextlib import ExitStack
+from pathlib import Path
+
+from rich.console import Console
+from rich.prompt import Confirm
+
+from refrain.core.llm.chat.factory import get_llm_backend
+from refrain.core.llm.chat.transport import aclose_http_clients
+from refrain.core.logger import log
+from refrain.engine.orchestrator import AgentEvent, Orchestrator, StepTimeoutError
+from refrain.skills import SkillContext, SkillRegistry
+from refrain.utils.fs import FileConflictError, FileTransaction, LockTimeoutError
+from refrain.utils.ui import FileDiff, StreamRenderer
+
+console = Console()
+
+EDIT_SYSTEM_PROMPT = """你是代码编辑助手。使用提供的工具阅读并修改项目文件来完成用户指令：
+- 用 search_code / find_files 定位相关代码，修改前先用 read_file 阅读相关内容，可同时发起多个只读工具调用
+- 优先使用 replace_in_file 做局部修改，只在新建或整体重写时使用 write_file
+- 完成后用一两句话总结所做的修改"""
+
+
+def _describe_call(event: AgentEvent) -> str:
+    call = event.tool_call
+    args = call.function_args.strip()
+    try:
+        args = ", ".join(f"{k}={v!r}"[:80] for k, v in json.loads(args).items())
+    except (json.JSONDecodeError, AttributeError):
+        args = args[:80]
+    return f"{call.function_name}({args})"
+
+
+def _decode_for_diff(data: bytes | None) -> str | None:
+    """用于展示差异的文本：不存在视为空，二进制内容返回 None，非 UTF-8 内容按替换字符解码"""
+    if data is None:
+        return ""
+    if b"\0" in data[:8192]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+def _staged_diffs(root: Path, tx: FileTransaction) -> list[FileDiff]:
+    """事务中暂存的修改相对磁盘当前内容的差异（二进制文件不展示）"""
+    diffs = []
+    for path in tx.paths:
+        before = _decode_for_diff(path.read_bytes() if path.is_file() else None)
+        after = _decode_for_diff(tx.pending(path)[0])
+        if before is None or after is None:
+            continue
+        diff = FileDiff(before, after, path.relative_to(root).as_posix() if root in path.parents else str(path))
+        if diff.changed:
+            diffs.append(diff)
+    return diffs
+
+
+def _confirm(question: str) -> bool:
+    try:
+        return Confirm.ask(question, console=console, default=False)
+    except EOFError:
+        return False
+
+
+def _review_and_apply(root: Path, tx: FileTransaction) -> bool:
+    """展示暂存的修改并询问用户，确认后提交事务；返回是否已应用"""
+    diffs = _staged_diffs(root, tx)
+    if not diffs:
+        return False
+    for diff in diffs:
+        console.print()
+        diff.print(console)
+    console.print()
+    if not _confirm(f"应用以上 {len(diffs)} 个文件的修改?"):
+        console.print("[yellow]已放弃修改，工作区未改动[/]")
+        return False
+    try:
+        tx.commit()
+    except (FileConflictError, LockTimeoutError, OSError) as e:
+        console.print(f"[red]✗ 应用修改失败: {e}[/]")
+        return False
+    console.print(f"[green]✓ 已应用 {len(diffs)} 个文件的修改[/]")
+    return True
+
+
+async def run_edit(file: Path, instruction: str, root: Path | None = None, max_steps: int = 20) -> bool:
+    """
+    以 file 为焦点执行编辑指令，过程实时渲染到终端。
+    模型的写操作只暂存在事务中：结束（或中途出错）后展示差异，用户确认后才写入工作区。
+    模型或工具链出错时打印一行错误并返回 False。
+    """
+    root = (root or Path.cwd()).resolve()
+    file = file.resolve()
+    target = file.relative_to(root).as_posix() if root in file.parents else str(file)
+    tx = FileTransaction()
+    try:
+        orchestrator = Orchestrator(get_llm_backend(), SkillRegistry(SkillContext(root, transaction=tx)),
+                                    EDIT_SYSTEM_PROMPT, max_steps=max_steps)
+    except Exception as e:
+        console.print(f"[red]✗ 初始化失败: {e}[/]")
+        return False
+
+    # 流式渲染区间由 ExitStack 管理：工具调用前关闭，异常时也能正确收尾
+    live = ExitStack()
+    renderer: StreamRenderer | None = None
+    try:
+        async for event in orchestrator.run(f"目标文件: {target}\n指令: {instruction}"):
+            if event.type == "delta":
+                if renderer is None:
+                    renderer = live.enter_context(StreamRenderer(console))
+                renderer.feed(event.content, event.reasoning)
+                continue
+            live.close()
+            renderer = None
+            if event.type == "tool_call":
+                console.print(f"[dim]→ {_describe_call(event)}[/]")
+            elif event.type == "tool_result":
+                outcome = event.outcome
+                mark = "[red]✗[/]" if outcome.error else "[green]✓[/]"
+                detail = f" {outcome.content[:120]}" if outcome.error else ""
+                console.print(f"[dim]{mark} {outcome.call.function_name} {outcome.seconds:.2f}s{detail}[/]")
+            elif event.type == "budget_exhausted":
+                console.print(f"[yellow]⚠ 已达到步数上限 ({max_steps})，任务可能未完成[/]")
+    except StepTimeoutError as e:
+        live.close()
+        console.print(f"[red]✗ 编辑中止: {e}[/]")
+        ok = False
+    except Exception as e:
+        live.close()
+        console.print(f"[red]✗ 编辑失败: {type(e).__name__}: {e}[/]")
+        log.error(f"Edit Error: {type(e).__name__}: {e}")
+        ok = False
+    else:
+        ok = True
+    finally:
+        live.close()
+        orchestrator.close()
+        # 与对话会话一致：事件循环结束前释放共享连接池
+        await aclose_http_clients()
+
+    # 中途失败时已暂存的修改同样交给用户决定；Ctrl-C 中断则直接丢弃
+    _review_and_apply(root, tx)
+    if orchestrator.meter.requests:
+        console.print(f"[dim]{orchestrator.meter.summary()}[/]")
+    return ok
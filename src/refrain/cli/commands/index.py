@@ -0,0 +1,67 @@
+"""
+代码库索引子命令模块
+增量构建项目的语义索引（遵循 .gitignore，只重新计算变化的代码块）
+"""
+import asyncio
+from pathlib import Path
+import typer
+from rich.console import Console
+from rich.table import Table
+
+app = typer.Typer(help="构建与检索项目代码索引")
+console = Console()
+
+
+def _make_embedder(kind: str):
+    if kind == "local":
+        from refrain.core.llm.vector import HashingEmbedder
+        return HashingEmbedder()
+    if kind == "openai":
+        from refrain.core.llm.vector import get_embedder
+        return get_embedder()
+    console.print(f"[red]错误: 未知的向量模型 '{kind}'，可选: local, openai[/]")
+    raise typer.Exit(code=1)
+
+
+@app.command()
+def index(
+    path: Path = typer.Argument(Path("."), exists=True, file_okay=False, help="项目根目录"),
+    rebuild: bool = typer.Option(False, "--rebuild", help="丢弃已有索引并全量重建"),
+    embedder: str = typer.Option("local", "--embedder", "-e", help="向量模型: local (离线) | openai (使用 EMBEDDING_PROFILE 指定的 Profile)"),
+    search: str | None = typer.Option(None, "--search", "-s", help="索引完成后执行一次语义检索"),
+    top_k: int = typer.Option(5, "--top-k", "-k", help="检索返回的结果数"),
+    mode: str = typer.Option("auto", "--mode", "-m", help="检索模式: auto | hybrid | lexical | vector"),
+):
+    """增量索引项目代码"""
+    from refrain.engine.indexer import Indexer
+
+    indexer = Indexer(path, _make_embedder(embedder))
+
+    async def main():
+        try:
+            with console.status("[cyan]正在索引...[/]") as status:
+                stats = await indexer.run(
+                    rebuild=rebuild,
+                    on_progress=lambda s: status.update(f"[cyan]正在索引... 已写入 {s.chunks_embedded} 个代码块[/]"),
+                )
+            console.print(
+                f"[green]✓ 索引完成[/] [dim]{stats.seconds:.2f}s | 扫描 {stats.scanned} 个文件，"
+                f"变更 {stats.changed}，删除 {stats.removed} | 新向量 {stats.chunks_embedded}，"
+                f"复用 {stats.chunks_reused}[/]"
+            )
+            if search:
+                hits = await indexer.search(search, k=top_k, mode=mode)
+                table = Table(title=f"检索: {search}")
+                table.add_column("得分", style="yellow")
+                table.add_column("位置", style="cyan")
+                table.add_column("名称", style="magenta")
+                for hit in hits:
+                    meta = hit["metadata"]
+                    table.add_row(f"{hit['score']:.3f}", f"{meta['path']}:{meta.get('start', '?')}", meta["name"])
+                console.print(table)
+        finally:
+            indexer.close()
+            from refrain.core.llm.chat.transport import aclose_http_clients
+            await aclose_http_clients()
+
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""
+请求指标子命令模块
+按 Profile 展示模型请求的延迟分布（TTFT、输出速率、块间间隔、渲染耗时、重试）
+"""
+from pathlib import Path
+import typer
+from rich.console import Console
+from rich.table import Table
+
+app = typer.Typer(help="查看模型请求延迟统计")
+console = Console()
+
+
+def _fmt(value: float | None, unit: str = "s") -> str:
+    if value is None:
+        return "-"
+    if unit == "s":
+        return f"{value * 1000:.0f}ms" if value < 1 else f"{value:.2f}s"
+    return f"{value:.1f}"
+
+
+# (直方图, 展示名称, 单位)
+ROWS = [
+    ("ttft", "首 token", "s"),
+    ("ttft_tool", "首个工具调用", "s"),
+    ("tokens_per_sec", "tokens/s", "rate"),
+    ("chunk_gap", "块间间隔 (上游)", "s"),
+    ("consume", "帧处理 (本地)", "s"),
+    ("duration", "总耗时", "s"),
+]
+
+
+def stats_table(registry) -> Table:
+    """渲染指标表格：每个 Profile 一列，延迟行为 p50 / p99（按行排列，窄终端下也不会被截断）"""
+    names = sorted(registry.profiles)
+    table = Table(title="Refrain 模型请求指标 (p50 / p99)")
+    table.add_column("指标", style="cyan")
+    for name in names:
+        table.add_column(name, justify="right", style="magenta")
+
+    profiles = [registry.profiles[n] for n in names]
+    table.add_row("请求 / 失败 / 重试", *(f"{s.requests} / {s.errors} / {s.retries}" for s in profiles))
+    for key, label, unit in ROWS:
+        cells = []
+        for s in profiles:
+            hist = s.histograms.get(key)
+            if hist is None or not hist.count:
+                cells.append("-")
+            else:
+                cells.append(f"{_fmt(hist.percentile(0.5), unit)} / {_fmt(hist.percentile(0.99), unit)}")
+        table.add_row(label, *cells)
+    return table
+
+
+@app.command()
+def stats(
+    prometheus: Path | None = typer.Option(None, "--prometheus", "-p", help="导出为 Prometheus textfile"),
+    reset: bool = typer.Option(False, "--reset", help="清空已累计的指标"),
+):
+    """查看各模型 Profile 的请求延迟统计"""
+    from refrain.core.llm.chat.metrics import MetricsRegistry, metrics_path
+
+    path = metrics_path()
+    if reset:
+        path.unlink(missing_ok=True)
+        console.print("[green]✓ 已清空请求指标[/]")
+        return
+
+    registry = MetricsRegistry.load(path)
+    if not registry.profiles:
+        console.print("[dim]暂无请求指标，使用 rf chat / rf edit 后再查看。[/]")
+        return
+    console.print(stats_table(registry))
+    if prometheus:
+        registry.write_textfile(prometheus)
+        console.print(f"[dim]已导出 Prometheus textfile: {prometheus}[/]")
@@ -0,0 +1,58 @@
+"""
+惰性子命令注册 - 子命令按名称登记，仅在真正调用时才导入对应模块
+
+`rf --help` 只需要名称与帮助文本，因此占位命令只有在 make_context（即真正执行或查看子命令帮助）时
+才导入模块并转换为真实的命令对象。
+"""
+import importlib
+import typer
+from typer.core import TyperCommand, TyperGroup
+
+# 名称 -> (模块路径, 帮助文本)
+LAZY_COMMANDS: dict[str, tuple[str, str]] = {}
+
+
+def lazy_command(name: str, import_path: str, help: str = ""):
+    """登记一个惰性子命令，模块需暴露名为 `app` 的 typer.Typer 实例"""
+    LAZY_COMMANDS[name] = (import_path, help)
+
+
+class LazyCommand(TyperCommand):
+    """惰性命令占位：帮助列表只读取登记的文本，执行时才加载真实命令"""
+
+    def __init__(self, name: str, import_path: str, help: str = ""):
+        super().__init__(name=name, help=help)
+        self.import_path = import_path
+        self._real = None
+
+    def load(self):
+        if self._real is None:
+            module = importlib.import_module(self.import_path)
+            command = typer.main.get_command(module.app)
+            command.name = self.name
+            self._real = command
+        return self._real
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        return self.load().make_context(info_name, args, parent=parent, **extra)
+
+
+class LazyTyperGroup(TyperGroup):
+    """在 TyperGroup 已注册命令的基础上追加 LAZY_COMMANDS 中的惰性命令"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lazy: dict[str, LazyCommand] = {}
+
+    def list_commands(self, ctx: typer.Context) -> list[str]:
+        names = super().list_commands(ctx)
+        return [n for n in LAZY_COMMANDS if n not in names] + names
+
+    def get_command(self, ctx: typer.Context, cmd_name: str):
+        command = super().get_command(ctx, cmd_name)
+        if command is not None or cmd_name not in LAZY_COMMANDS:
+            return command
+        if cmd_name not in self._lazy:
+            import_path, help_text = LAZY_COMMANDS[cmd_name]
+            self._lazy[cmd_name] = LazyCommand(cmd_name, import_path, help_text)
+        return self._lazy[cmd_name]
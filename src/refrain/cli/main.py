@@ -4,20 +4,19 @@ CLI 主入口 - 命令行应用定义与子命令注册中心
 import typer
 from pathlib import Path
 from rich.console import Console
-from rich.panel import Panel
-from rich.markdown import Markdown
 
-# 导入子命令模块
-from .commands import model, chat
+from .lazy import LazyTyperGroup, lazy_command
 
-app = typer.Typer(help="Refrain: Python AI Code Assistant")
+app = typer.Typer(cls=LazyTyperGroup, help="Refrain: Python AI Code Assistant")
 console = Console()
 
-# ========== 子命令注册中心 ==========
-app.add_typer(model.app, name="model", help="模型管理")
-app.add_typer(chat.app, name="chat", help="交互式聊天")
-# app.add_typer(config.app, name="config", help="配置管理")  # 未来
-# app.add_typer(project.app, name="project", help="项目分析")  # 未来
+# ========== 子命令注册中心 (按名称登记，调用时才导入模块) ==========
+lazy_command("model", "refrain.cli.commands.model", help="模型管理")
+lazy_command("chat", "refrain.cli.commands.chat", help="交互式聊天")
+lazy_command("index", "refrain.cli.commands.index", help="代码库索引")
+lazy_command("stats", "refrain.cli.commands.stats", help="请求延迟统计")
+# lazy_command("config", "refrain.cli.commands.config", help="配置管理")  # 未来
+# lazy_command("project", "refrain.cli.commands.project", help="项目分析")  # 未来
 
 
 @app.callback(invoke_without_command=True)
@@ -39,14 +38,13 @@ def edit(
     instruction: str = typer.Argument(..., help="修改指令"),
 ):
     """编辑指定文件"""
+    import asyncio
+    from .commands.edit import run_edit
+
     console.print(f"[bold blue]Refrain[/] 正在分析 {file.name}...")
     console.print(f"[dim]指令: {instruction}[/]")
-    
-    # TODO: 调用 orchestrator 进行实际处理
-    # from ...engine.orchestrator import orchestrator
-    # reasoning, new_code = orchestrator.process_task(file, instruction)
-    
-    console.print("[yellow]⚠ 功能开发中...[/]")
+    if not asyncio.run(run_edit(file, instruction)):
+        raise typer.Exit(1)
 
 
 @app.command()
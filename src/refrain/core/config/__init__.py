@@ -1,14 +1,24 @@
 # 配置模块导出
+# Settings / settings / user_config 为惰性对象，首次访问时才导入或创建
+from . import config as _config
 from .config import (
-    Settings, ModelProfile, AppConfig,
-    ConfigManager, user_config, settings,
+    ModelProfile, AppConfig, ConfigManager,
+    get_settings, get_user_config,
     interactive_add_model, interactive_add_model_async,
-    save_api_key_to_keyring, get_api_key_from_keyring,
+    save_api_key_to_keyring, get_api_key_from_keyring, resolve_api_key,
 )
 
+
+def __getattr__(name: str):
+    if name in ("Settings", "settings", "user_config"):
+        return getattr(_config, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 __all__ = [
     "Settings", "ModelProfile", "AppConfig",
     "ConfigManager", "user_config", "settings",
+    "get_settings", "get_user_config",
     "interactive_add_model", "interactive_add_model_async",
-    "save_api_key_to_keyring", "get_api_key_from_keyring",
+    "save_api_key_to_keyring", "get_api_key_from_keyring", "resolve_api_key",
 ]
@@ -5,28 +5,16 @@
 - ModelProfile / AppConfig Pydantic 模型
 - ConfigManager 配置持久化（YAML）
 - 交互式配置命令（Questionary）
+
+`settings` / `user_config` 在首次访问时才创建（模块级 __getattr__），
+yaml、keyring 等依赖也只在真正读写配置时导入，保证 CLI 启动足够快。
 """
 from pathlib import Path
-from typing import Any
-import yaml
-import keyring
+from typing import TYPE_CHECKING, Any
 from pydantic import BaseModel, Field, computed_field
-from pydantic_settings import BaseSettings, SettingsConfigDict
-
-# ============ 系统配置 (不可修改) ============
 
-class Settings(BaseSettings):
-    """不可修改的系统配置，从 .env 读取"""
-    PROJECT_NAME: str = "Refrain"
-    DEBUG: bool = False
-    ENV: str = "development"
-    PROJECT_ROOT: str = str(Path(__file__).resolve().parents[4])
-    DEFAULT_LLM_MODEL: str = "deepseek-chat"
-    OPENAI_API_KEY: str = ""
-    OPENAI_API_BASE: str = "https://api.openai.com/v1"
-    LOG_LEVEL: str = "INFO"
-
-    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
+if TYPE_CHECKING:
+    from .system import Settings
 
 
 # ============ 用户配置 (可修改) ============
@@ -40,6 +28,9 @@ class ModelProfile(BaseModel):
     base_url: str | None = Field(None, description="自定义 API 基础地址")
     temperature: float = 0.7
     timeout: float = 60.0
+    rpm: int | None = Field(None, description="每分钟请求数上限（批量调度限流）")
+    tpm: int | None = Field(None, description="每分钟 Token 数上限（批量调度限流）")
+    context_window: int = Field(64_000, description="上下文窗口大小（token），决定对话历史的预算")
     extra_params: dict[str, Any] = Field(default_factory=dict)
 
     @computed_field
@@ -60,6 +51,8 @@ class ModelProfile(BaseModel):
 class AppConfig(BaseModel):
     """Refrain 整体应用配置"""
     current_model: str = "deepseek"
+    # 故障转移链：非空时默认后端为路由后端，按 current_model → fallback_models 的顺序重试 / 对冲 / 转移
+    fallback_models: list[str] = Field(default_factory=list)
 
     profiles: dict[str, ModelProfile] = Field(default_factory=lambda: {
         "deepseek": ModelProfile(
@@ -98,6 +91,7 @@ class ConfigManager:
 
     def _load(self) -> AppConfig:
         """从 YAML 加载配置"""
+        import yaml
         try:
             with open(self.CONFIG_FILE, "r", encoding="utf-8") as f:
                 data = yaml.safe_load(f) or {}
@@ -107,6 +101,7 @@ class ConfigManager:
 
     def save(self, config: AppConfig | None = None):
         """保存配置到 YAML"""
+        import yaml
         target = config or self.config
         with open(self.CONFIG_FILE, "w", encoding="utf-8") as f:
             yaml.dump(target.model_dump(mode="python"), f, allow_unicode=True, sort_keys=False)
@@ -196,6 +191,7 @@ def interactive_add_model() -> ModelProfile | None:
 def save_api_key_to_keyring(service: str, key: str) -> bool:
     """安全保存 API Key 到系统钥匙串"""
     try:
+        import keyring
         keyring.set_password(service, "api_key", key)
         return True
     except Exception as e:
@@ -206,19 +202,71 @@ def save_api_key_to_keyring(service: str, key: str) -> bool:
 def get_api_key_from_keyring(service: str) -> str | None:
     """从系统钥匙串读取 API Key"""
     try:
+        import keyring
         return keyring.get_password(service, "api_key")
     except Exception:
         return None
 
 
-# ============ 导出 ============
-
-settings = Settings()
-user_config = ConfigManager()
+def resolve_api_key(
+    api_key: str | None = None,
+    api_key_env: str | None = None,
+    service_id: str | None = None,
+) -> str:
+    """
+    按统一优先级解析 API Key（对话与向量后端共用）：
+    直接传入的 api_key > 指定的 api_key_env > 系统 Keyring > 默认 settings.OPENAI_API_KEY
+    """
+    from os import getenv
+
+    actual_api_key = api_key
+    # 1. 尝试环境变量
+    if not actual_api_key and api_key_env:
+        actual_api_key = getenv(api_key_env)
+    # 2. 尝试 Keyring (如果 api_key_env 为空字符串或 "keyring")
+    if not actual_api_key and (not api_key_env or api_key_env == "keyring"):
+        actual_api_key = get_api_key_from_keyring(service_id or "refrain")
+    return actual_api_key or get_settings().OPENAI_API_KEY
+
+
+# ============ 导出 (首次访问时创建) ============
+
+_settings: "Settings | None" = None
+_user_config: ConfigManager | None = None
+
+
+def get_settings() -> "Settings":
+    """获取全局系统配置（首次调用时从 .env 加载）"""
+    global _settings
+    if _settings is None:
+        from .system import Settings
+        _settings = Settings()
+    return _settings
+
+
+def get_user_config() -> ConfigManager:
+    """获取全局用户配置管理器（首次调用时读取 ~/.refrain/config.yaml）"""
+    global _user_config
+    if _user_config is None:
+        _user_config = ConfigManager()
+    return _user_config
+
+
+def __getattr__(name: str):
+    # 兼容 `from refrain.core.config import settings, user_config` 的写法
+    if name == "settings":
+        return get_settings()
+    if name == "Settings":
+        from .system import Settings
+        return Settings
+    if name == "user_config":
+        return get_user_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __all__ = [
     "Settings", "ModelProfile", "AppConfig",
     "ConfigManager", "user_config", "settings",
+    "get_settings", "get_user_config",
     "interactive_add_model", "interactive_add_model_async",
     "save_api_key_to_keyring", "get_api_key_from_keyring",
 ]
@@ -0,0 +1,32 @@
+"""
+系统配置 - 从 .env 读取的只读设置
+
+单独成模块，使 pydantic_settings 只在真正需要系统配置时才被导入。
+"""
+from pathlib import Path
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+# ============ 系统配置 (不可修改) ============
+
+class Settings(BaseSettings):
+    """不可修改的系统配置，从 .env 读取"""
+    PROJECT_NAME: str = "Refrain"
+    DEBUG: bool = False
+    ENV: str = "development"
+    PROJECT_ROOT: str = str(Path(__file__).resolve().parents[4])
+    DEFAULT_LLM_MODEL: str = "deepseek-chat"
+    OPENAI_API_KEY: str = ""
+    OPENAI_API_BASE: str = "https://api.openai.com/v1"
+    LOG_LEVEL: str = "INFO"
+    LLM_CACHE: str = "off"  # off | memory | disk | replay
+    LLM_CACHE_TTL: float = 7 * 24 * 3600
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_PROFILE: str = ""  # 提供 /embeddings 接口的 Profile 别名；为空时使用本地哈希向量模型
+    EMBEDDING_CACHE: bool = True  # 向量按内容哈希缓存到 ~/.refrain/cache/embeddings.sqlite
+    CHAT_TRACE: bool = False  # 每次模型调用以 JSONL 记录到 logs/trace/
+    CHAT_TRACE_COMPRESSION: str = "gzip"  # none | gzip | zstd，滚动后的追踪文件压缩方式
+    LLM_METRICS: bool = True  # 按 Profile 记录请求延迟指标，`rf stats` 查看
+    LLM_METRICS_TEXTFILE: str = ""  # 非空时在进程退出时导出 Prometheus textfile
+
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Any, Type, TypeVar, AsyncGenerator
+from typing import Any, Type, TypeVar, AsyncGenerator, Callable
 from pydantic import BaseModel
 from .schemas import LLMResponse
+from .batch import BatchResult, RateLimiter, run_batch
+from .tokens import estimate_messages_tokens, estimate_tokens
 
 # 定义泛型，用于结构化输出的类型推导
 T = TypeVar("T", bound=BaseModel)
@@ -10,6 +12,8 @@ class BaseLLM(ABC):
     """
     对话模型基类 (支持双轨制：自由对话 + 结构化任务)
     """
+    # 供应商级限流器 (RPM/TPM)，由具体实现按 ModelProfile 配置
+    rate_limiter: RateLimiter | None = None
     @abstractmethod
     async def chat(
         self, 
@@ -50,8 +54,67 @@ class BaseLLM(ABC):
         轨道 3：流式输出 (前端展示)
         适用于：打字机效果的实时聊天，同样支持流式过程中的工具调用。
         返回：包含增量内容或元数据的 LLMResponse 块
+        可选：delta_only=True 时增量帧只携带增量文本，工具调用仅在终局帧中给出
         """
         pass
 
     # 轨道 4 (规划中)：流式结构化输出 (stream_structured_chat)
     # 目前考虑到实现复杂度与依赖，暂时不作为 Base 强制要求。
+
+    # ---------- 批量接口 (基于以上轨道的通用实现) ----------
+
+    async def batch_chat(
+        self,
+        conversations: list[list[dict[str, Any]]],
+        concurrency: int = 8,
+        on_done: Callable[[int, Any], None] | None = None,
+        **kwargs
+    ) -> BatchResult[LLMResponse]:
+        """
+        批量自由对话：有界并发执行，受供应商 RPM/TPM 限流约束。
+        返回与输入顺序一致的结果，单个失败记录在 errors 中而不会中断整批。
+        """
+        limiter = self.rate_limiter
+        costs = [estimate_messages_tokens(m) for m in conversations]
+
+        def make_job(i: int):
+            async def job() -> LLMResponse:
+                response = await self.chat(conversations[i], **kwargs)
+                if limiter:
+                    usage = response.usage or {}
+                    limiter.settle(costs[i], usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0))
+                return response
+            return job
+
+        return await run_batch(
+            [make_job(i) for i in range(len(conversations))],
+            concurrency=concurrency, limiter=limiter, costs=costs, on_done=on_done,
+        )
+
+    async def batch_structured_chat(
+        self,
+        conversations: list[list[dict[str, Any]]],
+        response_model: Type[T],
+        concurrency: int = 8,
+        on_done: Callable[[int, Any], None] | None = None,
+        **kwargs
+    ) -> BatchResult[T]:
+        """
+        批量结构化任务：适用于大规模分类、抽取。
+        结构化结果不带 usage，完成后按 提示词预估 + 输出对象的预估 token 数校正 TPM 桶。
+        """
+        limiter = self.rate_limiter
+        costs = [estimate_messages_tokens(m) for m in conversations]
+
+        def make_job(i: int):
+            async def job() -> T:
+                result = await self.structured_chat(conversations[i], response_model, **kwargs)
+                if limiter:
+                    limiter.settle(costs[i], costs[i] + estimate_tokens(result.model_dump_json()))
+                return result
+            return job
+
+        return await run_batch(
+            [make_job(i) for i in range(len(conversations))],
+            concurrency=concurrency, limiter=limiter, costs=costs, on_done=on_done,
+        )
@@ -0,0 +1,140 @@
+"""
+批量调度 - 有界并发 + RPM/TPM 令牌桶限流
+
+- run_batch：固定数量的 worker 从任务序列中拉取任务，结果按输入顺序返回，单个失败不影响其他任务
+- RateLimiter：按 (base_url, model) 进程级共享，多个批任务同时运行时也不会突破供应商配额
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Generic, Sequence, TypeVar
+
+R = TypeVar("R")
+
+
+class TokenBucket:
+    """令牌桶：容量为每分钟配额，按秒匀速补充"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self._updated = time.monotonic()
+        # 进程级共享的桶会跨多次 asyncio.run 使用，锁按事件循环惰性创建，避免绑定到已关闭的循环
+        self._locks: dict[asyncio.AbstractEventLoop, asyncio.Lock] = {}
+
+    def _lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        lock = self._locks.get(loop)
+        if lock is None:
+            for stale in [l for l in self._locks if l.is_closed()]:
+                del self._locks[stale]
+            lock = self._locks[loop] = asyncio.Lock()
+        return lock
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        """等待直到可以扣除 amount 个令牌（单次请求超过容量时按容量计）"""
+        amount = min(amount, self.capacity)
+        async with self._lock():  # 排队等待，先到先得
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def consume(self, amount: float):
+        """不等待直接扣除（可为负，用于按实际用量补扣）"""
+        self._refill()
+        self.tokens -= amount
+
+
+class RateLimiter:
+    """RPM / TPM 组合限流器"""
+
+    def __init__(self, rpm: int | None = None, tpm: int | None = None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+    async def acquire(self, estimated_tokens: int = 0):
+        if self.requests:
+            await self.requests.acquire(1)
+        if self.tokens and estimated_tokens:
+            await self.tokens.acquire(estimated_tokens)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """请求完成后按实际用量校正 TPM 桶"""
+        if self.tokens and actual_tokens > estimated_tokens:
+            self.tokens.consume(actual_tokens - estimated_tokens)
+
+
+_limiters: dict[tuple, RateLimiter] = {}
+
+
+def get_rate_limiter(key: tuple, rpm: int | None = None, tpm: int | None = None) -> RateLimiter | None:
+    """获取进程级共享的限流器，未配置 rpm/tpm 时返回 None"""
+    if not rpm and not tpm:
+        return None
+    full_key = (*key, rpm, tpm)
+    if full_key not in _limiters:
+        _limiters[full_key] = RateLimiter(rpm, tpm)
+    return _limiters[full_key]
+
+
+@dataclass
+class BatchResult(Generic[R]):
+    """批量结果：results 与输入一一对应，失败位置为 None，异常记录在 errors 中"""
+    results: list[R | None]
+    errors: dict[int, BaseException] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def successful(self) -> list[tuple[int, R]]:
+        return [(i, r) for i, r in enumerate(self.results) if i not in self.errors]
+
+    def raise_for_errors(self):
+        """存在失败时抛出第一个异常"""
+        if self.errors:
+            index = min(self.errors)
+            raise self.errors[index]
+
+
+async def run_batch(
+    jobs: Sequence[Callable[[], Awaitable[R]]],
+    concurrency: int = 8,
+    limiter: RateLimiter | None = None,
+    costs: Sequence[int] | None = None,
+    on_done: Callable[[int, Any], None] | None = None,
+) -> BatchResult[R]:
+    """
+    以有界并发执行一组任务。
+    costs：每个任务预估的 token 数（用于 TPM 限流）；on_done(index, 结果或异常) 用于进度汇报。
+    """
+    results: list[R | None] = [None] * len(jobs)
+    errors: dict[int, BaseException] = {}
+    pending = iter(range(len(jobs)))
+
+    async def worker():
+        for i in pending:
+            cost = costs[i] if costs else 0
+            try:
+                if limiter:
+                    await limiter.acquire(cost)
+                results[i] = await jobs[i]()
+                outcome: Any = results[i]
+            except Exception as e:
+                errors[i] = e
+                outcome = e
+            if on_done:
+                on_done(i, outcome)
+
+    workers = max(1, min(concurrency, len(jobs)))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return BatchResult(results=results, errors=errors)
@@ -0,0 +1,290 @@
+"""
+响应缓存层 - 为任意 BaseLLM 提供请求级缓存
+
+- 缓存键：请求内容（类型、Profile、模型、消息、工具、参数）的规范化 JSON 的 SHA-256，
+  不含后端的包装层次，开关 LLM_METRICS 不会使缓存失效
+- 内存层：带 TTL 的 LRU
+- 磁盘层（可选）：~/.refrain/cache/llm.sqlite，跨进程复用（CI、重复的意图识别）
+- 回放模式：只读缓存，未命中直接报错，用于离线、确定性的测试；
+  流式请求命中时以合成的增量帧回放，帧语义与供应商一致（工具调用在正文之后逐个完成）
+
+启用方式：.env 中设置 LLM_CACHE=memory | disk | replay（默认 off）
+"""
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import aclosing
+from pathlib import Path
+from typing import Any, AsyncGenerator, Type, TypeVar
+from pydantic import BaseModel
+
+from refrain.core.logger import log
+from .base import BaseLLM
+from .schemas import LLMResponse
+
+T = TypeVar("T", bound=BaseModel)
+
+# 不影响模型输出的参数，不参与缓存键计算
+NON_SEMANTIC_KWARGS = {"delta_only"}
+
+CACHE_MODES = ("off", "memory", "disk", "replay")
+
+
+class CacheMissError(LookupError):
+    """回放模式下请求未命中缓存"""
+
+
+def request_key(kind: str, payload: dict[str, Any]) -> str:
+    """计算请求的规范化哈希"""
+    canonical = json.dumps(
+        {"kind": kind, **payload},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """带 TTL 的 LRU 内存缓存"""
+
+    def __init__(self, maxsize: int = 256, ttl: float | None = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def get(self, key: str) -> str | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        created, value = entry
+        if self.ttl is not None and time.time() - created > self.ttl:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, created: float | None = None):
+        self._data[key] = (created or time.time(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
+class DiskCache:
+    """基于 SQLite 的持久化缓存"""
+
+    def __init__(self, path: Path | str, ttl: float | None = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> tuple[float, str] | None:
+        row = self._conn.execute("SELECT created, value FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if self.ttl is not None and time.time() - row[0] > self.ttl:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+            return None
+        return row
+
+    def set(self, key: str, value: str):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, created) VALUES (?, ?, ?)",
+            (key, value, time.time()),
+        )
+        self._conn.commit()
+
+    def clear(self):
+        self._conn.execute("DELETE FROM cache")
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+class CachedLLM(BaseLLM):
+    """
+    缓存装饰后端：包装任意 BaseLLM，相同请求直接返回缓存结果。
+    replay=True 时只读缓存，未命中抛出 CacheMissError。
+    profile 为缓存键中的配置名称，未指定时使用后端的默认模型。
+    """
+
+    def __init__(
+        self,
+        backend: BaseLLM,
+        memory: MemoryCache | None = None,
+        disk: DiskCache | None = None,
+        replay: bool = False,
+        replay_chunk_size: int = 32,
+        profile: str | None = None,
+    ):
+        self.backend = backend
+        self.profile = profile or getattr(backend, "default_model", None)
+        self.memory = memory if memory is not None else MemoryCache()
+        self.disk = disk
+        self.replay = replay
+        self.replay_chunk_size = replay_chunk_size
+
+    def __getattr__(self, name: str):
+        # default_model 等属性透传给被包装的后端
+        return getattr(self.backend, name)
+
+    @property
+    def rate_limiter(self):
+        return self.backend.rate_limiter
+
+    # ---------- 缓存读写 ----------
+
+    def _key(self, kind: str, messages: list[dict[str, Any]], **payload: Any) -> str:
+        kwargs = {k: v for k, v in payload.pop("kwargs", {}).items() if k not in NON_SEMANTIC_KWARGS}
+        return request_key(kind, {
+            "profile": self.profile,
+            "base_url": getattr(self.backend, "base_url", None),
+            "model": kwargs.pop("model", getattr(self.backend, "default_model", None)),
+            "messages": messages,
+            "kwargs": kwargs,
+            **payload,
+        })
+
+    def _get(self, key: str) -> str | None:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            row = self.disk.get(key)
+            if row is not None:
+                created, value = row
+                self.memory.set(key, value, created)
+        if value is None and self.replay:
+            raise CacheMissError(f"回放模式下缓存未命中: {key[:12]}")
+        if value is not None:
+            log.debug(f"LLM 缓存命中 | key: {key[:12]}")
+        return value
+
+    def _set(self, key: str, value: str):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    # ---------- 三条轨道 ----------
+
+    async def chat(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+        tool_choice: str | dict = "auto",
+        **kwargs
+    ) -> LLMResponse:
+        key = self._key("chat", messages, tools=tools, tool_choice=tool_choice, kwargs=kwargs)
+        cached = self._get(key)
+        if cached is not None:
+            return LLMResponse.model_validate_json(cached)
+        response = await self.backend.chat(messages, tools=tools, tool_choice=tool_choice, **kwargs)
+        self._set(key, response.model_dump_json())
+        return response
+
+    async def structured_chat(
+        self,
+        messages: list[dict[str, Any]],
+        response_model: Type[T],
+        **kwargs
+    ) -> T:
+        key = self._key(
+            "structured", messages,
+            schema=response_model.model_json_schema(), kwargs=kwargs,
+        )
+        cached = self._get(key)
+        if cached is not None:
+            return response_model.model_validate_json(cached)
+        result = await self.backend.structured_chat(messages, response_model, **kwargs)
+        if result is not None:  # 解析失败时不缓存，下次仍会请求
+            self._set(key, result.model_dump_json())
+        return result
+
+    async def stream_chat(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+        tool_choice: str | dict = "auto",
+        **kwargs
+    ) -> AsyncGenerator[LLMResponse, None]:
+        key = self._key("stream", messages, tools=tools, tool_choice=tool_choice, kwargs=kwargs)
+        cached = self._get(key)
+        if cached is not None:
+            final = LLMResponse.model_validate_json(cached)
+            for frame in self._replay_frames(final, kwargs.get("delta_only", False)):
+                yield frame
+            return
+
+        stream = self.backend.stream_chat(messages, tools=tools, tool_choice=tool_choice, **kwargs)
+        async with aclosing(stream):  # 提前停止消费时同步关闭底层流
+            async for frame in stream:
+                if frame.final_content is not None:
+                    # 只缓存完整结束的流
+                    self._set(key, frame.model_dump_json())
+                yield frame
+
+    def _replay_frames(self, final: LLMResponse, delta_only: bool):
+        """
+        将缓存的终局帧拆分为合成的增量帧序列，帧语义与 StreamAccumulator.delta_frame 一致：
+        先输出思考链与正文，随后每个工具调用一帧，帧中只附带已完成的调用（delta_only 时不附带），
+        finish_reason 出现在最后一个增量帧上。
+        """
+        size = self.replay_chunk_size
+        reasoning = final.final_reasoning or ""
+        content = final.final_content or ""
+        calls = final.tool_calls or []
+        frames = [
+            LLMResponse(reasoning_content=reasoning[i:i + size], is_delta=True)
+            for i in range(0, len(reasoning), size)
+        ]
+        frames += [LLMResponse(content=content[i:i + size], is_delta=True) for i in range(0, len(content), size)]
+        frames += [
+            LLMResponse(is_delta=True, tool_calls=None if delta_only else calls[:n], tool_calls_started=n)
+            for n in range(1, len(calls) + 1)
+        ]
+        if frames:
+            frames[-1].finish_reason = final.finish_reason
+        yield from frames
+        yield final
+
+
+# ============ 工厂集成 ============
+
+_memory_cache: MemoryCache | None = None
+_disk_cache: DiskCache | None = None
+
+
+def cache_dir() -> Path:
+    from refrain.core.config import ConfigManager
+    return ConfigManager.CONFIG_DIR / "cache"
+
+
+def wrap_with_cache(backend: BaseLLM, mode: str, ttl: float | None = None, profile: str | None = None) -> BaseLLM:
+    """按模式为后端套上缓存层，各后端共享同一组缓存存储"""
+    global _memory_cache, _disk_cache
+    if mode not in CACHE_MODES:
+        raise ValueError(f"未知的缓存模式 '{mode}'，可选: {', '.join(CACHE_MODES)}")
+    if mode == "off":
+        return backend
+
+    if _memory_cache is None:
+        _memory_cache = MemoryCache(ttl=ttl)
+    if mode in ("disk", "replay") and _disk_cache is None:
+        _disk_cache = DiskCache(cache_dir() / "llm.sqlite", ttl=ttl)
+
+    return CachedLLM(
+        backend,
+        memory=_memory_cache,
+        disk=_disk_cache if mode in ("disk", "replay") else None,
+        replay=mode == "replay",
+        profile=profile,
+    )
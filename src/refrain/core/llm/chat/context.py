@@ -0,0 +1,241 @@
+"""
+上下文窗口管理 - 让长会话的请求体积保持在固定预算内
+
+- 每条消息的 token 数在追加时估算一次并缓存，总量增量维护，检查预算为 O(1)
+- 预算来自 ModelProfile.context_window（扣除为输出预留的 token）
+- 发送前依次执行可插拔的策略：
+    DropStaleReasoning  去掉早于最近一轮的 reasoning_content（始终执行）
+    SummarizeOldTurns   超出预算时用 structured_chat 把较早的若干轮滚动合并进摘要
+    SlidingWindow       仍超出预算时按整轮丢弃最早的对话（兜底，始终保留系统提示与最后一轮）
+- 裁剪一次性降到低水位（budget * low_water），之后若干轮内前缀保持不变，不会每轮都触发裁剪
+"""
+from typing import Any, Protocol, Sequence
+
+from pydantic import BaseModel, Field
+
+from refrain.core.logger import log
+from .base import BaseLLM
+from .tokens import estimate_message_tokens
+
+DEFAULT_CONTEXT_WINDOW = 64_000
+SUMMARY_PREFIX = "以下是之前对话的摘要："
+
+
+class ContextPolicy(Protocol):
+    """上下文策略：就地调整窗口内容"""
+
+    async def apply(self, window: "ContextWindow", llm: BaseLLM | None) -> None: ...
+
+
+class ContextWindow:
+    """
+    带 token 预算的对话历史。
+    前 pinned 条消息（系统提示）永不裁剪；摘要（如有）紧随其后；其余为按轮组织的历史。
+    """
+
+    def __init__(
+        self,
+        budget: int = DEFAULT_CONTEXT_WINDOW - 4096,
+        policies: Sequence[ContextPolicy] | None = None,
+        low_water: float = 0.6,
+    ):
+        self.budget = budget
+        self.low_water = low_water
+        self.policies = list(policies) if policies is not None else default_policies()
+        self.messages: list[dict[str, Any]] = []
+        self._tokens: list[int] = []
+        self.total_tokens = 0
+        self.pinned = 0
+        self.summary: str | None = None
+
+    @classmethod
+    def from_profile(cls, profile: Any, reserve_tokens: int = 4096, **kwargs: Any) -> "ContextWindow":
+        window = getattr(profile, "context_window", None) or DEFAULT_CONTEXT_WINDOW
+        return cls(budget=max(window - reserve_tokens, 1024), **kwargs)
+
+    # ---------- 写入 ----------
+
+    def pin(self, message: dict[str, Any]):
+        """追加一条永不裁剪的消息（系统提示），必须在普通消息之前调用"""
+        if len(self.messages) != self.pinned:
+            raise RuntimeError("固定消息必须位于历史之前")
+        self.append(message)
+        self.pinned += 1
+
+    def append(self, message: dict[str, Any]):
+        tokens = estimate_message_tokens(message)
+        self.messages.append(message)
+        self._tokens.append(tokens)
+        self.total_tokens += tokens
+
+    def extend(self, messages: Sequence[dict[str, Any]]):
+        for message in messages:
+            self.append(message)
+
+    def clear(self):
+        """清空历史与摘要，保留固定消息"""
+        del self.messages[self.pinned:]
+        del self._tokens[self.pinned:]
+        self.total_tokens = sum(self._tokens)
+        self.summary = None
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    # ---------- 结构 ----------
+
+    @property
+    def history_start(self) -> int:
+        """第一条可裁剪消息的下标（跳过固定消息与摘要）"""
+        return self.pinned + (1 if self.summary is not None else 0)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.total_tokens > self.budget
+
+    @property
+    def target_tokens(self) -> int:
+        return int(self.budget * self.low_water)
+
+    def turn_starts(self) -> list[int]:
+        """各轮的起始下标（以 user 消息开启一轮），工具消息始终与其所在轮一起保留或丢弃"""
+        start = self.history_start
+        starts = [i for i in range(start, len(self.messages)) if self.messages[i].get("role") == "user"]
+        if not starts or starts[0] != start:
+            starts.insert(0, start)
+        return starts
+
+    def remove_range(self, start: int, stop: int):
+        self.total_tokens -= sum(self._tokens[start:stop])
+        del self.messages[start:stop]
+        del self._tokens[start:stop]
+
+    def replace(self, index: int, message: dict[str, Any]):
+        tokens = estimate_message_tokens(message)
+        self.total_tokens += tokens - self._tokens[index]
+        self.messages[index] = message
+        self._tokens[index] = tokens
+
+    def set_summary(self, summary: str):
+        message = {"role": "system", "content": f"{SUMMARY_PREFIX}\n{summary}"}
+        if self.summary is None:
+            self.messages.insert(self.pinned, message)
+            self._tokens.insert(self.pinned, 0)
+        self.summary = summary
+        self.replace(self.pinned, message)
+
+    # ---------- 发送 ----------
+
+    async def fit(self, llm: BaseLLM | None = None) -> list[dict[str, Any]]:
+        """执行全部策略，返回本次应发送的消息列表"""
+        for policy in self.policies:
+            await policy.apply(self, llm)
+        if self.over_budget:
+            log.warning(f"上下文仍超出预算 | tokens: {self.total_tokens} | budget: {self.budget}")
+        return list(self.messages)
+
+
+class DropStaleReasoning:
+    """去掉最近 keep_turns 轮之前的 reasoning_content（旧思考链对后续回答没有价值）"""
+
+    def __init__(self, keep_turns: int = 1):
+        self.keep_turns = keep_turns
+
+    async def apply(self, window: ContextWindow, llm: BaseLLM | None) -> None:
+        starts = window.turn_starts()
+        stop = starts[-self.keep_turns] if len(starts) >= self.keep_turns else window.history_start
+        for i in range(window.history_start, stop):
+            message = window.messages[i]
+            if "reasoning_content" in message:
+                window.replace(i, {k: v for k, v in message.items() if k != "reasoning_content"})
+
+
+class TurnSummary(BaseModel):
+    """滚动摘要的结构化输出"""
+    summary: str = Field(..., description="对话要点的精炼摘要：用户目标、已完成的工作、已确认的结论")
+    open_items: list[str] = Field(default_factory=list, description="尚未解决的问题或待办事项")
+
+    def render(self) -> str:
+        if not self.open_items:
+            return self.summary
+        return self.summary + "\n待办：\n" + "\n".join(f"- {item}" for item in self.open_items)
+
+
+SUMMARY_PROMPT = (
+    "你负责压缩一段编程助手与用户的对话历史。保留用户的目标与约束、涉及的文件与符号、"
+    "已做出的决定和尚未解决的问题，省略寒暄与冗长的代码输出。已有摘要需要与新内容合并。"
+)
+
+
+def _transcript(messages: Sequence[dict[str, Any]], max_chars: int) -> str:
+    lines = []
+    for m in messages:
+        content = m.get("content") or ""
+        if not isinstance(content, str):
+            content = str(content)
+        if len(content) > max_chars:
+            content = content[:max_chars] + "…"
+        if m.get("tool_calls"):
+            names = ", ".join(tc.get("function", {}).get("name", "?") for tc in m["tool_calls"])
+            content = f"{content}\n[调用工具: {names}]".strip()
+        lines.append(f"[{m.get('role')}] {content}")
+    return "\n".join(lines)
+
+
+class SummarizeOldTurns:
+    """
+    超出预算时，把除最近 keep_turns 轮以外的历史交给模型合并进滚动摘要。
+    摘要失败时记录警告并交由后续策略处理。
+    """
+
+    def __init__(self, keep_turns: int = 2, max_chars_per_message: int = 2000):
+        self.keep_turns = keep_turns
+        self.max_chars_per_message = max_chars_per_message
+
+    async def apply(self, window: ContextWindow, llm: BaseLLM | None) -> None:
+        if llm is None or not window.over_budget:
+            return
+        starts = window.turn_starts()
+        if len(starts) <= self.keep_turns:
+            return
+        start, stop = window.history_start, starts[-self.keep_turns]
+        transcript = _transcript(window.messages[start:stop], self.max_chars_per_message)
+        if window.summary:
+            transcript = f"已有摘要：\n{window.summary}\n\n新的对话：\n{transcript}"
+        try:
+            result = await llm.structured_chat(
+                [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}],
+                response_model=TurnSummary,
+            )
+        except Exception as e:
+            log.warning(f"对话摘要失败，退回滑动窗口 | {type(e).__name__}: {e}")
+            return
+        if result is None:
+            return
+        before = window.total_tokens
+        window.remove_range(start, stop)
+        window.set_summary(result.render())
+        log.info(f"对话历史已摘要 | tokens: {before} -> {window.total_tokens}")
+
+
+class SlidingWindow:
+    """仍超出预算时按整轮丢弃最早的历史，直到降到低水位（最后一轮始终保留）"""
+
+    async def apply(self, window: ContextWindow, llm: BaseLLM | None) -> None:
+        if not window.over_budget:
+            return
+        starts = window.turn_starts()
+        start, stop = window.history_start, window.history_start
+        remaining = window.total_tokens
+        for next_start in starts[1:]:
+            if remaining <= window.target_tokens:
+                break
+            remaining -= sum(window._tokens[stop:next_start])
+            stop = next_start
+        if stop > start:
+            window.remove_range(start, stop)
+            log.info(f"上下文滑动窗口 | 丢弃消息: {stop - start} | tokens: {window.total_tokens}")
+
+
+def default_policies() -> list[ContextPolicy]:
+    return [DropStaleReasoning(), SummarizeOldTurns(), SlidingWindow()]
@@ -1,17 +1,26 @@
+import importlib
+import json
 from functools import lru_cache
 from typing import Type
 from .base import BaseLLM
-from .openai_provider import OpenAIProvider
-from refrain.core.config import user_config
+from refrain.core.config import get_settings, get_user_config, resolve_api_key
 from refrain.core.logger import log
 
-# 驱动映射表
-PROVIDER_MAP: dict[str, Type[BaseLLM]] = {
-    "openai": OpenAIProvider,
-    "deepseek": OpenAIProvider,  # DeepSeek 兼容 OpenAI 协议
+# 驱动映射表 (模块路径:类名，构建实例时才导入对应 SDK)
+PROVIDER_MAP: dict[str, str] = {
+    "openai": "refrain.core.llm.chat.openai_provider:OpenAIProvider",
+    "deepseek": "refrain.core.llm.chat.openai_provider:OpenAIProvider",  # DeepSeek 兼容 OpenAI 协议
 }
+DEFAULT_PROVIDER = "openai"
+
+
+def load_provider(provider: str | None) -> Type[BaseLLM]:
+    """按名称导入驱动类，未知供应商回退到 OpenAI 协议"""
+    target = PROVIDER_MAP.get((provider or DEFAULT_PROVIDER).lower(), PROVIDER_MAP[DEFAULT_PROVIDER])
+    module_path, cls_name = target.split(":")
+    return getattr(importlib.import_module(module_path), cls_name)
+
 
-@lru_cache()
 def get_llm_backend(
     alias: str | None = None,
     provider: str | None = None,
@@ -24,33 +33,111 @@ def get_llm_backend(
     1. 如果指定了 alias (别名)，则从用户配置中加载对应的 Profile。
     2. 如果未指定任何参数，则加载当前激活的默认 Profile。
     3. 如果指定了 provider/api_key 等参数，则构建自定义实例。
+
+    实例按解析后的最终配置缓存（而非原始参数），因此切换 Profile 后再切回会复用同一实例，
+    且默认 Profile 变化后能立即生效；底层连接池由 transport 模块按 base_url 共享。
+    API Key 在此处解析并计入缓存键：经 /config 更新钥匙串或环境变量后不会复用持有旧 Key 的实例。
     """
     
     # 逻辑 A：如果没有任何参数，或仅指定了别名，尝试从用户配置加载
     if not any([provider, api_key, base_url, model]) or alias:
         # 获取 Profile (如果 alias 为 None，manager 会返回当前激活的默认 Profile)
+        user_config = get_user_config()
+        if not alias and not any([provider, api_key, base_url, model]) and user_config.config.fallback_models:
+            return get_router_backend()
         profile = user_config.config.profiles.get(alias) if alias else user_config.get_active_profile()
         
         if profile:
-            provider_cls = PROVIDER_MAP.get(profile.provider, OpenAIProvider)
             log.info(f"从配置加载 LLM | 别名: {profile.name} | 模型: {profile.model}")
-            return provider_cls(
-                api_key=api_key, # 如果手动传了 key，则覆盖配置
+            model = model or profile.model
+            return _build_backend(
+                provider=profile.provider,
+                # 如果手动传了 key，则覆盖配置；钥匙串服务名与驱动的解析规则一致
+                api_key=resolve_api_key(
+                    api_key, profile.api_key_env,
+                    service_id=profile.extra_params.get("name") or model or "refrain",
+                ),
                 api_key_env=profile.api_key_env,
                 base_url=base_url or profile.base_url,
-                default_model=model or profile.model,
+                model=model,
                 timeout=profile.timeout,
-                **profile.extra_params
+                rpm=profile.rpm,
+                tpm=profile.tpm,
+                extra_params=json.dumps(profile.extra_params, sort_keys=True, default=str),
+                profile=profile.name,
             )
 
     # 逻辑 B：手动构建模式
     p_key = (provider or "openai").lower()
-    provider_cls = PROVIDER_MAP.get(p_key, OpenAIProvider)
-    
     log.info(f"手动构建 LLM 实例 | Provider: {p_key} | 模型: {model or '默认'}")
-        
-    return provider_cls(
+    return _build_backend(
+        provider=p_key, api_key=resolve_api_key(api_key, service_id=model or "refrain"), base_url=base_url, model=model
+    )
+
+
+@lru_cache(maxsize=32)
+def _build_backend(
+    provider: str | None,
+    api_key: str | None = None,
+    api_key_env: str | None = None,
+    base_url: str | None = None,
+    model: str | None = None,
+    timeout: float | None = None,
+    rpm: int | None = None,
+    tpm: int | None = None,
+    extra_params: str = "{}",
+    profile: str | None = None,
+) -> BaseLLM:
+    """
+    按解析后的配置构建并缓存实例（extra_params 以 JSON 字符串传入以便哈希）。
+    profile 为指标的聚合名称，手动构建时使用模型名。
+    """
+    provider_cls = load_provider(provider)
+    kwargs = json.loads(extra_params)
+    if api_key_env is not None:
+        kwargs["api_key_env"] = api_key_env
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    if rpm or tpm:
+        kwargs.update(rpm=rpm, tpm=tpm)
+    backend = provider_cls(
         api_key=api_key,
         base_url=base_url,
-        default_model=model
+        default_model=model,
+        **kwargs
     )
+
+    settings = get_settings()
+    # 指标层紧贴供应商，缓存命中不计入延迟统计
+    if settings.LLM_METRICS:
+        from .metrics import InstrumentedLLM
+        backend = InstrumentedLLM(backend, profile or backend.default_model)
+
+    # 按 .env 中的 LLM_CACHE 套上响应缓存层
+    if settings.LLM_CACHE != "off":
+        from .cache import wrap_with_cache
+        backend = wrap_with_cache(backend, settings.LLM_CACHE, ttl=settings.LLM_CACHE_TTL, profile=profile)
+    return backend
+
+
+def get_router_backend(aliases: list[str] | None = None) -> BaseLLM:
+    """
+    弹性路由工厂：按别名顺序组合多个 Profile（默认为 current_model + fallback_models），
+    提供重试、对冲与故障转移。
+    """
+    config = get_user_config().config
+    if aliases is None:
+        aliases = [config.current_model, *config.fallback_models]
+    names = tuple(dict.fromkeys(a for a in aliases if a in config.profiles))
+    if not names:
+        raise ValueError(f"路由中没有可用的模型: {', '.join(aliases)}")
+    backends = tuple(get_llm_backend(alias=name) for name in names)
+    return _build_router(names, backends)
+
+
+@lru_cache(maxsize=8)
+def _build_router(names: tuple[str, ...], backends: tuple[BaseLLM, ...]) -> BaseLLM:
+    """路由实例按后端组合缓存，熔断状态与延迟统计得以跨调用保留"""
+    from .router import RouterLLM
+    log.info(f"构建 LLM 路由 | 顺序: {' → '.join(names)}")
+    return RouterLLM(list(zip(names, backends)))
@@ -0,0 +1,425 @@
+"""
+请求级延迟指标 - 判断慢在供应商 / 网络，还是在本地渲染
+
+- 每次请求记录：首 token 延迟（ttft）、首个工具调用延迟（ttft_tool）、总耗时、输出速率（tokens/s）、
+  块间间隔（chunk_gap）、消费耗时（consume）与重试次数
+- ttft_tool 取首个工具调用碎片到达的时刻（帧的 tool_calls_started），而不是调用拼装完成的时刻
+- chunk_gap 只统计等待上游下一帧的时间，consume 是消费方持有每一帧的时间（切块、分发工具等，
+  不含 Live 在刷新线程中的重绘）：前者高说明供应商或网络慢，后者高说明本地处理慢
+- 按 Profile 聚合到进程内的 MetricsRegistry；直方图为 HDR 风格的对数线性分桶（相对误差约 1.6%），
+  记录为 O(1)，内存与样本数无关，可跨进程合并
+- 进程退出时合并写入 ~/.refrain/metrics.json 供 `rf stats` 查看；
+  LLM_METRICS_TEXTFILE 非空时同时导出 Prometheus textfile（node_exporter textfile collector 格式）
+"""
+import atexit
+import json
+import math
+import time
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncGenerator, Type, TypeVar
+from pydantic import BaseModel
+
+from refrain.core.logger import log
+from .base import BaseLLM
+from .schemas import LLMResponse
+
+T = TypeVar("T", bound=BaseModel)
+
+SUB_BUCKET_BITS = 7  # 每个 2 的幂区间划分 64 个线性子桶
+
+# 直方图名称 -> (取整刻度, 单位)；秒级指标按微秒取整，速率按 0.01 tokens/s 取整
+HISTOGRAMS: dict[str, tuple[float, str]] = {
+    "ttft": (1e6, "seconds"),
+    "ttft_tool": (1e6, "seconds"),
+    "duration": (1e6, "seconds"),
+    "chunk_gap": (1e6, "seconds"),
+    "consume": (1e6, "seconds"),
+    "tokens_per_sec": (100, "tokens_per_second"),
+}
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def bucket_index(value: int) -> int:
+    """非负整数值所在的桶号：小于 2^bits 时逐值分桶，其后每个 2 的幂区间等分为 2^(bits-1) 个桶"""
+    if value < 1 << SUB_BUCKET_BITS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return (shift << (SUB_BUCKET_BITS - 1)) + (value >> shift)
+
+
+def bucket_bounds(index: int) -> tuple[int, int]:
+    """桶号对应的取值区间 [low, high)"""
+    if index < 1 << SUB_BUCKET_BITS:
+        return index, index + 1
+    shift = (index >> (SUB_BUCKET_BITS - 1)) - 1
+    mantissa = index - (shift << (SUB_BUCKET_BITS - 1))
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+class Histogram:
+    """HDR 风格的稀疏直方图，scale 为记录前乘上的取整刻度"""
+
+    __slots__ = ("scale", "counts", "count", "total", "min", "max")
+
+    def __init__(self, scale: float = 1e6):
+        self.scale = scale
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, value: float):
+        index = bucket_index(max(int(value * self.scale), 0))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self) -> float | None:
+        return self.total / self.count if self.count else None
+
+    def percentile(self, q: float) -> float | None:
+        """分位数（取所在桶的中点，并限制在已记录的最小 / 最大值之间）"""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                low, high = bucket_bounds(index)
+                return min(max((low + high - 1) / 2 / self.scale, self.min), self.max)
+        return self.max
+
+    def merge(self, other: "Histogram"):
+        if other.scale != self.scale:
+            raise ValueError("直方图刻度不一致，无法合并")
+        for index, n in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def to_dict(self) -> dict[str, Any]:
+        data: dict[str, Any] = {"scale": self.scale, "count": self.count, "total": self.total,
+                                "counts": {str(k): v for k, v in sorted(self.counts.items())}}
+        if self.count:
+            data.update(min=self.min, max=self.max)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "Histogram":
+        hist = cls(data["scale"])
+        hist.counts = {int(k): v for k, v in data.get("counts", {}).items()}
+        hist.count = data.get("count", 0)
+        hist.total = data.get("total", 0.0)
+        hist.min = data.get("min", math.inf)
+        hist.max = data.get("max", -math.inf)
+        return hist
+
+
+def _new_histograms() -> dict[str, Histogram]:
+    return {name: Histogram(scale) for name, (scale, _) in HISTOGRAMS.items()}
+
+
+@dataclass
+class ProfileStats:
+    """单个 Profile 的累计指标"""
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    output_tokens: int = 0
+    histograms: dict[str, Histogram] = field(default_factory=_new_histograms)
+
+    def merge(self, other: "ProfileStats"):
+        self.requests += other.requests
+        self.errors += other.errors
+        self.retries += other.retries
+        self.output_tokens += other.output_tokens
+        for name, hist in other.histograms.items():
+            if name in self.histograms:
+                self.histograms[name].merge(hist)
+            else:
+                self.histograms[name] = hist
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests, "errors": self.errors,
+            "retries": self.retries, "output_tokens": self.output_tokens,
+            "histograms": {name: hist.to_dict() for name, hist in self.histograms.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "ProfileStats":
+        stats = cls(data.get("requests", 0), data.get("errors", 0), data.get("retries", 0), data.get("output_tokens", 0))
+        for name, hist in data.get("histograms", {}).items():
+            if name in HISTOGRAMS:  # 忽略已停用的指标
+                stats.histograms[name] = Histogram.from_dict(hist)
+        return stats
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """按 Profile 聚合的进程内指标注册表"""
+
+    def __init__(self):
+        self.profiles: dict[str, ProfileStats] = {}
+
+    def profile(self, name: str) -> ProfileStats:
+        stats = self.profiles.get(name)
+        if stats is None:
+            stats = self.profiles[name] = ProfileStats()
+        return stats
+
+    @property
+    def empty(self) -> bool:
+        return not any(s.requests or s.retries for s in self.profiles.values())
+
+    def merge(self, other: "MetricsRegistry"):
+        for name, stats in other.profiles.items():
+            self.profile(name).merge(stats)
+
+    def reset(self):
+        self.profiles.clear()
+
+    # ---------- 持久化 ----------
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"profiles": {name: stats.to_dict() for name, stats in self.profiles.items()}}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "MetricsRegistry":
+        registry = cls()
+        for name, stats in data.get("profiles", {}).items():
+            registry.profiles[name] = ProfileStats.from_dict(stats)
+        return registry
+
+    @classmethod
+    def load(cls, path: Path | str) -> "MetricsRegistry":
+        """读取持久化的指标；文件不存在或损坏时返回空注册表"""
+        try:
+            return cls.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
+        except FileNotFoundError:
+            return cls()
+        except (ValueError, KeyError, TypeError) as e:
+            log.warning(f"指标文件损坏，已忽略 | {path}: {type(e).__name__}: {e}")
+            return cls()
+
+    def save(self, path: Path | str):
+        from refrain.utils.fs import atomic_write
+        atomic_write(path, json.dumps(self.to_dict(), separators=(",", ":")), fsync=False)
+
+    # ---------- Prometheus ----------
+
+    def prometheus(self, prefix: str = "refrain_llm") -> str:
+        """以 Prometheus 文本格式导出：计数器 + 各直方图的分位数摘要（summary）"""
+        lines: list[str] = []
+        counters = (("requests", "请求总数"), ("errors", "失败请求数"),
+                    ("retries", "重试次数"), ("output_tokens", "输出 token 总数"))
+        for attr, help_text in counters:
+            metric = f"{prefix}_{attr}_total"
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            for name, stats in sorted(self.profiles.items()):
+                lines.append(f'{metric}{{profile="{_label(name)}"}} {getattr(stats, attr)}')
+        for hist_name, (_, unit) in HISTOGRAMS.items():
+            metric = f"{prefix}_{hist_name}_{unit}"
+            lines += [f"# HELP {metric} {hist_name}", f"# TYPE {metric} summary"]
+            for name, stats in sorted(self.profiles.items()):
+                hist = stats.histograms.get(hist_name)
+                if hist is None or not hist.count:
+                    continue
+                label = f'profile="{_label(name)}"'
+                for q in QUANTILES:
+                    lines.append(f'{metric}{{{label},quantile="{q}"}} {hist.percentile(q):.6g}')
+                lines.append(f"{metric}_sum{{{label}}} {hist.total:.6g}")
+                lines.append(f"{metric}_count{{{label}}} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path | str):
+        """原子写出 textfile，避免采集器读到半个文件"""
+        from refrain.utils.fs import atomic_write
+        atomic_write(path, self.prometheus(), fsync=False)
+
+
+# ============ 单次请求计时 ============
+
+class RequestTimer:
+    """
+    单次请求的计时器。流式请求在收到每一帧时调用 frame()，
+    消费方处理完该帧、继续拉取下一帧时调用 resumed()；请求结束时调用 finish()（重复调用无效）。
+    """
+
+    __slots__ = ("stats", "start", "first_token", "first_tool", "frames", "_received", "_waiting_since", "_done")
+
+    def __init__(self, stats: ProfileStats):
+        self.stats = stats
+        self.start = self._waiting_since = self._received = time.perf_counter()
+        self.first_token: float | None = None
+        self.first_tool: float | None = None
+        self.frames = 0
+        self._done = False
+
+    def frame(self, frame: LLMResponse):
+        now = self._received = time.perf_counter()
+        hists = self.stats.histograms
+        if self.frames:
+            hists["chunk_gap"].record(now - self._waiting_since)
+        self.frames += 1
+        if self.first_token is None and (frame.content or frame.reasoning_content):
+            self.first_token = now
+            hists["ttft"].record(now - self.start)
+        if self.first_tool is None and (frame.tool_calls or frame.tool_calls_started):
+            self.first_tool = now
+            hists["ttft_tool"].record(now - self.start)
+
+    def resumed(self):
+        now = self._waiting_since = time.perf_counter()
+        self.stats.histograms["consume"].record(now - self._received)
+
+    def finish(self, usage: dict[str, int] | None = None, error: BaseException | None = None):
+        if self._done:
+            return
+        self._done = True
+        end = time.perf_counter()
+        stats = self.stats
+        stats.requests += 1
+        if error is not None:
+            stats.errors += 1
+            return
+        stats.histograms["duration"].record(end - self.start)
+        completion = (usage or {}).get("completion_tokens", 0)
+        if completion:
+            stats.output_tokens += completion
+            # 流式请求的速率从首 token 起算，排除排队与首包延迟
+            elapsed = end - (self.first_token or self.start)
+            if elapsed > 0:
+                stats.histograms["tokens_per_sec"].record(completion / elapsed)
+
+
+class InstrumentedLLM(BaseLLM):
+    """
+    指标装饰后端：包装任意 BaseLLM，按 profile 记录每次请求的延迟指标。
+    流式请求被消费方提前关闭（Ctrl-C、对冲落败）时不计入请求数。
+    """
+
+    def __init__(self, backend: BaseLLM, profile: str, registry: MetricsRegistry | None = None):
+        self.backend = backend
+        self.profile = profile
+        self.registry = registry
+
+    def __getattr__(self, name: str):
+        # default_model 等属性透传给被包装的后端
+        return getattr(self.backend, name)
+
+    @property
+    def rate_limiter(self):
+        return self.backend.rate_limiter
+
+    def _timer(self) -> RequestTimer:
+        return RequestTimer((self.registry or get_metrics()).profile(self.profile))
+
+    async def chat(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+        tool_choice: str | dict = "auto",
+        **kwargs
+    ) -> LLMResponse:
+        timer = self._timer()
+        try:
+            response = await self.backend.chat(messages, tools=tools, tool_choice=tool_choice, **kwargs)
+        except Exception as e:
+            timer.finish(error=e)
+            raise
+        timer.finish(response.usage)
+        return response
+
+    async def structured_chat(
+        self,
+        messages: list[dict[str, Any]],
+        response_model: Type[T],
+        **kwargs
+    ) -> T:
+        timer = self._timer()
+        try:
+            result = await self.backend.structured_chat(messages, response_model, **kwargs)
+        except Exception as e:
+            timer.finish(error=e)
+            raise
+        timer.finish()
+        return result
+
+    async def stream_chat(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+        tool_choice: str | dict = "auto",
+        **kwargs
+    ) -> AsyncGenerator[LLMResponse, None]:
+        timer = self._timer()
+        stream = self.backend.stream_chat(messages, tools=tools, tool_choice=tool_choice, **kwargs)
+        async with aclosing(stream):
+            try:
+                async for frame in stream:
+                    timer.frame(frame)
+                    if not frame.is_delta:
+                        timer.finish(frame.usage)
+                    yield frame
+                    timer.resumed()
+            except Exception as e:
+                timer.finish(error=e)
+                raise
+
+
+# ============ 全局注册表 ============
+
+_registry: MetricsRegistry | None = None
+
+
+def metrics_path() -> Path:
+    from refrain.core.config import ConfigManager
+    return ConfigManager.CONFIG_DIR / "metrics.json"
+
+
+def get_metrics() -> MetricsRegistry:
+    """进程内的全局注册表，首次使用时登记退出时的持久化"""
+    global _registry
+    if _registry is None:
+        _registry = MetricsRegistry()
+        atexit.register(persist_metrics)
+    return _registry
+
+
+def persist_metrics(path: Path | str | None = None) -> MetricsRegistry | None:
+    """
+    将本进程的指标合并进持久化文件，并按配置导出 Prometheus textfile；返回合并后的累计指标。
+    读取-合并-写回在文件锁内完成，多个进程同时退出时不会互相覆盖。
+    """
+    if _registry is None or _registry.empty:
+        return None
+    from refrain.core.config import get_settings
+    from refrain.utils.fs import FileLock, LockTimeoutError
+    path = Path(path) if path else metrics_path()
+    try:
+        with FileLock(path, timeout=10):
+            merged = MetricsRegistry.load(path)
+            merged.merge(_registry)
+            merged.save(path)
+        _registry.reset()
+        textfile = get_settings().LLM_METRICS_TEXTFILE
+        if textfile:
+            merged.write_textfile(textfile)
+        return merged
+    except (OSError, LockTimeoutError) as e:
+        log.warning(f"指标持久化失败 | {type(e).__name__}: {e}")
+        return None
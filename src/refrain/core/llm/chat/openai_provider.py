@@ -1,6 +1,5 @@
 from typing import AsyncGenerator, Any, Type, TypeVar
 import time
-from os import getenv
 try:
     from typing import override
 except ImportError:
@@ -11,10 +10,14 @@ from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletion
 from pydantic import BaseModel
 
-from refrain.core.config import settings, get_api_key_from_keyring
-from refrain.core.logger import log
+from refrain.core.config import get_settings, resolve_api_key
+from refrain.core.logger import Sampler, log
 from .base import BaseLLM
 from .schemas import LLMResponse, ToolCall
+from .batch import get_rate_limiter
+from .stream import StreamAccumulator, extract_usage
+from .trace import record_trace
+from .transport import PooledOpenAIClient, pop_pool_params
 
 T = TypeVar("T", bound=BaseModel)
 
@@ -28,26 +31,26 @@ class OpenAIProvider(BaseLLM):
         api_key_env: str | None = None,
         **kwargs  # 接收额外参数，防止工厂模式透传报错
     ):
-        # 优先级：直接传入的 api_key > 指定的 api_key_env > 系统 Keyring > 默认 settings.OPENAI_API_KEY
-        actual_api_key = api_key
-        
-        # 1. 尝试环境变量
-        if not actual_api_key and api_key_env:
-            actual_api_key = getenv(api_key_env)
-        
-        # 2. 尝试 Keyring (如果 api_key_env 为空字符串或 "keyring")
-        if not actual_api_key and (not api_key_env or api_key_env == "keyring"):
-            # 使用别名或模型名作为 service ID 进行查找
-            service_id = kwargs.get("name") or default_model or "refrain"
-            actual_api_key = get_api_key_from_keyring(service_id)
-
-        self.client = AsyncOpenAI(
-            api_key=actual_api_key or settings.OPENAI_API_KEY,
-            base_url=base_url or settings.OPENAI_API_BASE,
-            timeout=timeout,
+        # 使用别名或模型名作为 Keyring 的 service ID
+        self.api_key = resolve_api_key(
+            api_key, api_key_env, service_id=kwargs.get("name") or default_model or "refrain"
         )
+        settings = get_settings()
+        self.base_url = base_url or settings.OPENAI_API_BASE
+        self.timeout = timeout
         self.default_model = default_model or settings.DEFAULT_LLM_MODEL
-        self.extra_kwargs = kwargs  # 保存额外参数供后续使用
+        # 连接池与限流参数从额外参数中取出，其余保存供后续使用
+        self.pool_params = pop_pool_params(kwargs)
+        self.rate_limiter = get_rate_limiter(
+            (self.base_url, self.default_model), kwargs.pop("rpm", None), kwargs.pop("tpm", None)
+        )
+        self.extra_kwargs = kwargs
+        self._pool = PooledOpenAIClient(self.api_key, self.base_url, self.timeout, self.pool_params)
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        """绑定共享连接池的 SDK 客户端"""
+        return self._pool.get()
 
     def _parse_response(self, response: ChatCompletion) -> LLMResponse:
         choice = response.choices[0]
@@ -62,20 +65,8 @@ class OpenAIProvider(BaseLLM):
                     function_args=tc.function.arguments
                 ))
 
-        # 智能提取 Token 消耗（适配 OpenAI 最新推理模型标准）
-        usage = response.usage
-        reasoning_tokens = 0
-        if usage:
-            # 安全获取 details 对象，确保它不是 None 再取值 (解决潜在的 NoneType 报错)
-            details = getattr(usage, "completion_tokens_details", None)
-            if details:
-                reasoning_tokens = getattr(details, "reasoning_tokens", 0)
-
-        usage_dict = {
-            "prompt_tokens": usage.prompt_tokens if usage else 0,
-            "completion_tokens": usage.completion_tokens if usage else 0,
-            "reasoning_tokens": reasoning_tokens
-        }
+        # 提取 Token 消耗（含推理 token 与前缀缓存命中 token）
+        usage_dict = extract_usage(response.usage)
 
         # 极致兼容的思考链抓取 (适配 DeepSeek-R1)
         reasoning = getattr(message, "reasoning_content", None)
@@ -90,18 +81,6 @@ class OpenAIProvider(BaseLLM):
             finish_reason=choice.finish_reason # type: ignore
         )
 
-    def _convert_tool_buffer(self, buffer: dict) -> list[ToolCall] | None:
-        """内部助手：将缓存的碎片转为标准的 ToolCall 对象列表"""
-        if not buffer:
-            return None
-        return [
-            ToolCall(
-                id=v["id"] or "", 
-                function_name=v["name"], 
-                function_args=v["args"]
-            ) for v in buffer.values()
-        ]
-
     @override
     async def chat(
         self, 
@@ -111,8 +90,9 @@ class OpenAIProvider(BaseLLM):
         **kwargs
     ) -> LLMResponse:
         model = kwargs.pop("model", self.default_model)
-        log.info(f"LLM Chat 请求 | 模型: {model} | 消息数: {len(messages)}")
-        log.debug(f"请求消息体: {messages}")
+        # 日志参数延迟格式化：级别未启用时不会把整段对话转成字符串
+        log.info("LLM Chat 请求 | 模型: {} | 消息数: {}", model, len(messages))
+        log.opt(lazy=True).debug("请求消息体: {}", lambda: messages)
         
         # 提取特殊的扩展参数（如 thinking）放入 extra_body
         extra_body = {}
@@ -135,11 +115,14 @@ class OpenAIProvider(BaseLLM):
             duration = time.perf_counter() - start_time
             parsed = self._parse_response(response)
             
-            log.info(f"LLM Chat 响应 | 耗时: {duration:.2f}s | Token 消耗: {parsed.usage}")
-            log.debug(f"完整响应内容: {parsed.content}")
+            log.info("LLM Chat 响应 | 耗时: {:.2f}s | Token 消耗: {}", duration, parsed.usage)
+            log.opt(lazy=True).debug("完整响应内容: {}", lambda: parsed.content)
+            record_trace("chat", model, messages, tools=tools, response=parsed, duration=duration)
             return parsed
         except Exception as e:
             log.error(f"LLM Chat 调用失败: {type(e).__name__}: {str(e)}")
+            record_trace("chat", model, messages, tools=tools, error=f"{type(e).__name__}: {e}",
+                         duration=time.perf_counter() - start_time)
             raise e
 
     @override
@@ -151,8 +134,8 @@ class OpenAIProvider(BaseLLM):
     ) -> T:
         """使用 OpenAI Beta 的 parse 接口实现极高成功率的结构化输出"""
         model = kwargs.pop("model", self.default_model)
-        log.info(f"LLM 结构化请求 | 模型: {model} | 目标类型: {response_model.__name__}")
-        log.debug(f"请求消息体: {messages}")
+        log.info("LLM 结构化请求 | 模型: {} | 目标类型: {}", model, response_model.__name__)
+        log.opt(lazy=True).debug("请求消息体: {}", lambda: messages)
         
         # 提取特殊的扩展参数（如 thinking）放入 extra_body
         extra_body = {}
@@ -170,11 +153,15 @@ class OpenAIProvider(BaseLLM):
             )
             duration = time.perf_counter() - start_time
             parsed_obj = completion.choices[0].message.parsed
-            log.info(f"LLM 结构化响应 | 耗时: {duration:.2f}s")
-            log.debug(f"解析结果: {parsed_obj}")
+            log.info("LLM 结构化响应 | 耗时: {:.2f}s", duration)
+            log.opt(lazy=True).debug("解析结果: {}", lambda: parsed_obj)
+            record_trace("structured", model, messages, response_model=response_model.__name__,
+                         response=parsed_obj, usage=extract_usage(completion.usage), duration=duration)
             return parsed_obj # type: ignore
         except Exception as e:
             log.error(f"LLM 结构化调用失败: {type(e).__name__}: {str(e)}")
+            record_trace("structured", model, messages, response_model=response_model.__name__,
+                         error=f"{type(e).__name__}: {e}", duration=time.perf_counter() - start_time)
             raise e
 
     @override
@@ -187,8 +174,10 @@ class OpenAIProvider(BaseLLM):
     ) -> AsyncGenerator[LLMResponse, None]:
         # 在流式中开启 stream_options 以获取 token 消耗统计
         model = kwargs.pop("model", self.default_model)
-        log.info(f"LLM 流式请求开始 | 模型: {model} | 消息数: {len(messages)} | 工具数: {len(tools) if tools else 0}")
-        log.debug(f"请求消息体: {messages}")
+        # delta_only=True：增量帧只携带增量文本，工具调用仅在终局帧中给出
+        delta_only = kwargs.pop("delta_only", False)
+        log.info("LLM 流式请求开始 | 模型: {} | 消息数: {} | 工具数: {}", model, len(messages), len(tools) if tools else 0)
+        log.opt(lazy=True).debug("请求消息体: {}", lambda: messages)
         
         # 提取特殊的扩展参数（如 thinking）放入 extra_body
         extra_body = {}
@@ -208,92 +197,65 @@ class OpenAIProvider(BaseLLM):
             stream_kwargs["tool_choice"] = tool_choice
         
         start_time = time.perf_counter()
+        stream = None
         try:
             stream = await self.client.chat.completions.create(**stream_kwargs)
             
             # 状态累加器
-            full_content = ""
-            full_reasoning = ""
-            full_usage = {"prompt_tokens": 0, "completion_tokens": 0, "reasoning_tokens": 0}
-            tool_calls_buffer: dict[int, dict[str, Any]] = {}
-            last_finish_reason = None
+            acc = StreamAccumulator()
             has_yielded_final = False
+            # 逐块事件频率很高，进度日志按时间采样
+            progress = Sampler(interval=1.0)
+            chunks = 0
 
             async for chunk in stream:
+                chunks += 1
                 # 1. 处理 Usage 帧 (通常是最后一帧)
                 if not chunk.choices:
-                    if chunk.usage:
-                        u = chunk.usage
-                        full_usage["prompt_tokens"] = u.prompt_tokens
-                        full_usage["completion_tokens"] = u.completion_tokens
-                        details = getattr(u, "completion_tokens_details", None)
-                        if details:
-                            full_usage["reasoning_tokens"] = getattr(details, "reasoning_tokens", 0)
+                    acc.set_usage(chunk.usage)
                     
                     duration = time.perf_counter() - start_time
-                    log.info(f"LLM 流式请求结束 | 耗时: {duration:.2f}s | Token 消耗: {full_usage}")
+                    log.info("LLM 流式请求结束 | 耗时: {:.2f}s | Token 消耗: {}", duration, acc.usage)
                     
                     # 标记已产出最终帧
                     has_yielded_final = True
-                    yield LLMResponse(
-                        content=None,
-                        reasoning_content=None,
-                        final_content=full_content,
-                        final_reasoning=full_reasoning if full_reasoning else None,
-                        tool_calls=self._convert_tool_buffer(tool_calls_buffer),
-                        usage=full_usage,
-                        finish_reason=last_finish_reason or "stop"
-                    )
+                    final = acc.final_frame()
+                    record_trace("stream", model, messages, tools=tools, response=final, duration=duration)
+                    yield final
                     continue
 
+                if progress():
+                    log.debug("LLM 流式进度 | 块数: {} | 耗时: {:.2f}s", chunks, time.perf_counter() - start_time)
+
                 choice = chunk.choices[0]
                 delta = choice.delta
-                last_finish_reason = choice.finish_reason
+                if choice.finish_reason:
+                    acc.finish_reason = choice.finish_reason
                 
-                # 2. 累加内容并记录增量
+                # 2. 累加内容、思考链与工具调用碎片
                 delta_content = delta.content
-                if delta_content:
-                    full_content += delta_content
-                
                 delta_reasoning = getattr(delta, "reasoning_content", None)
-                if delta_reasoning:
-                    full_reasoning += delta_reasoning
-
-                # 3. 累加工具调用碎片
+                acc.add_content(delta_content)
+                acc.add_reasoning(delta_reasoning)
                 if delta.tool_calls:
-                    for tc in delta.tool_calls:
-                        idx = tc.index
-                        if idx not in tool_calls_buffer:
-                            tool_calls_buffer[idx] = {"id": tc.id, "name": "", "args": ""}
-                        if tc.id: 
-                            tool_calls_buffer[idx]["id"] = tc.id
-                        if tc.function:
-                            if tc.function.name:
-                                tool_calls_buffer[idx]["name"] += tc.function.name
-                            if tc.function.arguments:
-                                tool_calls_buffer[idx]["args"] += tc.function.arguments
+                    acc.add_tool_deltas(delta.tool_calls)
 
-                # 4. 实时产出增量响应 (包含当前的完整 tool_calls 状态)
-                yield LLMResponse(
-                    content=delta_content,
-                    reasoning_content=delta_reasoning,
-                    tool_calls=self._convert_tool_buffer(tool_calls_buffer),
-                    finish_reason=choice.finish_reason # type: ignore
-                )
+                # 3. 实时产出增量响应 (默认附带已拼装完成的 tool_calls)
+                yield acc.delta_frame(delta_content, delta_reasoning, choice.finish_reason, delta_only)
 
             # --- 兜底逻辑 ---
             if not has_yielded_final:
                 duration = time.perf_counter() - start_time
-                log.info(f"LLM 流式请求结束(兜底) | 耗时: {duration:.2f}s | Token 消耗: {full_usage}")
-                yield LLMResponse(
-                    content=None,
-                    reasoning_content=None,
-                    final_content=full_content,
-                    final_reasoning=full_reasoning if full_reasoning else None,
-                    tool_calls=self._convert_tool_buffer(tool_calls_buffer),
-                    usage=full_usage,
-                    finish_reason=last_finish_reason or "stop"
-                )
+                log.info("LLM 流式请求结束(兜底) | 耗时: {:.2f}s | Token 消耗: {}", duration, acc.usage)
+                final = acc.final_frame()
+                record_trace("stream", model, messages, tools=tools, response=final, duration=duration)
+                yield final
         except Exception as e:
             log.error(f"LLM 流式调用异常: {type(e).__name__}: {str(e)}")
+            record_trace("stream", model, messages, tools=tools, error=f"{type(e).__name__}: {e}",
+                         duration=time.perf_counter() - start_time)
             raise e
+        finally:
+            # 消费方提前停止（Ctrl-C 取消、aclose）时立即关闭响应，不再继续接收与计费
+            if stream is not None:
+                await stream.close()
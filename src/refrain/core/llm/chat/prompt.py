@@ -0,0 +1,125 @@
+"""
+前缀缓存友好的请求构建 - 让每次请求的前缀逐字节稳定
+
+DeepSeek / OpenAI 对与历史请求前缀相同的部分按缓存命中计费且首字更快，命中要求前缀逐字节一致：
+- 系统提示与工具描述放在最前，且序列化结果固定：工具按名称排序、字典键递归排序，只规范化一次
+- 历史消息按固定键序规范化（去掉值为 None 的字段），已发送过的消息不再改写
+- 每轮变化的信息（时间、工作区状态等）作为最后一条消息追加，而不是拼进系统提示
+- UsageMeter 汇总 prompt_tokens 与 cached_tokens，给出会话的缓存命中率
+"""
+import hashlib
+import json
+from typing import Any, Sequence
+
+from refrain.core.logger import log
+
+# 消息字段的固定顺序（未列出的字段按名称排在其后）
+_MESSAGE_KEYS = ("role", "name", "content", "reasoning_content", "tool_calls", "tool_call_id")
+
+
+def canonical(value: Any) -> Any:
+    """递归按键排序，得到序列化结果稳定的副本"""
+    if isinstance(value, dict):
+        return {k: canonical(value[k]) for k in sorted(value)}
+    if isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    return value
+
+
+def canonical_message(message: dict[str, Any]) -> dict[str, Any]:
+    keys = [k for k in _MESSAGE_KEYS if k in message] + sorted(k for k in message if k not in _MESSAGE_KEYS)
+    result = {}
+    for key in keys:
+        value = message[key]
+        if value is None:
+            continue
+        result[key] = canonical(value) if key == "tool_calls" else value
+    return result
+
+
+def canonical_tools(tools: Sequence[dict[str, Any]] | None) -> list[dict[str, Any]] | None:
+    if not tools:
+        return None
+    return sorted((canonical(t) for t in tools), key=lambda t: t.get("function", {}).get("name", ""))
+
+
+class PromptBuilder:
+    """
+    请求构建器：
+        builder = PromptBuilder(system_prompt, tools)
+        messages, tools = builder.build(history, dynamic="当前时间: ...")
+    历史消息的规范化结果按对象缓存，每次构建只处理新增的消息。
+    """
+
+    def __init__(self, system_prompt: str | None = None, tools: Sequence[dict[str, Any]] | None = None):
+        self._system = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        self._tools = canonical_tools(tools)
+        self._memo: dict[int, tuple[dict[str, Any], dict[str, Any]]] = {}
+        self._prefix_fingerprint: str | None = None
+
+    @property
+    def tools(self) -> list[dict[str, Any]] | None:
+        return self._tools
+
+    def set_tools(self, tools: Sequence[dict[str, Any]] | None):
+        self._tools = canonical_tools(tools)
+
+    def _canonical(self, message: dict[str, Any]) -> dict[str, Any]:
+        cached = self._memo.get(id(message))
+        if cached is not None and cached[0] is message:
+            return cached[1]
+        result = canonical_message(message)
+        self._memo[id(message)] = (message, result)
+        return result
+
+    def build(
+        self,
+        history: Sequence[dict[str, Any]],
+        dynamic: str | None = None,
+    ) -> tuple[list[dict[str, Any]], list[dict[str, Any]] | None]:
+        """返回 (messages, tools)：系统提示 → 历史 → 本轮动态信息"""
+        messages = [*self._system, *(self._canonical(m) for m in history)]
+        if dynamic:
+            messages.append({"role": "system", "content": dynamic})
+        # 只保留仍在历史中的缓存项
+        if len(self._memo) > 2 * len(history) + 16:
+            alive = {id(m) for m in history}
+            self._memo = {k: v for k, v in self._memo.items() if k in alive}
+        self._check_prefix(messages)
+        return messages, self._tools
+
+    def _check_prefix(self, messages: list[dict[str, Any]]):
+        """系统提示或工具描述变化时记录日志：之后的请求将无法命中旧前缀"""
+        head = [m for m in messages if m.get("role") == "system"][:1]
+        blob = json.dumps([head, self._tools], ensure_ascii=False, sort_keys=True)
+        fingerprint = hashlib.sha1(blob.encode("utf-8")).hexdigest()[:12]
+        if self._prefix_fingerprint not in (None, fingerprint):
+            log.info(f"请求前缀已变化，前缀缓存将失效 | {self._prefix_fingerprint} -> {fingerprint}")
+        self._prefix_fingerprint = fingerprint
+
+
+class UsageMeter:
+    """累计 Token 用量与前缀缓存命中率"""
+
+    def __init__(self):
+        self.totals: dict[str, int] = {}
+        self.requests = 0
+
+    def add(self, usage: dict[str, int] | None):
+        if not usage:
+            return
+        self.requests += 1
+        for key, value in usage.items():
+            self.totals[key] = self.totals.get(key, 0) + (value or 0)
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        prompt = self.totals.get("prompt_tokens", 0)
+        return self.totals.get("cached_tokens", 0) / prompt if prompt else 0.0
+
+    def summary(self) -> str:
+        t = self.totals
+        return (
+            f"请求 {self.requests} 次 · 输入 {t.get('prompt_tokens', 0)} · 输出 {t.get('completion_tokens', 0)}"
+            f" · 缓存命中 {t.get('cached_tokens', 0)} ({self.cache_hit_ratio:.0%})"
+        )
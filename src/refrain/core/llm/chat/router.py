@@ -0,0 +1,312 @@
+"""
+弹性路由后端 - 在多个 ModelProfile 之间重试、对冲与故障转移
+
+- 重试：429 / 5xx / 连接错误按指数退避 + 抖动重试（尊重 Retry-After）
+- 对冲：首 token（非流式为总耗时）超过历史分位数阈值时，向下一个供应商并发发起同一请求，先到先得
+- 故障转移 + 熔断：某路由连续失败后熔断一段时间，期间请求直接跳过该路由
+
+流式请求只在产出第一帧之前进行重试、对冲或转移；一旦开始输出，后续错误直接抛出。
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Awaitable, Callable, Type, TypeVar
+from pydantic import BaseModel
+
+from refrain.core.logger import log
+from .base import BaseLLM
+from .metrics import MetricsRegistry, get_metrics
+from .schemas import LLMResponse
+
+T = TypeVar("T", bound=BaseModel)
+R = TypeVar("R")
+
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """判断异常是否值得重试 / 转移（限流、服务端错误、网络问题）"""
+    if isinstance(exc, asyncio.TimeoutError):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    try:
+        import openai
+        return isinstance(exc, openai.APIConnectionError)
+    except ImportError:
+        return False
+
+
+def _retry_after(exc: BaseException) -> float | None:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class RetryPolicy:
+    """指数退避重试策略"""
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    jitter: bool = True
+
+    def delay(self, attempt: int, exc: BaseException | None = None) -> float:
+        hinted = _retry_after(exc) if exc else None
+        if hinted is not None:
+            return min(hinted, self.max_delay)
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        # Full Jitter：在 [0, delay] 内均匀取值，避免多个客户端同时重试
+        return random.uniform(0, delay) if self.jitter else delay
+
+
+class CircuitBreaker:
+    """熔断器：closed → (连续失败) → open → (冷却) → half-open → 成功则 closed"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold or self.state == "half-open":
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """滑动窗口延迟统计，用于计算对冲阈值"""
+
+    def __init__(self, window: int = 200):
+        self.samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+@dataclass
+class Route:
+    """路由条目：一个 Profile 对应的后端及其健康状态"""
+    name: str
+    backend: BaseLLM
+    breaker: CircuitBreaker
+    latency: dict[str, LatencyTracker]
+
+
+class RouterLLM(BaseLLM):
+    """
+    弹性路由后端：按顺序尝试多个后端。
+    hedge_percentile：对冲阈值取主路由历史延迟的分位数；样本不足 min_samples 时使用 hedge_after（None 表示不对冲）。
+    metrics：重试次数写入的指标注册表，默认沿用后端（InstrumentedLLM）的注册表，否则为全局注册表。
+    """
+
+    def __init__(
+        self,
+        backends: list[tuple[str, BaseLLM]],
+        retry: RetryPolicy | None = None,
+        hedge_percentile: float = 0.95,
+        hedge_after: float | None = None,
+        min_samples: int = 20,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        metrics: MetricsRegistry | None = None,
+    ):
+        if not backends:
+            raise ValueError("RouterLLM 至少需要一个后端")
+        self.routes = [
+            Route(name, backend, CircuitBreaker(failure_threshold, reset_timeout), {})
+            for name, backend in backends
+        ]
+        self.retry = retry or RetryPolicy()
+        self.hedge_percentile = hedge_percentile
+        self.hedge_after = hedge_after
+        self.min_samples = min_samples
+        self.metrics = metrics
+
+    @property
+    def default_model(self) -> str | None:
+        return getattr(self.routes[0].backend, "default_model", None)
+
+    @property
+    def rate_limiter(self):
+        return self.routes[0].backend.rate_limiter
+
+    # ---------- 调度核心 ----------
+
+    def _record_retry(self, route: Route):
+        backend = route.backend
+        registry = self.metrics or getattr(backend, "registry", None) or get_metrics()
+        profile = getattr(backend, "profile", None)
+        registry.profile(profile if isinstance(profile, str) else route.name).retries += 1
+
+    def _hedge_delay(self, route: Route, kind: str) -> float | None:
+        tracker = route.latency.get(kind)
+        if tracker and len(tracker.samples) >= self.min_samples:
+            return tracker.percentile(self.hedge_percentile)
+        return self.hedge_after
+
+    async def _attempt(self, route: Route, kind: str, op: Callable[[BaseLLM], Awaitable[R]]) -> R:
+        """在单个路由上带重试地执行操作，并维护熔断与延迟统计"""
+        for attempt in range(self.retry.max_attempts):
+            start = time.perf_counter()
+            try:
+                result = await op(route.backend)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                route.breaker.record_failure()
+                if attempt + 1 >= self.retry.max_attempts or not route.breaker.allow():
+                    raise
+                delay = self.retry.delay(attempt, e)
+                self._record_retry(route)
+                log.warning(f"LLM 路由重试 | {route.name} | 第 {attempt + 1} 次失败: {type(e).__name__} | {delay:.2f}s 后重试")
+                await asyncio.sleep(delay)
+                continue
+            route.breaker.record_success()
+            route.latency.setdefault(kind, LatencyTracker()).record(time.perf_counter() - start)
+            return result
+        raise RuntimeError("unreachable")
+
+    async def _run(
+        self,
+        kind: str,
+        op: Callable[[BaseLLM], Awaitable[R]],
+        discard: Callable[[R], Awaitable[None]] | None = None,
+    ) -> R:
+        """按路由顺序执行：主路由超过对冲阈值时并发启动下一个路由，全部失败时抛出最后一个错误"""
+        routes = [r for r in self.routes if r.breaker.allow()]
+        if not routes:
+            raise RuntimeError("所有模型路由均处于熔断状态，请稍后重试")
+
+        last_error: BaseException | None = None
+        i = 0
+        while i < len(routes):
+            primary = routes[i]
+            i += 1
+            tasks = {asyncio.create_task(self._attempt(primary, kind, op)): primary}
+            hedge_delay = self._hedge_delay(primary, kind)
+            try:
+                while tasks:
+                    can_hedge = hedge_delay is not None and len(tasks) == 1 and i < len(routes)
+                    done, _ = await asyncio.wait(
+                        tasks, timeout=hedge_delay if can_hedge else None,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    if not done:
+                        hedge = routes[i]
+                        i += 1
+                        hedge_delay = None
+                        log.info(f"LLM 对冲请求 | {primary.name} 超过 {self.hedge_percentile:.0%} 分位延迟，并发请求 {hedge.name}")
+                        tasks[asyncio.create_task(self._attempt(hedge, kind, op))] = hedge
+                        continue
+                    for task in done:
+                        route = tasks.pop(task)
+                        error = task.exception()
+                        if error is None:
+                            if route is not primary:
+                                log.info(f"LLM 路由切换 | 由 {route.name} 完成请求")
+                            return task.result()
+                        if not is_retryable(error):
+                            raise error
+                        log.warning(f"LLM 路由失败 | {route.name}: {type(error).__name__}")
+                        last_error = error
+            finally:
+                await self._cancel(tasks, discard)
+
+        raise last_error or RuntimeError("所有模型路由均调用失败")
+
+    @staticmethod
+    async def _cancel(tasks: dict, discard: Callable[[Any], Awaitable[None]] | None):
+        """取消落败的请求；已成功但落败的结果交给 discard 清理（如关闭流）"""
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                result = await task
+            except BaseException:
+                continue
+            if discard:
+                await discard(result)
+
+    # ---------- 三条轨道 ----------
+
+    async def chat(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+        tool_choice: str | dict = "auto",
+        **kwargs
+    ) -> LLMResponse:
+        return await self._run(
+            "chat", lambda b: b.chat(messages, tools=tools, tool_choice=tool_choice, **kwargs)
+        )
+
+    async def structured_chat(
+        self,
+        messages: list[dict[str, Any]],
+        response_model: Type[T],
+        **kwargs
+    ) -> T:
+        return await self._run(
+            "structured", lambda b: b.structured_chat(messages, response_model, **kwargs)
+        )
+
+    async def stream_chat(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+        tool_choice: str | dict = "auto",
+        **kwargs
+    ) -> AsyncGenerator[LLMResponse, None]:
+        async def open_stream(backend: BaseLLM):
+            # 以首帧到达作为“成功”，对冲阈值因此基于首 token 延迟
+            stream = backend.stream_chat(messages, tools=tools, tool_choice=tool_choice, **kwargs)
+            try:
+                first = await stream.__anext__()
+            except BaseException:
+                await stream.aclose()
+                raise
+            return stream, first
+
+        async def close_stream(opened):
+            await opened[0].aclose()
+
+        stream, first = await self._run("stream", open_stream, discard=close_stream)
+        try:
+            yield first
+            async for frame in stream:
+                yield frame
+        finally:
+            await stream.aclose()
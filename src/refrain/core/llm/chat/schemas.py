@@ -40,13 +40,16 @@ class LLMResponse(BaseModel):
     final_reasoning: str | None = None
     
     tool_calls: list[ToolCall] | None = None
+    # 已开始接收的工具调用数（增量帧）：首个碎片到达即计数，早于调用拼装完成出现在 tool_calls 中
+    tool_calls_started: int = 0
     
     # Token 统计
     usage: dict[str, int] = Field(
         default_factory=lambda: {
             "prompt_tokens": 0, 
             "completion_tokens": 0,
-            "reasoning_tokens": 0  # 新增：记录思考消耗的 token
+            "reasoning_tokens": 0,  # 新增：记录思考消耗的 token
+            "cached_tokens": 0  # 命中前缀缓存的输入 token（计入 prompt_tokens）
         }
     )
     
@@ -0,0 +1,206 @@
+"""
+流式状态累加器 - 以线性代价拼装 stream_chat 的增量碎片
+
+- 文本缓冲使用 list 追加，仅在终局帧 join 一次，避免 `+=` 带来的平方级拷贝
+- 工具调用按 index 累积碎片，只有当某个调用的参数发生变化时才重新物化对应的 ToolCall，
+  未变化的调用直接复用上一次的对象
+- 增量帧只附带已拼装完成的调用，每个调用只物化一次，长参数不会逐帧重新拼接。
+  调用完成的判定：后续索引已出现；或参数碎片以 } 结尾且已能解析为完整 JSON 对象；或流给出了 finish_reason
+"""
+import json
+from typing import Any
+from .schemas import LLMResponse, ToolCall
+
+
+def extract_usage(usage: Any) -> dict[str, int]:
+    """
+    从 OpenAI 协议的 usage 对象提取 Token 统计。
+    cached_tokens 为命中前缀缓存的输入 token：OpenAI 位于 prompt_tokens_details.cached_tokens，
+    DeepSeek 为顶层的 prompt_cache_hit_tokens。
+    """
+    result = {"prompt_tokens": 0, "completion_tokens": 0, "reasoning_tokens": 0, "cached_tokens": 0}
+    if not usage:
+        return result
+    result["prompt_tokens"] = getattr(usage, "prompt_tokens", 0) or 0
+    result["completion_tokens"] = getattr(usage, "completion_tokens", 0) or 0
+    details = getattr(usage, "completion_tokens_details", None)
+    if details:
+        result["reasoning_tokens"] = getattr(details, "reasoning_tokens", 0) or 0
+    cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    if cached is None:
+        prompt_details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(prompt_details, "cached_tokens", None) if prompt_details else None
+    result["cached_tokens"] = cached or 0
+    return result
+
+
+class _ToolFragment:
+    """单个工具调用的碎片缓冲"""
+    __slots__ = ("id", "name_parts", "args_parts", "call")
+
+    def __init__(self, call_id: str | None):
+        self.id = call_id or ""
+        self.name_parts: list[str] = []
+        self.args_parts: list[str] = []
+        self.call: ToolCall | None = None  # 最近一次物化的结果，None 表示已脏
+
+    def args_complete(self) -> bool:
+        """参数是否已是完整的 JSON 对象；只有最新碎片以 } 结尾时才拼接解析，长参数流式期间代价为 O(1)"""
+        if not self.args_parts or not self.args_parts[-1].rstrip().endswith("}"):
+            return False
+        try:
+            return isinstance(json.loads(self.materialize().function_args), dict)
+        except json.JSONDecodeError:
+            return False
+
+    def materialize(self) -> ToolCall:
+        if self.call is None:
+            self.call = ToolCall(
+                id=self.id,
+                function_name="".join(self.name_parts),
+                function_args="".join(self.args_parts),
+            )
+        return self.call
+
+
+class StreamAccumulator:
+    """
+    流式响应累加器：负责累积内容、思考链、工具调用碎片与 usage，
+    并按需产出增量帧与终局帧。
+    """
+
+    def __init__(self):
+        self._content: list[str] = []
+        self._reasoning: list[str] = []
+        self._tools: dict[int, _ToolFragment] = {}
+        self._tool_list: list[ToolCall] | None = None
+        self._finished: list[ToolCall] = []  # 已拼装完成的调用（按索引顺序），每个只物化一次
+        self.usage: dict[str, int] = extract_usage(None)
+        self._finish_reason: str | None = None
+
+    @property
+    def finish_reason(self) -> str | None:
+        return self._finish_reason
+
+    @finish_reason.setter
+    def finish_reason(self, reason: str | None):
+        """流给出 finish_reason 后不会再有碎片，所有调用（含最后一个）都视为完成"""
+        self._finish_reason = reason
+        if reason:
+            self._finish_up_to(len(self._tools))
+
+    # ---------- 累积 ----------
+
+    def add_content(self, text: str | None):
+        if text:
+            self._content.append(text)
+
+    def add_reasoning(self, text: str | None):
+        if text:
+            self._reasoning.append(text)
+
+    def add_tool_deltas(self, deltas: Any) -> bool:
+        """累积 OpenAI 协议的 tool_calls 碎片，返回是否有调用发生变化"""
+        changed = False
+        started = False
+        for tc in deltas or ():
+            frag = self._tools.get(tc.index)
+            if frag is None:
+                frag = self._tools[tc.index] = _ToolFragment(tc.id)
+                changed = started = True
+            if tc.id and tc.id != frag.id:
+                frag.id = tc.id
+                frag.call = None
+                changed = True
+            fn = tc.function
+            if fn:
+                if fn.name:
+                    frag.name_parts.append(fn.name)
+                    frag.call = None
+                    changed = True
+                if fn.arguments:
+                    frag.args_parts.append(fn.arguments)
+                    frag.call = None
+                    changed = True
+        if changed:
+            self._tool_list = None
+            # 调用按索引顺序流式输出：出现新索引即表示之前的调用已经完整；
+            # 最后一个调用在参数成为完整 JSON 对象时即可视为完成（单调用的轮次也能被推测执行）
+            count = len(self._tools)
+            if not started and len(self._finished) == count:
+                return changed
+            last = self._tools[max(self._tools)]
+            self._finish_up_to(count if last.args_complete() else count - 1)
+        return changed
+
+    def _finish_up_to(self, count: int):
+        indices = sorted(self._tools)
+        for i in indices[len(self._finished):count]:
+            self._finished.append(self._tools[i].materialize())
+
+    def set_usage(self, usage: Any):
+        """从 usage 帧中提取 Token 统计"""
+        if usage:
+            self.usage = extract_usage(usage)
+
+    # ---------- 读取 ----------
+
+    @property
+    def content(self) -> str:
+        return "".join(self._content)
+
+    @property
+    def reasoning(self) -> str:
+        return "".join(self._reasoning)
+
+    def tool_calls(self) -> list[ToolCall] | None:
+        """当前完整的工具调用列表（未变化时返回同一个列表对象）"""
+        if not self._tools:
+            return None
+        if self._tool_list is None:
+            self._tool_list = [self._tools[i].materialize() for i in sorted(self._tools)]
+        return self._tool_list
+
+    def finished_tool_calls(self) -> list[ToolCall] | None:
+        """
+        已拼装完成的工具调用（不含仍在接收参数的调用）。
+        每个调用只在完成时物化一次，长参数流式过程中不会反复拼接。
+        """
+        return self._finished or None
+
+    # ---------- 帧构建 ----------
+
+    def delta_frame(
+        self,
+        content: str | None,
+        reasoning: str | None,
+        finish_reason: str | None,
+        delta_only: bool = False,
+    ) -> LLMResponse:
+        """
+        构建增量帧。
+        默认附带已拼装完成的工具调用（供推测执行提前启动），正在接收参数的调用不在其中，
+        因此增量帧中的调用一经出现便不会再变化；
+        delta_only=True 时仅携带本次增量，工具调用在终局帧中一次性给出。
+        """
+        return LLMResponse(
+            content=content,
+            reasoning_content=reasoning,
+            is_delta=True,
+            tool_calls=None if delta_only else self.finished_tool_calls(),
+            tool_calls_started=len(self._tools),
+            finish_reason=finish_reason,  # type: ignore
+        )
+
+    def final_frame(self) -> LLMResponse:
+        """构建终局帧（包含全量文本、工具调用与 usage）"""
+        reasoning = self.reasoning
+        return LLMResponse(
+            content=None,
+            reasoning_content=None,
+            final_content=self.content,
+            final_reasoning=reasoning if reasoning else None,
+            tool_calls=self.tool_calls(),
+            usage=dict(self.usage),
+            finish_reason=self.finish_reason or "stop",  # type: ignore
+        )
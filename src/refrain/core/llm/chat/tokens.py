@@ -0,0 +1,39 @@
+"""
+Token 估算 - 无需分词器的快速近似
+
+用于限流 (TPM) 与上下文预算等只需要量级准确的场景：
+ASCII 文本约 4 字符 / token，CJK 等宽字符约 1 字符 / token。
+"""
+import json
+from typing import Any
+
+# 每条消息的协议开销（role、分隔符等）
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: str | None) -> int:
+    """估算一段文本的 token 数"""
+    if not text:
+        return 0
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def estimate_message_tokens(message: dict[str, Any]) -> int:
+    """估算单条消息的 token 数（包括思考链与工具调用参数）"""
+    total = MESSAGE_OVERHEAD
+    content = message.get("content")
+    if isinstance(content, str):
+        total += estimate_tokens(content)
+    elif content:
+        total += estimate_tokens(json.dumps(content, ensure_ascii=False))
+    if message.get("reasoning_content"):
+        total += estimate_tokens(message["reasoning_content"])
+    if message.get("tool_calls"):
+        total += estimate_tokens(json.dumps(message["tool_calls"], ensure_ascii=False, default=str))
+    return total
+
+
+def estimate_messages_tokens(messages: list[dict[str, Any]]) -> int:
+    """估算整段对话的 token 数"""
+    return sum(estimate_message_tokens(m) for m in messages)
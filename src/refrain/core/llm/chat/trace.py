@@ -0,0 +1,239 @@
+"""
+对话追踪 - 将每次请求 / 响应以紧凑 JSONL 写入 logs/trace/，供复盘与回放
+
+- 调用方只做一次入队（O(1)，不做序列化），队列有界，写满时丢弃并计数，绝不阻塞请求路径
+- 后台线程批量取出记录，序列化后一次写入并 flush
+- 按天滚动，单文件超过 max_bytes 时提前滚动；滚出的文件按当天序号改名（不会相互覆盖），
+  由独立的压缩线程压缩为 .gz（安装 zstandard 时可选 .zst），压缩大文件期间写入线程照常消费队列
+- 由 CHAT_TRACE 开关控制，关闭时 record_trace 为空操作
+"""
+import atexit
+import gzip
+import json
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel
+
+from refrain.core.logger import log
+
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+_STOP = object()
+
+
+def _jsonable(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(exclude_none=True)
+    return str(obj)
+
+
+def dumps(entry: dict[str, Any]) -> str:
+    """紧凑序列化：无多余空白，保留中文原文"""
+    return json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=_jsonable)
+
+
+def compress_file(path: Path, compression: str) -> Path:
+    """压缩已滚出的追踪文件并删除原文件，返回压缩后的路径"""
+    if compression == "zstd":
+        import zstandard
+        target = path.with_name(path.name + ".zst")
+        with open(path, "rb") as src, open(target, "wb") as dst:
+            zstandard.ZstdCompressor().copy_stream(src, dst)
+    else:
+        target = path.with_name(path.name + ".gz")
+        with open(path, "rb") as src, gzip.open(target, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+    path.unlink()
+    return target
+
+
+class TraceWriter:
+    """
+    后台批量写入的 JSONL 追踪器。
+    max_queue：队列容量；batch_size：单次写入的最大记录数；flush_interval：空闲时的最长等待（秒）；
+    max_bytes：单文件大小上限；compression：滚动后的压缩方式 none | gzip | zstd。
+    """
+
+    def __init__(
+        self,
+        directory: Path | str,
+        max_queue: int = 4096,
+        batch_size: int = 256,
+        flush_interval: float = 1.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        compression: str = "gzip",
+    ):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"未知的压缩方式 '{compression}'，可选: {', '.join(COMPRESSIONS)}")
+        if compression == "zstd":
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                log.warning("未安装 zstandard，追踪文件改用 gzip 压缩")
+                compression = "gzip"
+        self.directory = Path(directory)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.dropped = 0
+        self.written = 0
+        self._queue: queue.Queue = queue.Queue(max_queue)
+        self._file = None
+        self._path: Path | None = None
+        self._day = ""
+        self._seq = 0
+        self._compress_queue: queue.Queue = queue.Queue()
+        self._compressor: threading.Thread | None = None
+        self._thread = threading.Thread(target=self._run, name="refrain-trace", daemon=True)
+        self._thread.start()
+
+    def record(self, entry: dict[str, Any]) -> bool:
+        """入队一条记录（不序列化、不阻塞），队列已满时丢弃并返回 False"""
+        entry.setdefault("ts", time.time())
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self):
+        """等待已入队的记录全部落盘"""
+        self._queue.join()
+
+    def close(self):
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self._compressor is not None:
+            self._compress_queue.put(_STOP)
+            self._compressor.join()
+
+    # ---------- 后台线程 ----------
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    first = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                batch = [first]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = any(item is _STOP for item in batch)
+                try:
+                    self._write([item for item in batch if item is not _STOP])
+                except Exception as e:
+                    log.warning(f"追踪写入失败 | {type(e).__name__}: {e}")
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write(self, entries: list[dict[str, Any]]):
+        if not entries:
+            return
+        lines = []
+        for entry in entries:
+            try:
+                lines.append(dumps(entry))
+            except (TypeError, ValueError) as e:
+                log.warning(f"追踪记录无法序列化 | {type(e).__name__}: {e}")
+        f = self._current_file()
+        f.write("\n".join(lines) + "\n")
+        f.flush()
+        self.written += len(lines)
+        if f.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _current_file(self):
+        day = datetime.now().strftime("%Y-%m-%d")
+        if self._file is not None and day != self._day:
+            self._rotate()
+        if self._file is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if day != self._day:
+                self._seq = 0
+            self._day = day
+            self._path = self.directory / f"trace_{day}.jsonl"
+            self._file = open(self._path, "a", encoding="utf-8")
+        return self._file
+
+    def _rotated_path(self, path: Path) -> Path:
+        """当天下一个未被占用的序号文件名（同时检查压缩后的文件，兼容多进程与重启）"""
+        while True:
+            self._seq += 1
+            candidate = path.with_name(f"{path.stem}-{self._seq:04d}.jsonl")
+            if not any(candidate.with_name(candidate.name + ext).exists() for ext in ("", ".gz", ".zst")):
+                return candidate
+
+    def _rotate(self):
+        """关闭当前文件并改名为序号文件，压缩交给压缩线程"""
+        self._file.close()
+        self._file = None
+        path = self._path.rename(self._rotated_path(self._path))
+        if self.compression == "none":
+            return
+        if self._compressor is None:
+            self._compressor = threading.Thread(target=self._compress_loop, name="refrain-trace-compress", daemon=True)
+            self._compressor.start()
+        self._compress_queue.put(path)
+
+    def _compress_loop(self):
+        while True:
+            path = self._compress_queue.get()
+            if path is _STOP:
+                return
+            try:
+                compress_file(path, self.compression)
+            except Exception as e:
+                log.warning(f"追踪文件压缩失败 | {path.name} | {type(e).__name__}: {e}")
+
+
+_writer: TraceWriter | None = None
+_writer_lock = threading.Lock()
+
+
+def get_trace_writer() -> TraceWriter | None:
+    """按配置创建全局追踪器；CHAT_TRACE 关闭时返回 None"""
+    global _writer
+    if _writer is None:
+        from refrain.core.config import get_settings
+        settings = get_settings()
+        if not settings.CHAT_TRACE:
+            return None
+        with _writer_lock:
+            if _writer is None:
+                from refrain.core.logger import get_log_dir
+                writer = TraceWriter(get_log_dir() / "trace", compression=settings.CHAT_TRACE_COMPRESSION)
+                atexit.register(writer.close)
+                _writer = writer
+    return _writer
+
+
+def record_trace(kind: str, model: str, messages: list[dict[str, Any]], **fields: Any):
+    """
+    记录一次模型调用。messages 只做浅拷贝，序列化在后台线程完成。
+    fields：tools / response / usage / duration / error 等。
+    """
+    writer = get_trace_writer()
+    if writer is None:
+        return
+    writer.record({"kind": kind, "model": model, "messages": list(messages), **fields})
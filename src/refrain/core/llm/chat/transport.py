@@ -0,0 +1,111 @@
+"""
+共享传输层 - 进程级 HTTP 连接池
+
+同一个 base_url 的所有后端实例共享一个 AsyncClient（长连接、可用时启用 HTTP/2），
+切换 Profile 或临时构建后端时不再重复建立连接与 TLS 握手。
+
+连接池参数可通过 ModelProfile.extra_params 配置：
+    max_connections / max_keepalive_connections / keepalive_expiry / http2
+
+连接与事件循环绑定，因此连接池按 (事件循环, base_url, 参数) 区分；
+事件循环结束前应调用 `aclose_http_clients()` 释放连接（ChatSession 退出时自动调用）。
+"""
+import asyncio
+import importlib.util
+from typing import Any
+
+import httpx
+
+from refrain.core.logger import log
+
+# 可从 extra_params 中提取的连接池参数
+POOL_PARAMS = ("max_connections", "max_keepalive_connections", "keepalive_expiry", "http2")
+
+DEFAULT_POOL: dict[str, Any] = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,  # Agent 循环中的短间隔调用尽量复用连接
+    "http2": None,             # None 表示自动：安装了 h2 时启用
+}
+
+# (id(loop), base_url, 参数) -> (loop, client)
+_clients: dict[tuple, tuple[asyncio.AbstractEventLoop, "httpx.AsyncClient"]] = {}
+
+
+def pop_pool_params(params: dict[str, Any]) -> dict[str, Any]:
+    """从参数字典中取出连接池相关配置（原字典中会被移除）"""
+    return {k: params.pop(k) for k in POOL_PARAMS if k in params}
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def _prune_closed_loops():
+    """丢弃已关闭事件循环上的连接池（其连接已不可用）"""
+    for key in [k for k, (loop, _) in _clients.items() if loop.is_closed()]:
+        del _clients[key]
+
+
+def get_http_client(base_url: str | None, **pool: Any) -> "httpx.AsyncClient":
+    """获取当前事件循环下 base_url 对应的共享连接池，必须在协程中调用"""
+    loop = asyncio.get_running_loop()
+    opts = {**DEFAULT_POOL, **{k: v for k, v in pool.items() if v is not None}}
+    if opts["http2"] is None:
+        opts["http2"] = _http2_available()
+
+    key = (id(loop), base_url or "", tuple(sorted(opts.items())))
+    entry = _clients.get(key)
+    if entry and not entry[1].is_closed:
+        return entry[1]
+
+    _prune_closed_loops()
+    client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=opts["max_connections"],
+            max_keepalive_connections=opts["max_keepalive_connections"],
+            keepalive_expiry=opts["keepalive_expiry"],
+        ),
+        http2=opts["http2"],
+        follow_redirects=True,
+    )
+    _clients[key] = (loop, client)
+    log.info(f"创建共享连接池 | base_url: {base_url or '默认'} | HTTP/2: {opts['http2']}")
+    return client
+
+
+class PooledOpenAIClient:
+    """
+    绑定共享连接池的 OpenAI SDK 客户端，供 OpenAIProvider 与 OpenAIEmbedder 共用。
+    连接池按事件循环与 base_url 复用，池被替换（如事件循环更换）时才重建 SDK 客户端。
+    """
+
+    def __init__(self, api_key: str | None, base_url: str | None, timeout: float, pool_params: dict[str, Any]):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.pool_params = pool_params
+        self.http_client: httpx.AsyncClient | None = None
+        self._client = None
+
+    def get(self):
+        """当前事件循环下的 AsyncOpenAI 客户端，必须在协程中调用"""
+        http_client = get_http_client(self.base_url, **self.pool_params)
+        if self._client is None or self.http_client is not http_client:
+            from openai import AsyncOpenAI
+            self.http_client = http_client
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                http_client=http_client,
+            )
+        return self._client
+
+
+async def aclose_http_clients():
+    """关闭当前事件循环上的所有共享连接池"""
+    loop = asyncio.get_running_loop()
+    for key in [k for k, (owner, _) in _clients.items() if owner is loop]:
+        _, client = _clients.pop(key)
+        await client.aclose()
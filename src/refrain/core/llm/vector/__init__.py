@@ -1 +1,16 @@
 # 向量模型模块
+from .base import BaseEmbedder, BaseVectorStore
+from .numpy_store import NumpyVectorStore
+from .mmap_store import MmapVectorStore
+from .ivf_store import IVFVectorStore, benchmark_recall
+from .openai_embedder import OpenAIEmbedder, EmbeddingCache
+from .local_embedder import HashingEmbedder, OnnxEmbedder, get_local_embedder
+from .lexical import BM25Index
+from .hybrid import HybridStore, reciprocal_rank_fusion
+from .factory import get_embedder
+
+__all__ = ["BaseEmbedder", "BaseVectorStore", "NumpyVectorStore", "MmapVectorStore",
+           "IVFVectorStore", "benchmark_recall",
+           "OpenAIEmbedder", "EmbeddingCache", "get_embedder",
+           "HashingEmbedder", "OnnxEmbedder", "get_local_embedder",
+           "BM25Index", "HybridStore", "reciprocal_rank_fusion"]
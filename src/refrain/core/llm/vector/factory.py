@@ -0,0 +1,48 @@
+from functools import lru_cache
+from refrain.core.config import get_settings, get_user_config
+from refrain.core.logger import log
+from .base import BaseEmbedder
+
+
+def get_embedder(alias: str | None = None, model: str | None = None) -> BaseEmbedder:
+    """
+    向量模型工厂：复用 Profile 的凭证与 base_url，Profile 取 alias 参数或 .env 中的 EMBEDDING_PROFILE，
+    模型取 model 参数或 .env 中的 EMBEDDING_MODEL。
+    对话 Profile（如 DeepSeek）通常不提供 /embeddings 接口，因此不会隐式沿用当前激活的 Profile：
+    未指定或找不到 Profile 时回退到本地向量模型并给出警告。
+    """
+    alias = alias or get_settings().EMBEDDING_PROFILE
+    profile = get_user_config().config.profiles.get(alias) if alias else None
+    if profile is None:
+        from .local_embedder import get_local_embedder
+        reason = f"未找到 Profile '{alias}'" if alias else "未配置 EMBEDDING_PROFILE"
+        log.warning(f"{reason}，向量模型回退到本地哈希向量（离线，语义检索效果较弱）")
+        return get_local_embedder()
+    return _build_embedder(
+        name=profile.name,
+        api_key_env=profile.api_key_env,
+        base_url=profile.base_url,
+        model=model,
+        timeout=profile.timeout,
+        rpm=profile.rpm,
+        tpm=profile.tpm,
+    )
+
+
+@lru_cache(maxsize=8)
+def _build_embedder(
+    name: str | None = None,
+    api_key_env: str | None = None,
+    base_url: str | None = None,
+    model: str | None = None,
+    timeout: float = 60.0,
+    rpm: int | None = None,
+    tpm: int | None = None,
+) -> BaseEmbedder:
+    from .openai_embedder import OpenAIEmbedder
+    embedder = OpenAIEmbedder(
+        model=model, base_url=base_url, api_key_env=api_key_env,
+        timeout=timeout, name=name, rpm=rpm, tpm=tpm,
+    )
+    log.info(f"构建向量模型 | Profile: {name or '默认'} | 模型: {embedder.model}")
+    return embedder
@@ -0,0 +1,130 @@
+"""
+混合检索 - BM25 词法检索 + 向量检索，以倒数排名融合（RRF）合并
+
+- RRF：score(d) = Σ 1 / (k_rrf + rank_i(d))，只依赖名次，无需对两路得分做归一化
+- 查询形如标识符（`get_user_config`、`HTTPServerError`、`a.b.c`）时 mode="auto" 只走词法检索，
+  免去向量模型的调用延迟；自然语言查询两路并行后融合
+- HybridStore 同时实现 BaseVectorStore：写入与删除同步到两路索引，
+  similarity_search 传入 query= 时启用融合，否则等同于纯向量检索
+"""
+import asyncio
+import re
+from typing import Any, Sequence
+
+from .base import BaseEmbedder, BaseVectorStore
+from .lexical import BM25Index
+
+_SYMBOL_QUERY = re.compile(r"^[A-Za-z_][\w.:]*$")
+_CASE_BOUNDARY = re.compile(r"[a-z][A-Z]|[A-Z]{2}[a-z]")
+
+SEARCH_MODES = ("auto", "hybrid", "lexical", "vector")
+
+
+def is_symbol_query(query: str) -> bool:
+    """单个标识符 / 限定名，且含下划线、点号或驼峰边界时视为符号查询"""
+    query = query.strip()
+    if not _SYMBOL_QUERY.match(query):
+        return False
+    return any(c in query for c in "_.:") or _CASE_BOUNDARY.search(query) is not None
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[list[dict]], k: int, k_rrf: int = 60) -> list[dict]:
+    """按 ID 融合多路有序结果，score 替换为 RRF 得分，sources 记录命中的检索路数"""
+    fused: dict[str, dict] = {}
+    for source, results in enumerate(result_lists):
+        for rank, hit in enumerate(results, 1):
+            entry = fused.get(hit["id"])
+            if entry is None:
+                entry = fused[hit["id"]] = {**hit, "score": 0.0, "sources": []}
+            entry["score"] += 1.0 / (k_rrf + rank)
+            entry["sources"].append(source)
+    return sorted(fused.values(), key=lambda h: h["score"], reverse=True)[:k]
+
+
+class HybridStore(BaseVectorStore):
+    """
+    词法 + 向量混合检索存储。
+    candidate_factor：每路检索召回 k * candidate_factor 个候选，越大融合越充分。
+    """
+
+    def __init__(
+        self,
+        vector_store: BaseVectorStore,
+        lexical: BM25Index | None = None,
+        embedder: BaseEmbedder | None = None,
+        k_rrf: int = 60,
+        candidate_factor: int = 4,
+    ):
+        self.vector_store = vector_store
+        self.lexical = lexical if lexical is not None else BM25Index()
+        self.embedder = embedder or getattr(vector_store, "embedder", None)
+        self.k_rrf = k_rrf
+        self.candidate_factor = candidate_factor
+
+    def __len__(self) -> int:
+        return len(self.lexical)
+
+    async def add_texts(
+        self,
+        texts: Sequence[str],
+        metadatas: list[dict] | None = None,
+        **kwargs: Any
+    ) -> list[str]:
+        """写入向量存储后以相同 ID 写入词法索引；kwargs 透传给向量存储（embeddings / ids）"""
+        ids = await self.vector_store.add_texts(texts, metadatas, **kwargs)
+        self.lexical.add(ids, texts, metadatas)
+        return ids
+
+    async def delete(self, ids: list[str]) -> bool:
+        removed = await self.vector_store.delete(ids)
+        return self.lexical.delete(ids) or removed
+
+    async def similarity_search(
+        self,
+        query_vector: list[float] | None,
+        k: int = 4,
+        **kwargs: Any
+    ) -> list[dict]:
+        """
+        kwargs: query (原始查询文本，提供时与词法检索融合)、filter
+        query_vector 为 None 时只做词法检索。
+        """
+        query = kwargs.pop("query", None)
+        if query is None:
+            return await self.vector_store.similarity_search(query_vector, k, **kwargs)
+        pool = k * self.candidate_factor
+        lexical_hits = self.lexical.search(query, pool, filter=kwargs.get("filter"))
+        if query_vector is None:
+            return lexical_hits[:k]
+        vector_hits = await self.vector_store.similarity_search(query_vector, pool, **kwargs)
+        return reciprocal_rank_fusion([lexical_hits, vector_hits], k, self.k_rrf)
+
+    async def search(self, query: str, k: int = 8, mode: str = "auto", **kwargs: Any) -> list[dict]:
+        """
+        文本检索入口。
+        mode: auto (符号查询只走词法，未命中或自然语言查询时混合) | hybrid | lexical | vector
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"未知的检索模式 '{mode}'，可选: {', '.join(SEARCH_MODES)}")
+        if mode == "auto" and is_symbol_query(query):
+            hits = self.lexical.search(query, k, filter=kwargs.get("filter"))
+            if hits or self.embedder is None:
+                return hits
+            mode = "hybrid"  # 符号未命中时退回混合检索
+        if mode == "lexical" or self.embedder is None:
+            return self.lexical.search(query, k, filter=kwargs.get("filter"))
+
+        if mode == "vector":
+            vector = await self.embedder.embed_text(query)
+            return await self.vector_store.similarity_search(vector, k, **kwargs)
+
+        pool = k * self.candidate_factor
+        # 词法检索在线程中执行，与查询向量的计算重叠
+        lexical_task = asyncio.create_task(asyncio.to_thread(self.lexical.search, query, pool, kwargs.get("filter")))
+        try:
+            vector = await self.embedder.embed_text(query)
+            vector_hits = await self.vector_store.similarity_search(vector, pool, **kwargs)
+        except BaseException:
+            lexical_task.cancel()
+            raise
+        return reciprocal_rank_fusion([await lexical_task, vector_hits], k, self.k_rrf)
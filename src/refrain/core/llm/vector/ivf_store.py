@@ -0,0 +1,303 @@
+"""
+近似最近邻向量存储 - IVF（倒排文件）+ 可选 PQ（乘积量化）
+
+- 粗量化：对样本做球面 k-means 得到 nlist 个质心，每个向量归入最近质心的倒排表
+- 检索：只扫描与查询最相近的 nprobe 个倒排表，代价约为全量的 nprobe / nlist
+- PQ（可选）：对向量相对所属质心的残差做乘积量化；候选先用 m 字节的编码查表估算得分（ADC），
+  再对前 k * rerank 个候选用原始向量精排
+- 增量写入：训练完成后新向量直接分配到已有质心；数据量增长到训练时的 retrain_factor 倍时自动重训
+- 未训练前（数据量低于 train_threshold）退化为暴力检索
+
+召回率 / 延迟通过 nprobe（越大越准越慢）与 rerank 调节，可用 benchmark_recall 对比精确检索评估。
+"""
+import time
+from array import array
+from typing import Any, Sequence
+import numpy as np
+
+from .base import BaseEmbedder
+from .numpy_store import NumpyVectorStore, match_metadata, normalize_rows, top_k_indices
+
+
+def assign_nearest(
+    data: np.ndarray,
+    centroids: np.ndarray,
+    spherical: bool = False,
+    block_rows: int = 65536,
+) -> np.ndarray:
+    """
+    为每行分配最近的质心。
+    spherical=True 时按内积（数据与质心均已归一化）；否则按 L2 距离，
+    利用 argmin ||x - c||² = argmax (x·c - ||c||² / 2) 转化为一次矩阵乘法。
+    """
+    bias = None if spherical else 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    result = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), block_rows):
+        scores = data[start:start + block_rows] @ centroids.T
+        if bias is not None:
+            scores -= bias
+        result[start:start + block_rows] = scores.argmax(axis=1)
+    return result
+
+
+def kmeans(
+    data: np.ndarray,
+    k: int,
+    iters: int = 20,
+    seed: int = 0,
+    spherical: bool = False,
+) -> np.ndarray:
+    """Lloyd k-means，空簇用随机样本重新播种；spherical=True 时质心每轮归一化"""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    previous = None
+    for _ in range(iters):
+        assign = assign_nearest(data, centroids, spherical)
+        if previous is not None and np.array_equal(assign, previous):
+            break
+        previous = assign
+        counts = np.bincount(assign, minlength=k)
+        nonempty = counts > 0
+        # 按簇排序后用 reduceat 分段求和，避免逐行累加
+        order = np.argsort(assign, kind="stable")
+        starts = (np.cumsum(counts) - counts)[nonempty]
+        sums = np.add.reduceat(data[order], starts, axis=0)
+        centroids[nonempty] = sums / counts[nonempty, None]
+        empty = np.flatnonzero(~nonempty)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+        if spherical:
+            centroids = normalize_rows(centroids)
+    return centroids
+
+
+class IVFVectorStore(NumpyVectorStore):
+    """
+    IVF 近似检索向量存储，接口与 NumpyVectorStore 一致。
+    原始向量始终保留（用于精排、重训与 exact=True 的精确检索），倒排表只记录行号。
+
+    nlist: 质心数量，None 表示训练时取 4 * sqrt(n)
+    nprobe: 每次检索扫描的倒排表数量
+    pq_m: PQ 子空间数量（需整除维度），None 表示不启用 PQ
+    rerank: 启用 PQ 时，精排候选数为 k * rerank
+    """
+
+    def __init__(
+        self,
+        dim: int | None = None,
+        embedder: BaseEmbedder | None = None,
+        nlist: int | None = None,
+        nprobe: int = 8,
+        pq_m: int | None = None,
+        pq_bits: int = 8,
+        rerank: int = 4,
+        train_threshold: int = 10_000,
+        train_sample: int = 64,
+        retrain_factor: float = 8.0,
+        kmeans_iters: int = 20,
+        seed: int = 0,
+        compact_ratio: float = 0.25,
+        initial_capacity: int = 1024,
+    ):
+        if pq_bits > 8:
+            raise ValueError("pq_bits 最大为 8（编码以 uint8 存储）")
+        super().__init__(dim, embedder, compact_ratio, initial_capacity)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.pq_bits = pq_bits
+        self.rerank = rerank
+        self.train_threshold = train_threshold
+        self.train_sample = train_sample  # 每个质心的训练样本数
+        self.retrain_factor = retrain_factor
+        self.kmeans_iters = kmeans_iters
+        self.seed = seed
+
+        self._centroids: np.ndarray | None = None
+        self._codebooks: np.ndarray | None = None  # (pq_m, ks, dsub)
+        self._lists: list[array] = []
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._codes = np.zeros((0, pq_m or 0), dtype=np.uint8)
+        self._trained_size = 0
+        self._check_pq()
+
+    def _check_pq(self):
+        """维度已知时校验 pq_m 能整除维度（在修改任何状态之前调用）"""
+        if self.pq_m and self.dim is not None and self.dim % self.pq_m:
+            raise ValueError(f"pq_m ({self.pq_m}) 必须整除向量维度 ({self.dim})")
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    # ---------- 训练与编码 ----------
+
+    def train(self):
+        """在当前数据上训练粗量化器（及 PQ 码本），并重建全部倒排表"""
+        self._check_pq()
+        live = np.flatnonzero(self._alive[:self._size])
+        if len(live) == 0:
+            return
+        nlist = self.nlist or max(1, int(4 * np.sqrt(len(live))))
+        nlist = min(nlist, len(live))
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(live), nlist * self.train_sample)
+        sample = self._matrix[np.sort(rng.choice(live, sample_size, replace=False))]
+
+        # 质心与码本都训练成功后才替换，失败时保持原状态
+        centroids = kmeans(sample, nlist, self.kmeans_iters, self.seed, spherical=True)
+        codebooks = None
+        if self.pq_m:
+            pq_sample = sample[:(2 ** self.pq_bits) * self.train_sample]
+            residuals = pq_sample - centroids[assign_nearest(pq_sample, centroids, spherical=True)]
+            codebooks = self._train_pq(residuals)
+        self._centroids, self._codebooks = centroids, codebooks
+        self._trained_size = len(live)
+
+        self._assign = np.zeros(len(self._matrix), dtype=np.int32)
+        self._codes = np.zeros((len(self._matrix), self.pq_m or 0), dtype=np.uint8)
+        self._encode(0, self._size)
+        self._rebuild_lists()
+
+    def _train_pq(self, sample: np.ndarray) -> np.ndarray:
+        dsub = self.dim // self.pq_m
+        ks = min(2 ** self.pq_bits, len(sample))
+        codebooks = np.zeros((self.pq_m, ks, dsub), dtype=np.float32)
+        for m in range(self.pq_m):
+            sub = np.ascontiguousarray(sample[:, m * dsub:(m + 1) * dsub])
+            codebooks[m] = kmeans(sub, ks, self.kmeans_iters, self.seed + m)
+        return codebooks
+
+    def _encode(self, start: int, stop: int):
+        """计算 [start, stop) 行的质心归属与 PQ 编码"""
+        vectors = self._matrix[start:stop]
+        self._assign[start:stop] = assign_nearest(vectors, self._centroids, spherical=True)
+        if self._codebooks is not None:
+            dsub = self.dim // self.pq_m
+            residuals = vectors - self._centroids[self._assign[start:stop]]
+            for m in range(self.pq_m):
+                sub = np.ascontiguousarray(residuals[:, m * dsub:(m + 1) * dsub])
+                self._codes[start:stop, m] = assign_nearest(sub, self._codebooks[m])
+
+    def _rebuild_lists(self):
+        """由行归属批量重建倒排表（仅包含存活行）"""
+        rows = np.flatnonzero(self._alive[:self._size])
+        clusters = self._assign[rows]
+        order = np.argsort(clusters, kind="stable")
+        bounds = np.cumsum(np.bincount(clusters, minlength=len(self._centroids)))
+        self._lists = []
+        begin = 0
+        for end in bounds:
+            postings = array("q")
+            postings.frombytes(rows[order[begin:end]].astype(np.int64).tobytes())
+            self._lists.append(postings)
+            begin = end
+
+    # ---------- 写入钩子 ----------
+
+    async def _embed(self, texts, embeddings) -> np.ndarray:
+        vectors = await super()._embed(texts, embeddings)
+        self._check_pq()  # 首次写入才确定维度时，在写入任何行之前校验
+        return vectors
+
+    def _on_rows_added(self, start: int, stop: int):
+        if not self.is_trained:
+            if len(self) >= self.train_threshold:
+                self.train()
+            return
+        if len(self) > self._trained_size * self.retrain_factor:
+            self.train()
+            return
+
+        if stop > len(self._assign):
+            capacity = len(self._matrix)
+            assign = np.zeros(capacity, dtype=np.int32)
+            assign[:start] = self._assign[:start]
+            codes = np.zeros((capacity, self.pq_m or 0), dtype=np.uint8)
+            codes[:start] = self._codes[:start]
+            self._assign, self._codes = assign, codes
+        self._encode(start, stop)
+        for row in range(start, stop):
+            self._lists[self._assign[row]].append(row)
+
+    def _on_compacted(self, keep: np.ndarray):
+        if not self.is_trained:
+            return
+        self._assign = self._assign[keep].copy()
+        self._codes = self._codes[keep].copy()
+        self._rebuild_lists()
+
+    # ---------- 检索 ----------
+
+    async def similarity_search(
+        self,
+        query_vector: list[float],
+        k: int = 4,
+        **kwargs: Any
+    ) -> list[dict]:
+        """
+        近似 Top-K 检索。
+        kwargs: filter (元数据过滤)、nprobe (覆盖默认值)、exact (True 时走暴力精确检索)
+        """
+        if not self.is_trained or kwargs.get("exact"):
+            return await super().similarity_search(query_vector, k, filter=kwargs.get("filter"))
+
+        query = normalize_rows(query_vector)[0]
+        nprobe = kwargs.get("nprobe") or self.nprobe
+        centroid_scores = self._centroids @ query
+        probes = top_k_indices(centroid_scores, nprobe)
+        rows = np.concatenate(
+            [np.frombuffer(self._lists[c], dtype=np.int64) for c in probes]
+            or [np.empty(0, dtype=np.int64)]
+        )
+        rows = rows[self._alive[rows]]
+        flt = kwargs.get("filter")
+        if flt is not None:
+            rows = rows[np.fromiter(
+                (match_metadata(self._metadatas[r], flt) for r in rows), dtype=bool, count=len(rows)
+            )]
+        if len(rows) == 0:
+            return []
+
+        if self._codebooks is not None and len(rows) > k * self.rerank:
+            approx = centroid_scores[self._assign[rows]] + self._adc_scores(query, rows)
+            rows = rows[top_k_indices(approx, k * self.rerank)]
+        scores = self._matrix[rows] @ query
+        return [self._record(int(rows[i]), float(scores[i])) for i in top_k_indices(scores, k)]
+
+    def _adc_scores(self, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """非对称距离计算：预先算出查询子向量与各残差码字的内积表，候选得分为 m 次查表之和"""
+        dsub = self.dim // self.pq_m
+        tables = np.einsum("mkd,md->mk", self._codebooks, query.reshape(self.pq_m, dsub))
+        codes = self._codes[rows]
+        return tables[np.arange(self.pq_m), codes].sum(axis=1)
+
+
+async def benchmark_recall(
+    store: IVFVectorStore,
+    queries: Sequence[Any],
+    k: int = 10,
+    **search_kwargs: Any
+) -> dict[str, float]:
+    """
+    以精确检索为基准评估近似检索的 recall@k 与延迟。
+    search_kwargs 透传给近似检索（如 nprobe），便于扫描参数找到召回/延迟的平衡点。
+    """
+    recalls, ann_ms, exact_ms = [], [], []
+    for query in queries:
+        start = time.perf_counter()
+        approx = await store.similarity_search(query, k, **search_kwargs)
+        ann_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        exact = await store.similarity_search(query, k, exact=True)
+        exact_ms.append((time.perf_counter() - start) * 1000)
+        truth = {r["id"] for r in exact}
+        if truth:
+            recalls.append(len(truth & {r["id"] for r in approx}) / len(truth))
+    return {
+        "recall": float(np.mean(recalls)) if recalls else 0.0,
+        "ann_ms_p50": float(np.percentile(ann_ms, 50)),
+        "ann_ms_p99": float(np.percentile(ann_ms, 99)),
+        "exact_ms_p50": float(np.percentile(exact_ms, 50)),
+    }
@@ -0,0 +1,285 @@
+"""
+BM25 倒排索引 - 面向代码的词法检索
+
+- 标识符感知分词：保留完整标识符（小写），并按 snake_case / CamelCase 拆出子词，
+  查询 `get_user_config` 与 `getUserConfig` 都能命中同一段代码
+- 倒排表为紧凑的 array('I') 文档号 + array('H') 词频，检索时零拷贝转为 NumPy 向量化打分
+- 删除只打墓碑，墓碑比例超过阈值时压缩倒排表；IDF 的文档频率只统计存活文档
+- 持久化为 .npz 快照（倒排表按词项拼接为扁平数组，无需 pickle）+ 追加写的增量日志 .delta.jsonl：
+  增量较小时 save 只追加自上次保存以来的写操作，不重写整个快照；load 时在快照上重放日志
+"""
+import json
+import math
+import os
+import re
+import uuid
+from array import array
+from pathlib import Path
+from typing import Any, Sequence
+import numpy as np
+
+from .local_embedder import split_identifier
+from .numpy_store import MetadataFilter, last_occurrences, match_metadata, top_k_indices
+
+_TOKEN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+|[一-鿿]")
+
+
+def tokenize(text: str) -> list[str]:
+    """标识符感知分词：完整标识符 + 拆分后的子词（长度 1 的 ASCII 子词丢弃）"""
+    tokens = []
+    for token in _TOKEN.findall(text):
+        lowered = token.lower()
+        tokens.append(lowered)
+        if token[0].isalpha() or token[0] == "_":
+            parts = split_identifier(token)
+            if len(parts) > 1:
+                tokens.extend(p for p in parts if len(p) > 1)
+    return tokens
+
+
+class BM25Index:
+    """
+    BM25 倒排索引，文档以字符串 ID 标识，接口风格与向量存储一致。
+    k1 / b 为 BM25 标准参数。
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, compact_ratio: float = 0.3, delta_ratio: float = 0.2):
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self.delta_ratio = delta_ratio  # 增量日志中的文档数超过总数的该比例时改为重写快照
+        self._postings: dict[str, tuple[array, array]] = {}
+        self._lengths = array("I")
+        self._alive = array("b")
+        self._ids: list[str] = []
+        self._texts: list[str] = []
+        self._metadatas: list[dict] = []
+        self._rows: dict[str, int] = {}
+        self._total_length = 0
+        self._pending: list[dict] = []  # 自上次保存以来的写操作
+        self._snapshot_token: str | None = None  # 增量日志只在与之匹配的快照上重放
+        self._delta_docs = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def dirty(self) -> bool:
+        """自上次 save / load 以来是否有写入或删除"""
+        return bool(self._pending)
+
+    # ---------- 写入 ----------
+
+    def add(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[dict] | None = None):
+        """写入文档，已存在的 ID 会被覆盖；批内重复的 ID 以最后一次出现为准"""
+        ids, texts = list(ids), list(texts)
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        keep = last_occurrences(ids)
+        if keep is not None:
+            ids = [ids[i] for i in keep]
+            texts = [texts[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+        if not ids:
+            return
+        self._pending.append({"op": "add", "ids": ids, "texts": texts, "metadatas": metadatas})
+        self._tombstone([i for i in ids if i in self._rows])
+        for doc_id, text, meta in zip(ids, texts, metadatas):
+            doc = len(self._ids)
+            counts: dict[str, int] = {}
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = (array("I"), array("H"))
+                postings[0].append(doc)
+                postings[1].append(min(tf, 65535))
+            length = sum(counts.values())
+            self._lengths.append(length)
+            self._alive.append(1)
+            self._total_length += length
+            self._ids.append(doc_id)
+            self._texts.append(text)
+            self._metadatas.append(meta or {})
+            self._rows[doc_id] = doc
+
+    def _tombstone(self, ids: Sequence[str]) -> int:
+        removed = 0
+        for doc_id in ids:
+            doc = self._rows.pop(doc_id, None)
+            if doc is not None:
+                self._alive[doc] = 0
+                self._total_length -= self._lengths[doc]
+                removed += 1
+        return removed
+
+    def delete(self, ids: Sequence[str]) -> bool:
+        removed = self._tombstone(ids)
+        if removed:
+            self._pending.append({"op": "delete", "ids": list(ids)})
+        dead = len(self._ids) - len(self._rows)
+        if self._ids and dead / len(self._ids) > self.compact_ratio:
+            self.compact()
+        return removed > 0
+
+    def compact(self):
+        """移除墓碑文档并重新编号，倒排表同步过滤"""
+        alive = np.frombuffer(self._alive, dtype=np.int8).astype(bool)
+        keep = np.flatnonzero(alive)
+        remap = np.full(len(alive), -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+        postings = {}
+        for token, (docs, tfs) in self._postings.items():
+            doc_arr = np.frombuffer(docs, dtype=np.uint32)
+            mask = alive[doc_arr]
+            if mask.any():
+                postings[token] = (
+                    array("I", remap[doc_arr[mask]].astype(np.uint32).tobytes()),
+                    array("H", np.frombuffer(tfs, dtype=np.uint16)[mask].tobytes()),
+                )
+        self._postings = postings
+        self._lengths = array("I", np.frombuffer(self._lengths, dtype=np.uint32)[keep].tobytes())
+        self._alive = array("b", b"\x01" * len(keep))
+        self._ids = [self._ids[i] for i in keep]
+        self._texts = [self._texts[i] for i in keep]
+        self._metadatas = [self._metadatas[i] for i in keep]
+        self._rows = {doc_id: i for i, doc_id in enumerate(self._ids)}
+
+    # ---------- 检索 ----------
+
+    def search(self, query: str, k: int = 8, filter: MetadataFilter | None = None) -> list[dict]:
+        """BM25 Top-K，结果格式与向量检索一致（id / text / metadata / score）"""
+        if not self._rows:
+            return []
+        n_docs = len(self._ids)
+        alive = np.frombuffer(self._alive, dtype=np.int8).astype(bool)
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32).astype(np.float32)
+        avgdl = self._total_length / len(self._rows) or 1.0
+        norm = self.k1 * (1 - self.b + self.b * lengths / avgdl)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for token in dict.fromkeys(tokenize(query)):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            docs = np.frombuffer(postings[0], dtype=np.uint32)
+            # 倒排表中可能仍含墓碑文档，文档频率只统计存活文档，与 len(self._rows) 口径一致
+            df = int(alive[docs].sum())
+            if df == 0:
+                continue
+            tfs = np.frombuffer(postings[1], dtype=np.uint16).astype(np.float32)
+            idf = math.log(1 + (len(self._rows) - df + 0.5) / (df + 0.5))
+            # 同一词项的倒排表内文档号唯一，可直接按下标累加
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm[docs])
+
+        mask = alive & (scores > 0)
+        if filter is not None:
+            candidates = np.flatnonzero(mask)
+            mask[candidates] = [match_metadata(self._metadatas[i], filter) for i in candidates]
+        scores = np.where(mask, scores, -np.inf)
+        return [
+            {"id": self._ids[i], "text": self._texts[i], "metadata": self._metadatas[i], "score": float(scores[i])}
+            for i in top_k_indices(scores, k)
+        ]
+
+    # ---------- 持久化 ----------
+
+    @staticmethod
+    def delta_path(path: Path | str) -> Path:
+        path = Path(path)
+        return path.with_name(path.stem + ".delta.jsonl")
+
+    def save(self, path: Path | str):
+        """
+        保存索引：没有变化时不做任何事；增量日志仍较小时只追加本次的写操作，
+        否则重写快照（先压缩以去掉墓碑）并清空日志。
+        """
+        path = Path(path)
+        if not self._pending and path.exists():
+            return
+        pending_docs = sum(len(op["ids"]) for op in self._pending)
+        if (self._snapshot_token is not None and path.exists()
+                and self._delta_docs + pending_docs <= self.delta_ratio * max(len(self._rows), 1)):
+            self._append_delta(path)
+            self._delta_docs += pending_docs
+        else:
+            self._write_snapshot(path)
+        self._pending.clear()
+
+    def _append_delta(self, path: Path):
+        delta = self.delta_path(path)
+        with open(delta, "a", encoding="utf-8") as f:
+            if f.tell() == 0:
+                f.write(json.dumps({"snapshot": self._snapshot_token}) + "\n")
+            for op in self._pending:
+                f.write(json.dumps(op, ensure_ascii=False, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_snapshot(self, path: Path):
+        if len(self._ids) != len(self._rows):
+            self.compact()
+        # 新快照使用新令牌，残留的旧增量日志（如切换中途退出）不会被重放到新快照上
+        token = uuid.uuid4().hex
+        terms = list(self._postings)
+        docs = [self._postings[t][0] for t in terms]
+        tfs = [self._postings[t][1] for t in terms]
+        header = {"k1": self.k1, "b": self.b, "token": token, "terms": terms, "ids": self._ids,
+                  "texts": self._texts, "metadatas": self._metadatas}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                header=np.frombuffer(json.dumps(header, ensure_ascii=False).encode("utf-8"), dtype=np.uint8),
+                offsets=np.cumsum([0, *(len(d) for d in docs)]).astype(np.int64),
+                docs=np.frombuffer(b"".join(d.tobytes() for d in docs), dtype=np.uint32),
+                tfs=np.frombuffer(b"".join(t.tobytes() for t in tfs), dtype=np.uint16),
+                lengths=np.frombuffer(self._lengths, dtype=np.uint32),
+            )
+        tmp.replace(path)
+        self.delta_path(path).unlink(missing_ok=True)
+        self._snapshot_token = token
+        self._delta_docs = 0
+
+    @classmethod
+    def load(cls, path: Path | str, **kwargs: Any) -> "BM25Index":
+        """加载快照并重放与之匹配的增量日志；文件不存在时返回空索引"""
+        path = Path(path)
+        if not path.exists():
+            return cls(**kwargs)
+        with np.load(path) as data:
+            header = json.loads(data["header"].tobytes().decode("utf-8"))
+            offsets, docs, tfs = data["offsets"], data["docs"], data["tfs"]
+            index = cls(k1=header["k1"], b=header["b"], **kwargs)
+            for i, term in enumerate(header["terms"]):
+                start, end = offsets[i], offsets[i + 1]
+                index._postings[term] = (array("I", docs[start:end].tobytes()), array("H", tfs[start:end].tobytes()))
+            index._lengths = array("I", data["lengths"].tobytes())
+        index._ids = header["ids"]
+        index._texts = header["texts"]
+        index._metadatas = header["metadatas"]
+        index._alive = array("b", b"\x01" * len(index._ids))
+        index._rows = {doc_id: i for i, doc_id in enumerate(index._ids)}
+        index._total_length = int(sum(index._lengths))
+        index._snapshot_token = header.get("token")
+        index._replay_delta(cls.delta_path(path))
+        return index
+
+    def _replay_delta(self, delta: Path):
+        if self._snapshot_token is None or not delta.exists():
+            return
+        with open(delta, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        if not lines or json.loads(lines[0]).get("snapshot") != self._snapshot_token:
+            return
+        for line in lines[1:]:
+            try:
+                op = json.loads(line)
+            except ValueError:
+                break  # 追加中途退出留下的半行
+            if op["op"] == "add":
+                self.add(op["ids"], op["texts"], op["metadatas"])
+            else:
+                self.delete(op["ids"])
+            self._delta_docs += len(op["ids"])
+        self._pending.clear()
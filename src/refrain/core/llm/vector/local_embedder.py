@@ -0,0 +1,237 @@
+"""
+本地向量模型 - 完全离线、仅用 CPU
+
+- HashingEmbedder：无需下载模型的哈希 n-gram 向量（特征哈希 / hashing trick）
+  · 字符 n-gram 以滚动多项式哈希在 NumPy 中整体计算，不逐个 n-gram 调用哈希函数
+  · 标识符按 camelCase / snake_case 拆分为子词，作为额外的词级特征
+  · 带符号哈希抵消桶冲突偏差，次线性词频，可选 IDF（fit 后生效），输出 L2 归一化
+  · 大批量文本按块分发到进程池并行编码
+- OnnxEmbedder：存在本地 ONNX 模型文件时使用（需安装 onnxruntime 与 tokenizers）
+
+get_local_embedder() 按模型文件是否存在自动选择后端，全程不发起任何网络请求。
+"""
+import asyncio
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Sequence
+import numpy as np
+
+from refrain.core.logger import log
+from .base import BaseEmbedder
+from .numpy_store import normalize_rows
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+|[^\sA-Za-z0-9_]")
+_SUBWORD = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+# 滚动哈希的乘数（64 位无符号整数运算，溢出即取模 2^64）
+_HASH_BASE = np.uint64(1099511628211)
+_WORD_SEED = 0x9E3779B9
+
+
+@dataclass(frozen=True)
+class HashingConfig:
+    """哈希编码参数（可序列化，传给子进程）"""
+    dim: int = 512
+    ngram_min: int = 3
+    ngram_max: int = 5
+    word_weight: float = 2.0
+    lowercase: bool = True
+
+
+def split_identifier(token: str) -> list[str]:
+    """HTTPServerError → [http, server, error]；snake_case 按下划线拆分"""
+    parts = []
+    for piece in token.split("_"):
+        parts.extend(p.lower() for p in _SUBWORD.findall(piece))
+    return parts
+
+
+def _char_ngram_features(data: np.ndarray, n: int) -> np.ndarray:
+    """对字节序列的所有长度为 n 的窗口计算滚动哈希（向量化）"""
+    if len(data) < n:
+        return np.empty(0, dtype=np.uint64)
+    hashes = np.zeros(len(data) - n + 1, dtype=np.uint64)
+    for j in range(n):
+        hashes = hashes * _HASH_BASE + data[j:len(data) - n + 1 + j]
+    return hashes
+
+
+def _word_features(text: str) -> np.ndarray:
+    words = []
+    for token in _IDENTIFIER.findall(text):
+        if token[0].isalpha() or token[0] == "_":
+            subwords = split_identifier(token)
+            words.append(token.lower())
+            if len(subwords) > 1:
+                words.extend(subwords)
+    return np.fromiter(
+        (zlib.crc32(w.encode("utf-8"), _WORD_SEED) for w in words), dtype=np.uint64, count=len(words)
+    )
+
+
+def hash_encode(texts: Sequence[str], config: HashingConfig) -> np.ndarray:
+    """将一批文本编码为未加权的带符号哈希词频矩阵 (len(texts), dim)"""
+    dim = config.dim
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    with np.errstate(over="ignore"):
+        for row, text in enumerate(texts):
+            source = text.lower() if config.lowercase else text
+            data = np.frombuffer(source.encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+            features = [_char_ngram_features(data, n) for n in range(config.ngram_min, config.ngram_max + 1)]
+            words = _word_features(text)
+            hashes = np.concatenate([*features, words])
+            if len(hashes) == 0:
+                continue
+            # 混洗高位后取桶号，最高位决定符号
+            hashes ^= hashes >> np.uint64(29)
+            hashes *= np.uint64(0xBF58476D1CE4E5B9)
+            buckets = (hashes % np.uint64(dim)).astype(np.int64)
+            signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+            weights = np.ones(len(hashes))
+            weights[len(hashes) - len(words):] = config.word_weight
+            matrix[row] = np.bincount(buckets, weights=signs * weights, minlength=dim)
+    # 次线性词频：保留符号，压缩高频特征
+    return np.sign(matrix) * np.log1p(np.abs(matrix))
+
+
+def _encode_chunk(texts: list[str], config: dict, idf: np.ndarray | None) -> np.ndarray:
+    """进程池任务入口（模块级函数，便于 pickle）"""
+    matrix = hash_encode(texts, HashingConfig(**config))
+    if idf is not None:
+        matrix *= idf
+    return normalize_rows(matrix)
+
+
+class HashingEmbedder(BaseEmbedder):
+    """
+    离线哈希 n-gram 向量模型。
+    workers：大批量时使用的进程数（0 表示不启用进程池）；parallel_threshold：启用进程池的最小文本数。
+    """
+
+    def __init__(
+        self,
+        dim: int = 512,
+        ngram_range: tuple[int, int] = (3, 5),
+        word_weight: float = 2.0,
+        workers: int = 0,
+        parallel_threshold: int = 2000,
+        chunk_size: int = 500,
+    ):
+        self.config = HashingConfig(dim, ngram_range[0], ngram_range[1], word_weight)
+        self.idf: np.ndarray | None = None
+        self.workers = workers
+        self.parallel_threshold = parallel_threshold
+        self.chunk_size = chunk_size
+        self._pool: ProcessPoolExecutor | None = None
+
+    @property
+    def dim(self) -> int:
+        return self.config.dim
+
+    def fit(self, corpus: Sequence[str]) -> "HashingEmbedder":
+        """按语料统计每个哈希桶的文档频率并计算平滑 IDF"""
+        matrix = hash_encode(corpus, self.config)
+        df = np.count_nonzero(matrix, axis=0)
+        self.idf = (np.log((1 + len(corpus)) / (1 + df)) + 1).astype(np.float32)
+        return self
+
+    def save_idf(self, path: Path | str):
+        np.save(Path(path), self.idf)
+
+    def load_idf(self, path: Path | str):
+        self.idf = np.load(Path(path))
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """同步编码（当前进程），返回 L2 归一化的 float32 矩阵"""
+        return _encode_chunk(list(texts), asdict(self.config), self.idf)
+
+    async def embed_text(self, text: str) -> list[float]:
+        return self.encode([text])[0].tolist()
+
+    async def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        if self.workers and len(texts) >= self.parallel_threshold:
+            pool = self._get_pool()
+            config = asdict(self.config)
+            chunks = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+            log.debug(f"本地向量编码 | 文本: {len(texts)} | 进程: {self.workers} | 分块: {len(chunks)}")
+            parts = await asyncio.gather(*(
+                loop.run_in_executor(pool, _encode_chunk, chunk, config, self.idf) for chunk in chunks
+            ))
+            matrix = np.concatenate(parts)
+        else:
+            # 编码为 CPU 密集型，放到线程中执行以免阻塞事件循环
+            matrix = await asyncio.to_thread(self.encode, texts)
+        return matrix.tolist()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+class OnnxEmbedder(BaseEmbedder):
+    """
+    本地 ONNX 句向量模型（如导出的 bge-small / MiniLM）。
+    model_path 指向 .onnx 文件，同目录下需有 tokenizer.json；输出做 mean pooling 后 L2 归一化。
+    """
+
+    def __init__(self, model_path: Path | str, max_length: int = 512, batch_size: int = 32, threads: int = 0):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("使用 ONNX 本地模型需要安装: pip install 'refrain[local]'") from e
+
+        self.model_path = Path(model_path)
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(self.model_path), options, providers=["CPUExecutionProvider"])
+        self.tokenizer = Tokenizer.from_file(str(self.model_path.with_name("tokenizer.json")))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+        self.batch_size = batch_size
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        outputs = []
+        for start in range(0, len(texts), self.batch_size):
+            encodings = self.tokenizer.encode_batch(list(texts[start:start + self.batch_size]))
+            ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self._input_names:
+                feeds["token_type_ids"] = np.zeros_like(ids)
+            hidden = self.session.run(None, feeds)[0]
+            summed = (hidden * mask[..., None]).sum(axis=1)
+            outputs.append(summed / np.maximum(mask.sum(axis=1, keepdims=True), 1))
+        return normalize_rows(np.concatenate(outputs))
+
+    async def embed_text(self, text: str) -> list[float]:
+        return (await self.embed_documents([text]))[0]
+
+    async def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        return (await asyncio.to_thread(self.encode, texts)).tolist()
+
+
+def get_local_embedder(model_path: Path | str | None = None, **kwargs) -> BaseEmbedder:
+    """存在 ONNX 模型文件且依赖可用时使用 OnnxEmbedder，否则回退到 HashingEmbedder"""
+    if model_path and Path(model_path).is_file():
+        try:
+            return OnnxEmbedder(model_path)
+        except ImportError as e:
+            log.warning(f"{e}，回退到哈希向量模型")
+    return HashingEmbedder(**kwargs)
@@ -0,0 +1,438 @@
+"""
+持久化向量索引 - 内存映射的磁盘格式，支持增量更新
+
+目录结构（<gen> 为压缩代数）：
+    meta.json            维度、数据类型与当前代数（原子替换，是唯一的“提交点”）
+    vectors.<gen>.bin    行优先的归一化向量（float32 / float16），只追加
+    docs.<gen>.sqlite    行号 → ID / 文本 / 元数据 / 存活标记的紧凑旁表
+
+- 打开索引只读取 meta.json 并 np.memmap 向量文件，耗时与索引大小无关
+- 追加只向向量文件尾部写入并在旁表中插入行；删除只在旁表中打墓碑
+- 墓碑比例超过阈值时在后台线程中压缩：不持锁写出新一代文件，期间的写入与删除记入日志，
+  最后持锁重放日志并切换 meta.json，写入与检索只在切换的瞬间等待
+- 存活行数以内存计数器维护，墓碑比例的判断为 O(1)
+- 检索按块扫描映射文件，内存占用与块大小而非索引大小成正比
+"""
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Sequence
+import numpy as np
+
+from refrain.core.logger import log
+from .base import BaseEmbedder, BaseVectorStore
+from .numpy_store import last_occurrences, match_metadata, normalize_rows, top_k_indices
+
+DTYPES = {"float32": np.float32, "float16": np.float16}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    row INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    alive INTEGER NOT NULL DEFAULT 1
+);
+CREATE UNIQUE INDEX IF NOT EXISTS docs_live_id ON docs (id) WHERE alive = 1;
+"""
+
+# SQLite 单条语句的参数数量有上限，按 ID 批量更新时分块
+QUERY_CHUNK = 500
+
+
+def tombstone(conn: sqlite3.Connection, ids: Sequence[str]) -> int:
+    """将存活的同 ID 行标记为墓碑，返回受影响的行数（调用方负责事务）"""
+    count = 0
+    for i in range(0, len(ids), QUERY_CHUNK):
+        chunk = ids[i:i + QUERY_CHUNK]
+        count += conn.execute(
+            f"UPDATE docs SET alive = 0 WHERE alive = 1 AND id IN ({','.join('?' * len(chunk))})", chunk
+        ).rowcount
+    return count
+
+
+class _Segment:
+    """一代索引文件的只读快照：检索持有快照，压缩切换时不受影响"""
+
+    def __init__(self, root: Path, gen: int, dim: int, dtype: np.dtype):
+        self.gen = gen
+        self.vectors_path = root / f"vectors.{gen}.bin"
+        self.docs_path = root / f"docs.{gen}.sqlite"
+        self.vectors_path.touch(exist_ok=True)
+        self.conn = sqlite3.connect(str(self.docs_path), check_same_thread=False)
+        # WAL：压缩线程的读快照不阻塞事件循环线程上的写事务
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        self.dim = dim
+        self.dtype = dtype
+        self.row_bytes = dim * np.dtype(dtype).itemsize
+        self._alive: np.ndarray | None = None
+        # 持有该快照的进行中检索数；压缩切换后由最后一个检索关闭连接
+        self.readers = 0
+        self.retired = False
+        self._truncate_uncommitted()
+        self.remap()
+        self.live = self.conn.execute("SELECT COUNT(*) FROM docs WHERE alive = 1").fetchone()[0]
+
+    def _truncate_uncommitted(self):
+        """丢弃写入了向量但旁表未提交的尾部行（上次异常退出的残留）"""
+        committed = self.conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM docs").fetchone()[0]
+        if os.path.getsize(self.vectors_path) > committed * self.row_bytes:
+            os.truncate(self.vectors_path, committed * self.row_bytes)
+
+    def remap(self):
+        self.rows = os.path.getsize(self.vectors_path) // self.row_bytes
+        self.matrix = (
+            np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(self.rows, self.dim))
+            if self.rows else np.zeros((0, self.dim), dtype=self.dtype)
+        )
+        self._alive = None
+
+    @property
+    def alive(self) -> np.ndarray:
+        """存活掩码（按需从旁表加载墓碑，仅占 1 字节 / 行）"""
+        if self._alive is None or len(self._alive) != self.rows:
+            alive = np.ones(self.rows, dtype=bool)
+            dead = [r for (r,) in self.conn.execute("SELECT row FROM docs WHERE alive = 0")]
+            if dead:
+                alive[np.asarray(dead, dtype=np.int64)] = False
+            self._alive = alive
+        return self._alive
+
+    def close(self):
+        self.conn.close()
+
+
+class MmapVectorStore(BaseVectorStore):
+    """
+    内存映射持久化向量索引。
+    path 下已有索引时直接打开；dtype="float16" 可将磁盘与页缓存占用减半。
+    """
+
+    def __init__(
+        self,
+        path: Path | str,
+        dim: int | None = None,
+        dtype: str = "float32",
+        embedder: BaseEmbedder | None = None,
+        compact_ratio: float = 0.3,
+        background_compaction: bool = True,
+        block_rows: int = 65536,
+    ):
+        self.root = Path(path)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.embedder = embedder
+        self.compact_ratio = compact_ratio
+        self.background_compaction = background_compaction
+        self.block_rows = block_rows
+        self._lock = threading.RLock()
+        self._compactor: threading.Thread | None = None
+        self._seg: _Segment | None = None
+        # 压缩进行中时记录被打墓碑的 ID（写入覆盖与删除），切换前重放到新一代
+        self._compaction_log: list[str] | None = None
+
+        meta = self._read_meta()
+        if meta:
+            if dim is not None and dim != meta["dim"]:
+                raise ValueError(f"索引维度为 {meta['dim']}，与指定的 {dim} 不一致")
+            self.dim, self.dtype_name, gen = meta["dim"], meta["dtype"], meta["gen"]
+        else:
+            if dtype not in DTYPES:
+                raise ValueError(f"不支持的数据类型 '{dtype}'，可选: {', '.join(DTYPES)}")
+            self.dim, self.dtype_name, gen = dim, dtype, 0
+        self.dtype = DTYPES[self.dtype_name]
+        if self.dim is not None:
+            self._open(gen)
+
+    # ---------- 元数据 ----------
+
+    @property
+    def meta_path(self) -> Path:
+        return self.root / "meta.json"
+
+    def _read_meta(self) -> dict | None:
+        if not self.meta_path.exists():
+            return None
+        return json.loads(self.meta_path.read_text(encoding="utf-8"))
+
+    def _write_meta(self, gen: int):
+        tmp = self.meta_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"dim": self.dim, "dtype": self.dtype_name, "gen": gen}), encoding="utf-8")
+        os.replace(tmp, self.meta_path)
+
+    def _open(self, gen: int):
+        self._seg = _Segment(self.root, gen, self.dim, self.dtype)
+        if not self.meta_path.exists():
+            self._write_meta(gen)
+
+    def __len__(self) -> int:
+        return self._seg.live if self._seg is not None else 0
+
+    # ---------- 写入 ----------
+
+    async def add_texts(
+        self,
+        texts: Sequence[str],
+        metadatas: list[dict] | None = None,
+        **kwargs: Any
+    ) -> list[str]:
+        """
+        追加文本及其向量（不重写已有数据）。
+        kwargs: embeddings (预先计算的向量)、ids (自定义 ID，已存在的 ID 会被覆盖)
+        """
+        if not texts:
+            return []
+        embeddings = kwargs.get("embeddings")
+        if embeddings is None:
+            if self.embedder is None:
+                raise ValueError("未提供 embeddings，且未配置 embedder")
+            embeddings = await self.embedder.embed_documents(list(texts))
+        vectors = normalize_rows(embeddings)
+        if len(vectors) != len(texts):
+            raise ValueError(f"向量数量 ({len(vectors)}) 与文本数量 ({len(texts)}) 不一致")
+        ids = list(kwargs.get("ids") or [uuid.uuid4().hex for _ in texts])
+        metadatas = metadatas or [{} for _ in texts]
+        rows = list(zip(ids, texts, metadatas))
+        keep = last_occurrences(ids)
+        if keep is not None:
+            # 批内重复 ID 只写入最后一次出现，否则会违反存活 ID 唯一索引
+            vectors = vectors[keep]
+            rows = [rows[i] for i in keep]
+
+        with self._lock:
+            if self._seg is None:
+                self.dim = vectors.shape[1]
+                self._open(0)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"向量维度不匹配: 期望 {self.dim}，实际 {vectors.shape[1]}")
+            seg = self._seg
+            conn = seg.conn
+            written = [doc_id for doc_id, _, _ in rows]
+            start = seg.rows
+            try:
+                # 旁表写入在同一事务中：任一步失败都回滚墓碑与插入
+                with conn:
+                    # 同 ID 覆盖：旧行打墓碑，新行追加
+                    replaced = tombstone(conn, written)
+                    with open(seg.vectors_path, "ab") as f:
+                        f.write(vectors.astype(self.dtype).tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+                    conn.executemany(
+                        "INSERT INTO docs (row, id, text, metadata) VALUES (?, ?, ?, ?)",
+                        [
+                            (start + i, doc_id, text, json.dumps(meta or {}, ensure_ascii=False))
+                            for i, (doc_id, text, meta) in enumerate(rows)
+                        ],
+                    )
+            except BaseException:
+                # 截掉本次追加的向量，使文件行数与旁表重新一致
+                os.truncate(seg.vectors_path, start * seg.row_bytes)
+                seg.remap()
+                raise
+            seg.remap()
+            seg.live += len(rows) - replaced
+            if self._compaction_log is not None:
+                self._compaction_log.extend(written)
+        self._maybe_compact()
+        return ids
+
+    # ---------- 检索 ----------
+
+    def _filter_mask(self, seg: _Segment, flt: Any) -> np.ndarray:
+        """元数据过滤：字典条件下推到 SQLite (json_extract)，谓词函数逐行判断"""
+        mask = np.zeros(seg.rows, dtype=bool)
+        if isinstance(flt, dict):
+            clauses = " AND ".join("json_extract(metadata, ?) = ?" for _ in flt)
+            params: list[Any] = []
+            for key, value in flt.items():
+                params += [f"$.{key}", value]
+            rows = [r for (r,) in seg.conn.execute(
+                f"SELECT row FROM docs WHERE alive = 1 AND {clauses}", params
+            )]
+        else:
+            rows = [
+                r for r, meta in seg.conn.execute("SELECT row, metadata FROM docs WHERE alive = 1")
+                if match_metadata(json.loads(meta), flt)
+            ]
+        if rows:
+            mask[np.asarray(rows, dtype=np.int64)] = True
+        return mask
+
+    async def similarity_search(
+        self,
+        query_vector: list[float],
+        k: int = 4,
+        **kwargs: Any
+    ) -> list[dict]:
+        """
+        分块扫描的余弦相似度 Top-K 检索。
+        kwargs: filter (元数据字典或谓词函数)
+        """
+        query = normalize_rows(query_vector)[0]
+        with self._lock:
+            seg = self._seg
+            if seg is None or seg.rows == 0:
+                return []
+            seg.readers += 1
+        try:
+            return self._search(seg, query, k, kwargs.get("filter"))
+        finally:
+            with self._lock:
+                seg.readers -= 1
+                if seg.retired and seg.readers == 0:
+                    seg.close()
+
+    def _search(self, seg: _Segment, query: np.ndarray, k: int, flt: Any) -> list[dict]:
+        mask = self._filter_mask(seg, flt) if flt is not None else seg.alive
+
+        best_rows: list[np.ndarray] = []
+        best_scores: list[np.ndarray] = []
+        for start in range(0, seg.rows, self.block_rows):
+            block = np.asarray(seg.matrix[start:start + self.block_rows], dtype=np.float32)
+            scores = np.where(mask[start:start + len(block)], block @ query, -np.inf)
+            local = top_k_indices(scores, k)
+            best_rows.append(local + start)
+            best_scores.append(scores[local])
+        rows = np.concatenate(best_rows)
+        scores = np.concatenate(best_scores)
+        winners = top_k_indices(scores, k)
+        return self._records(seg, [(int(rows[i]), float(scores[i])) for i in winners])
+
+    def _records(self, seg: _Segment, hits: list[tuple[int, float]]) -> list[dict]:
+        if not hits:
+            return []
+        placeholders = ",".join("?" * len(hits))
+        docs = {
+            row: (doc_id, text, meta)
+            for row, doc_id, text, meta in seg.conn.execute(
+                f"SELECT row, id, text, metadata FROM docs WHERE row IN ({placeholders})",
+                [row for row, _ in hits],
+            )
+        }
+        return [
+            {"id": docs[row][0], "text": docs[row][1], "metadata": json.loads(docs[row][2]), "score": score}
+            for row, score in hits if row in docs
+        ]
+
+    # ---------- 删除与压缩 ----------
+
+    async def delete(self, ids: list[str]) -> bool:
+        if self._seg is None or not ids:
+            return False
+        ids = list(ids)
+        with self._lock:
+            seg = self._seg
+            with seg.conn:
+                removed = tombstone(seg.conn, ids)
+            seg.live -= removed
+            seg._alive = None
+            if self._compaction_log is not None:
+                self._compaction_log.extend(ids)
+        self._maybe_compact()
+        return removed > 0
+
+    def dead_ratio(self) -> float:
+        seg = self._seg
+        if seg is None or seg.rows == 0:
+            return 0.0
+        return 1 - seg.live / seg.rows
+
+    def _maybe_compact(self):
+        if self.dead_ratio() <= self.compact_ratio:
+            return
+        if not self.background_compaction:
+            self.compact()
+        elif self._compactor is None or not self._compactor.is_alive():
+            self._compactor = threading.Thread(target=self.compact, name="refrain-index-compact", daemon=True)
+            self._compactor.start()
+
+    def wait_for_compaction(self):
+        if self._compactor is not None:
+            self._compactor.join()
+
+    def compact(self):
+        """
+        写出只包含存活行的新一代文件，然后原子切换 meta.json。
+        重写阶段不持锁，只读取开始时已提交的行；期间新增的行与墓碑在最后持锁切换时重放。
+        """
+        with self._lock:
+            old = self._seg
+            if old is None or self._compaction_log is not None:
+                return
+            base_rows, matrix = old.rows, old.matrix
+            self._compaction_log = []
+        new_gen = old.gen + 1
+        try:
+            for stale in (self.root / f"vectors.{new_gen}.bin", self.root / f"docs.{new_gen}.sqlite"):
+                stale.unlink(missing_ok=True)
+            new = _Segment(self.root, new_gen, self.dim, self.dtype)
+            # 独立的只读连接：只看到已提交的数据，与事件循环线程上的写事务互不干扰
+            reader = sqlite3.connect(str(old.docs_path), timeout=30)
+            try:
+                cursor = reader.execute(
+                    "SELECT row, id, text, metadata FROM docs WHERE alive = 1 AND row < ? ORDER BY row", (base_rows,)
+                )
+                self._copy_rows(cursor, matrix, new)
+            finally:
+                reader.close()
+        except BaseException:
+            with self._lock:
+                self._compaction_log = None
+            raise
+
+        with self._lock:
+            # 重放：先按 ID 打墓碑（覆盖写入与删除），再追加重写期间新增且仍存活的行
+            with new.conn:
+                tombstone(new.conn, list(dict.fromkeys(self._compaction_log)))
+            self._copy_rows(
+                old.conn.execute(
+                    "SELECT row, id, text, metadata FROM docs WHERE alive = 1 AND row >= ? ORDER BY row", (base_rows,)
+                ),
+                old.matrix, new,
+            )
+            new.remap()
+            new.live = new.conn.execute("SELECT COUNT(*) FROM docs WHERE alive = 1").fetchone()[0]
+            self._write_meta(new_gen)
+            self._seg = new
+            self._compaction_log = None
+            # 旧快照可能仍被进行中的检索持有，由最后一个检索关闭
+            old.retired = True
+            if old.readers == 0:
+                old.close()
+            log.info(f"向量索引压缩完成 | 代数: {new_gen} | 行数: {old.rows} → {new.rows}")
+
+        wal_files = [old.docs_path.with_name(old.docs_path.name + suffix) for suffix in ("-wal", "-shm")]
+        for path in (old.vectors_path, old.docs_path, *wal_files):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def _copy_rows(self, cursor: sqlite3.Cursor, matrix: np.ndarray, new: _Segment):
+        """按块将游标中的行（向量 + 旁表记录）追加到新一代文件"""
+        with open(new.vectors_path, "ab") as f:
+            while True:
+                batch = cursor.fetchmany(self.block_rows)
+                if not batch:
+                    break
+                rows = np.asarray([row for row, _, _, _ in batch], dtype=np.int64)
+                f.write(np.asarray(matrix[rows]).astype(self.dtype).tobytes())
+                start = new.rows
+                new.conn.executemany(
+                    "INSERT INTO docs (row, id, text, metadata) VALUES (?, ?, ?, ?)",
+                    [(start + i, doc_id, text, meta) for i, (_, doc_id, text, meta) in enumerate(batch)],
+                )
+                new.rows += len(batch)
+            f.flush()
+            os.fsync(f.fileno())
+        new.conn.commit()
+
+    def close(self):
+        self.wait_for_compaction()
+        if self._seg is not None:
+            self._seg.close()
+            self._seg = None
@@ -0,0 +1,229 @@
+"""
+进程内向量存储 - 基于 NumPy 的暴力检索实现
+
+- 连续的 float32 矩阵，行向量写入时即归一化，余弦相似度退化为一次矩阵-向量乘法
+- Top-K 使用 argpartition（O(n)）后只对 K 个候选排序
+- 删除只打墓碑标记，墓碑比例超过阈值时再压缩
+- 追加采用容量翻倍的摊还增长，避免每次写入都复制整张矩阵
+"""
+import uuid
+from typing import Any, Callable, Sequence
+import numpy as np
+
+from .base import BaseEmbedder, BaseVectorStore
+
+MetadataFilter = dict[str, Any] | Callable[[dict], bool]
+
+
+def normalize_rows(vectors: Any, dtype=np.float32) -> np.ndarray:
+    """转换为二维矩阵并按行 L2 归一化（零向量保持为零）"""
+    matrix = np.asarray(vectors, dtype=dtype)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """返回得分最高的 k 个下标（按得分降序），跳过 -inf"""
+    k = min(k, int(np.isfinite(scores).sum()))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(scores, -k)[-k:]
+    else:
+        candidates = np.arange(len(scores))
+    order = np.argsort(scores[candidates])[::-1]
+    return candidates[order][:k]
+
+
+def last_occurrences(ids: Sequence[str]) -> list[int] | None:
+    """
+    批内重复 ID 只保留最后一次出现（与跨批写入的覆盖语义一致），返回保留项的下标；
+    没有重复时返回 None，调用方无需复制数据。
+    """
+    positions = {doc_id: i for i, doc_id in enumerate(ids)}
+    if len(positions) == len(ids):
+        return None
+    return sorted(positions.values())
+
+
+def match_metadata(metadata: dict, flt: MetadataFilter | None) -> bool:
+    """元数据过滤：字典表示字段全等，或传入自定义谓词"""
+    if flt is None:
+        return True
+    if callable(flt):
+        return bool(flt(metadata))
+    return all(metadata.get(key) == value for key, value in flt.items())
+
+
+class NumpyVectorStore(BaseVectorStore):
+    """
+    进程内向量存储。
+    add_texts 可通过 embeddings= 直接传入向量，否则使用构造时注入的 embedder 计算。
+    """
+
+    def __init__(
+        self,
+        dim: int | None = None,
+        embedder: BaseEmbedder | None = None,
+        compact_ratio: float = 0.25,
+        initial_capacity: int = 1024,
+    ):
+        self.dim = dim
+        self.embedder = embedder
+        self.compact_ratio = compact_ratio
+        self._initial_capacity = initial_capacity
+        self._matrix = np.zeros((0, dim or 0), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._ids: list[str] = []
+        self._texts: list[str] = []
+        self._metadatas: list[dict] = []
+        self._rows: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # ---------- 写入 ----------
+
+    async def _embed(self, texts: Sequence[str], embeddings: Any) -> np.ndarray:
+        if embeddings is None:
+            if self.embedder is None:
+                raise ValueError("未提供 embeddings，且未配置 embedder")
+            embeddings = await self.embedder.embed_documents(list(texts))
+        vectors = normalize_rows(embeddings)
+        if len(vectors) != len(texts):
+            raise ValueError(f"向量数量 ({len(vectors)}) 与文本数量 ({len(texts)}) 不一致")
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"向量维度不匹配: 期望 {self.dim}，实际 {vectors.shape[1]}")
+        return vectors
+
+    def _reserve(self, extra: int):
+        """容量不足时按翻倍策略扩容"""
+        needed = self._size + extra
+        capacity = len(self._matrix)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, self._initial_capacity)
+        matrix = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._matrix, self._alive = matrix, alive
+
+    async def add_texts(
+        self,
+        texts: Sequence[str],
+        metadatas: list[dict] | None = None,
+        **kwargs: Any
+    ) -> list[str]:
+        """
+        写入文本及其向量。
+        kwargs: embeddings (预先计算的向量)、ids (自定义 ID，已存在的 ID 会被覆盖)
+        """
+        if not texts:
+            return []
+        vectors = await self._embed(texts, kwargs.get("embeddings"))
+        ids = list(kwargs.get("ids") or [uuid.uuid4().hex for _ in texts])
+        metadatas = metadatas or [{} for _ in texts]
+        keep = last_occurrences(ids)
+        if keep is not None:
+            # 批内重复的 ID 若都写入，较早的行会存活却无法再按 ID 删除
+            vectors = vectors[keep]
+            texts = [texts[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+            ids_written = [ids[i] for i in keep]
+        else:
+            ids_written = ids
+
+        self._tombstone([i for i in ids_written if i in self._rows])
+        self._reserve(len(texts))
+        start = self._size
+        self._matrix[start:start + len(texts)] = vectors
+        self._alive[start:start + len(texts)] = True
+        for offset, (doc_id, text, meta) in enumerate(zip(ids_written, texts, metadatas)):
+            self._rows[doc_id] = start + offset
+            self._ids.append(doc_id)
+            self._texts.append(text)
+            self._metadatas.append(meta or {})
+        self._size += len(texts)
+        self._on_rows_added(start, self._size)
+        self._maybe_compact()
+        return ids
+
+    def _on_rows_added(self, start: int, stop: int):
+        """子类钩子：新行 [start, stop) 写入完成（如维护倒排表）"""
+
+    # ---------- 检索 ----------
+
+    async def similarity_search(
+        self,
+        query_vector: list[float],
+        k: int = 4,
+        **kwargs: Any
+    ) -> list[dict]:
+        """
+        余弦相似度 Top-K 检索。
+        kwargs: filter (元数据字典或谓词函数)
+        """
+        if not self._rows:
+            return []
+        query = normalize_rows(query_vector)[0]
+        scores = self._matrix[:self._size] @ query
+        mask = self._alive[:self._size]
+        flt = kwargs.get("filter")
+        if flt is not None:
+            mask = mask & np.fromiter(
+                (match_metadata(m, flt) for m in self._metadatas), dtype=bool, count=self._size
+            )
+        scores = np.where(mask, scores, -np.inf)
+        return [self._record(int(row), float(scores[row])) for row in top_k_indices(scores, k)]
+
+    def _record(self, row: int, score: float) -> dict:
+        return {
+            "id": self._ids[row],
+            "text": self._texts[row],
+            "metadata": self._metadatas[row],
+            "score": score,
+        }
+
+    # ---------- 删除与压缩 ----------
+
+    def _tombstone(self, ids: list[str]) -> int:
+        removed = 0
+        for doc_id in ids:
+            row = self._rows.pop(doc_id, None)
+            if row is not None:
+                self._alive[row] = False
+                removed += 1
+        return removed
+
+    async def delete(self, ids: list[str]) -> bool:
+        removed = self._tombstone(ids)
+        self._maybe_compact()
+        return removed > 0
+
+    def _maybe_compact(self):
+        dead = self._size - len(self._rows)
+        if self._size and dead / self._size > self.compact_ratio:
+            self.compact()
+
+    def compact(self):
+        """移除墓碑行，重建连续存储"""
+        keep = np.flatnonzero(self._alive[:self._size])
+        self._matrix = self._matrix[keep].copy()
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._ids = [self._ids[i] for i in keep]
+        self._texts = [self._texts[i] for i in keep]
+        self._metadatas = [self._metadatas[i] for i in keep]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._size = len(keep)
+        self._on_compacted(keep)
+
+    def _on_compacted(self, keep: np.ndarray):
+        """子类钩子：压缩完成，keep[i] 为新第 i 行在压缩前的行号"""
@@ -0,0 +1,198 @@
+"""
+OpenAI 协议向量模型 - 自适应批量 + 内容哈希缓存
+
+- 凭证解析与 OpenAIProvider 一致（api_key > api_key_env > Keyring > .env），连接池共享
+- embed_documents 先按内容哈希查询缓存，只对未命中的文本请求接口；同一批内的重复文本只请求一次
+- 未命中的文本按 token 预算（batch_tokens）与条数上限（max_batch_size）打包，
+  批次之间以有界并发执行，并接入 RPM/TPM 限流
+- 缓存按 (base_url, 模型, 维度) 隔离，存储于 SQLite，未改动的文件重新索引时零请求
+"""
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any
+import numpy as np
+
+from refrain.core.config import get_settings, resolve_api_key
+from refrain.core.logger import log
+from refrain.core.llm.chat.batch import get_rate_limiter, run_batch
+from refrain.core.llm.chat.tokens import estimate_tokens
+from refrain.core.llm.chat.transport import PooledOpenAIClient, pop_pool_params
+from .base import BaseEmbedder
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """基于 SQLite 的向量缓存：(scope, 内容哈希) → float32 向量"""
+
+    # SQLite 单条语句的参数数量有上限，批量查询时分块
+    QUERY_CHUNK = 500
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "scope TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (scope, hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, scope: str, hashes: list[str]) -> dict[str, list[float]]:
+        found: dict[str, list[float]] = {}
+        with self._lock:
+            for i in range(0, len(hashes), self.QUERY_CHUNK):
+                chunk = hashes[i:i + self.QUERY_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE scope = ? AND hash IN ({','.join('?' * len(chunk))})",
+                    (scope, *chunk),
+                ).fetchall()
+                for digest, blob in rows:
+                    found[digest] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def set_many(self, scope: str, items: dict[str, list[float]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (scope, hash, vector) VALUES (?, ?, ?)",
+                [(scope, digest, np.asarray(vec, dtype=np.float32).tobytes()) for digest, vec in items.items()],
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def pack_batches(texts: list[str], batch_tokens: int, max_batch_size: int) -> list[list[int]]:
+    """按 token 预算与条数上限将文本下标贪心打包（单条超预算的文本独占一批）"""
+    batches: list[list[int]] = []
+    current: list[int] = []
+    used = 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if current and (used + cost > batch_tokens or len(current) >= max_batch_size):
+            batches.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+class OpenAIEmbedder(BaseEmbedder):
+    """
+    OpenAI 协议（/embeddings）向量模型。
+    cache=None 时按 .env 的 EMBEDDING_CACHE 决定是否使用全局磁盘缓存；传入 False 关闭缓存。
+    """
+
+    def __init__(
+        self,
+        model: str | None = None,
+        api_key: str | None = None,
+        base_url: str | None = None,
+        api_key_env: str | None = None,
+        timeout: float = 60.0,
+        dimensions: int | None = None,
+        batch_tokens: int = 8000,
+        max_batch_size: int = 256,
+        concurrency: int = 4,
+        cache: EmbeddingCache | bool | None = None,
+        **kwargs
+    ):
+        settings = get_settings()
+        self.model = model or settings.EMBEDDING_MODEL
+        self.api_key = resolve_api_key(api_key, api_key_env, service_id=kwargs.get("name") or self.model)
+        self.base_url = base_url or settings.OPENAI_API_BASE
+        self.timeout = timeout
+        self.dimensions = dimensions
+        self.batch_tokens = batch_tokens
+        self.max_batch_size = max_batch_size
+        self.concurrency = concurrency
+        self.pool_params = pop_pool_params(kwargs)
+        self.rate_limiter = get_rate_limiter(
+            (self.base_url, self.model), kwargs.pop("rpm", None), kwargs.pop("tpm", None)
+        )
+        if cache is None:
+            cache = settings.EMBEDDING_CACHE
+        self.cache = get_embedding_cache() if cache is True else (cache or None)
+        self._pool = PooledOpenAIClient(self.api_key, self.base_url, self.timeout, self.pool_params)
+
+    @property
+    def scope(self) -> str:
+        """缓存隔离域：不同服务、模型或维度的向量互不复用"""
+        return f"{self.base_url}|{self.model}|{self.dimensions or ''}"
+
+    async def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """单次接口调用，结果按输入顺序返回"""
+        params: dict[str, Any] = {"model": self.model, "input": texts}
+        if self.dimensions:
+            params["dimensions"] = self.dimensions
+        response = await self._pool.get().embeddings.create(**params)
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    async def embed_text(self, text: str) -> list[float]:
+        return (await self.embed_documents([text]))[0]
+
+    async def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        hashes = [content_hash(t) for t in texts]
+        vectors: dict[str, list[float]] = self.cache.get_many(self.scope, list(set(hashes))) if self.cache else {}
+
+        # 去重后只请求缓存未命中的文本
+        missing: dict[str, str] = {}
+        for digest, text in zip(hashes, texts):
+            if digest not in vectors:
+                missing.setdefault(digest, text)
+        if missing:
+            digests = list(missing)
+            pending = [missing[d] for d in digests]
+            batches = pack_batches(pending, self.batch_tokens, self.max_batch_size)
+            log.debug(
+                f"Embedding 请求 | 模型: {self.model} | 命中缓存: {len(texts) - len(missing)} "
+                f"| 待计算: {len(pending)} | 批次: {len(batches)}"
+            )
+            result = await run_batch(
+                [lambda b=b: self._embed_batch([pending[i] for i in b]) for b in batches],
+                concurrency=self.concurrency,
+                limiter=self.rate_limiter,
+                costs=[sum(estimate_tokens(pending[i]) for i in b) for b in batches],
+            )
+            # 已成功的批次先写入缓存，重试时无需重复计算
+            fresh = {
+                digests[i]: vec
+                for index, embedded in result.successful()
+                for i, vec in zip(batches[index], embedded)
+            }
+            if self.cache and fresh:
+                self.cache.set_many(self.scope, fresh)
+            result.raise_for_errors()
+            vectors.update(fresh)
+
+        return [vectors[d] for d in hashes]
+
+
+# ============ 工厂集成 ============
+
+_embedding_cache: EmbeddingCache | None = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """进程级共享的磁盘向量缓存（~/.refrain/cache/embeddings.sqlite）"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        from refrain.core.llm.chat.cache import cache_dir
+        _embedding_cache = EmbeddingCache(cache_dir() / "embeddings.sqlite")
+    return _embedding_cache
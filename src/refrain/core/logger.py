@@ -1,12 +1,13 @@
 import sys
+import time
 from pathlib import Path
 from loguru import logger as _logger
-from refrain.core.config import settings
+from refrain.core.config import get_settings
 
 # 基础日志目录
 # 延迟计算，确保 settings 已完全加载
 def get_log_dir():
-    log_dir = Path(settings.PROJECT_ROOT) / "logs"
+    log_dir = Path(get_settings().PROJECT_ROOT) / "logs"
     log_dir.mkdir(parents=True, exist_ok=True)
     return log_dir
 
@@ -23,45 +24,55 @@ def setup_logger():
         format="<red><b>{level}</b></red> | {message}",
         level="ERROR",
         colorize=True,
-        # 排除掉专门的 chat_trace 日志，防止其进入终端
-        filter=lambda r: "is_chat" not in r["extra"]
     )
     return _logger
 
 def init_file_logging():
     """
-    文件日志初始化：
-    1. 开启 runtime.log 供另一个终端进行 tail -f 实时观察。
-    2. 开启 chat trace 用于对话复盘。
+    文件日志初始化：开启 runtime.log 供另一个终端进行 tail -f 实时观察。
+    对话追踪由 refrain.core.llm.chat.trace 的后台写入器负责（CHAT_TRACE 开关）。
     """
     base_log_dir = get_log_dir()
     
-    # 1. 详细运行日志 (固定文件名，由 loguru 处理滚动)
+    # 详细运行日志 (固定文件名，由 loguru 处理滚动)
     runtime_path = base_log_dir / "runtime.log"
     _logger.add(
         str(runtime_path),
         format="{time:HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-        level="DEBUG" if settings.DEBUG else "INFO",
+        level="DEBUG" if get_settings().DEBUG else "INFO",
         rotation="10 MB",
         retention="1 week",
         encoding="utf-8",
         enqueue=True,
-        filter=lambda r: "is_chat" not in r["extra"]
-    )
-
-    # 2. 对话追踪 (按天滚动，方便复盘)
-    trace_path = base_log_dir / "trace" / "trace_{time:YYYY-MM-DD}.jsonl"
-    _logger.add(
-        str(trace_path),
-        format="{message}", 
-        level="INFO",
-        filter=lambda r: "is_chat" in r["extra"],
-        rotation="00:00",
-        retention="90 days",
-        encoding="utf-8",
-        enqueue=True
     )
     _logger.info("日志系统已全面激活 (双窗口模式已就绪)")
 
+
+class Sampler:
+    """
+    高频事件的日志采样器：调用返回 True 时才记录。
+    every：每 N 次放行一次；interval：两次放行至少间隔的秒数；二者同时设置时都需满足。
+    首次调用总是放行。
+    """
+
+    __slots__ = ("every", "interval", "count", "_last")
+
+    def __init__(self, every: int = 1, interval: float = 0.0):
+        self.every = max(every, 1)
+        self.interval = interval
+        self.count = 0
+        self._last = float("-inf")
+
+    def __call__(self) -> bool:
+        self.count += 1
+        if (self.count - 1) % self.every:
+            return False
+        if self.interval:
+            now = time.monotonic()
+            if now - self._last < self.interval:
+                return False
+            self._last = now
+        return True
+
 # 初始化全局 log 对象
 log = setup_logger()
@@ -0,0 +1,6 @@
+# 代码库索引模块
+from .chunker import Chunk, chunk_file, chunk_python, chunk_text
+from .manifest import Manifest
+from .pipeline import Indexer, IndexStats
+
+__all__ = ["Chunk", "chunk_file", "chunk_python", "chunk_text", "Manifest", "Indexer", "IndexStats"]
@@ -0,0 +1,126 @@
+"""
+代码切块 - Python 按 AST 边界（函数 / 类 / 方法）切分，其他文本按行窗口切分
+
+- 装饰器归入其修饰的定义
+- 超过 max_lines 的类拆为“类头”（文档字符串、类属性）与各方法；过长的函数按行窗口再切
+- 相邻的模块级语句（import、常量等）合并为 module 块
+- 解析失败（语法错误）的 Python 文件回退到行窗口切分
+"""
+import ast
+import hashlib
+from dataclasses import dataclass, field
+
+# 参与索引的文本文件类型
+INDEXED_SUFFIXES = {
+    ".py", ".pyi", ".md", ".rst", ".txt", ".toml", ".yaml", ".yml", ".json", ".cfg", ".ini",
+    ".js", ".jsx", ".ts", ".tsx", ".go", ".rs", ".java", ".c", ".h", ".cpp", ".hpp", ".sh",
+}
+
+_DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+@dataclass
+class Chunk:
+    """一个可检索的代码片段（行号从 1 开始，闭区间）"""
+    path: str
+    name: str
+    kind: str  # function | class | method | module | text
+    start: int
+    end: int
+    text: str
+    hash: str = field(init=False)
+    id: str = field(default="", init=False)  # 由索引器分配
+
+    def __post_init__(self):
+        self.hash = hashlib.sha1(self.text.encode("utf-8")).hexdigest()
+
+    @property
+    def embed_text(self) -> str:
+        """送入向量模型的文本：带上路径与名称，提高检索相关性"""
+        return f"# {self.path} · {self.name}\n{self.text}"
+
+
+class _PythonChunker:
+    def __init__(self, path: str, source: str, max_lines: int):
+        self.path = path
+        self.lines = source.splitlines(keepends=True)
+        self.max_lines = max_lines
+        self.chunks: list[Chunk] = []
+
+    def emit(self, name: str, kind: str, start: int, end: int):
+        text = "".join(self.lines[start - 1:end])
+        if not text.strip():
+            return
+        if end - start + 1 <= self.max_lines:
+            self.chunks.append(Chunk(self.path, name, kind, start, end, text))
+            return
+        for part, window in enumerate(range(start, end + 1, self.max_lines), 1):
+            stop = min(end, window + self.max_lines - 1)
+            self.chunks.append(Chunk(
+                self.path, f"{name} (part {part})", kind, window, stop,
+                "".join(self.lines[window - 1:stop]),
+            ))
+
+    @staticmethod
+    def _start(node: ast.stmt) -> int:
+        return min([node.lineno, *(d.lineno for d in getattr(node, "decorator_list", []))])
+
+    def walk(self, body: list[ast.stmt], prefix: str = "", container_end: int | None = None):
+        """按定义切分语句序列，相邻的非定义语句合并输出"""
+        pending: int | None = None  # 当前未输出的普通语句段的起始行
+
+        def flush(until: int):
+            nonlocal pending
+            if pending is not None:
+                self.emit(prefix.rstrip(".") or "<module>", "class" if prefix else "module", pending, until)
+                pending = None
+
+        for node in body:
+            start = self._start(node)
+            if not isinstance(node, _DEFINITIONS):
+                if pending is None:
+                    pending = start
+                continue
+            flush(start - 1)
+            name = prefix + node.name
+            end = node.end_lineno
+            if isinstance(node, ast.ClassDef) and end - start + 1 > self.max_lines:
+                # 大类：类签名连同首个方法之前的语句（文档字符串、类属性）成块，方法逐个切分
+                first = next((i for i, n in enumerate(node.body) if isinstance(n, _DEFINITIONS)), len(node.body))
+                members = node.body[first:]
+                header_end = self._start(members[0]) - 1 if members else end
+                self.emit(name, "class", start, header_end)
+                self.walk(members, name + ".", end)
+            else:
+                kind = "class" if isinstance(node, ast.ClassDef) else ("method" if prefix else "function")
+                self.emit(name, kind, start, end)
+        flush(container_end or len(self.lines))
+
+
+def chunk_python(path: str, source: str, max_lines: int = 120) -> list[Chunk]:
+    """按 AST 边界切分 Python 源码，语法错误时回退到行窗口"""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return chunk_text(path, source, max_lines)
+    chunker = _PythonChunker(path, source, max_lines)
+    chunker.walk(tree.body)
+    return chunker.chunks
+
+
+def chunk_text(path: str, source: str, max_lines: int = 60) -> list[Chunk]:
+    """按固定行数窗口切分任意文本"""
+    lines = source.splitlines(keepends=True)
+    chunks = []
+    for start in range(0, len(lines), max_lines):
+        text = "".join(lines[start:start + max_lines])
+        if text.strip():
+            end = min(len(lines), start + max_lines)
+            chunks.append(Chunk(path, f"lines {start + 1}-{end}", "text", start + 1, end, text))
+    return chunks
+
+
+def chunk_file(path: str, source: str) -> list[Chunk]:
+    if path.endswith((".py", ".pyi")):
+        return chunk_python(path, source)
+    return chunk_text(path, source)
@@ -0,0 +1,75 @@
+"""
+索引清单 - 记录每个文件的指纹与其切块，用于增量判断
+
+指纹分两级：mtime + size 未变直接跳过（不读文件）；变化时再比对内容哈希，
+内容未变只刷新 mtime，内容变化才重新切块，并且只为哈希变化的块重新计算向量。
+"""
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class ChunkEntry:
+    id: str
+    name: str
+    kind: str
+    start: int
+    end: int
+
+
+@dataclass
+class FileEntry:
+    mtime_ns: int
+    size: int
+    sha256: str
+    chunks: list[ChunkEntry] = field(default_factory=list)
+
+    def matches_stat(self, st: os.stat_result) -> bool:
+        return self.mtime_ns == st.st_mtime_ns and self.size == st.st_size
+
+
+class Manifest:
+    """项目索引清单（JSON，原子写入）"""
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self.embedder: str | None = None
+        self.files: dict[str, FileEntry] = {}
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return  # 清单损坏时视为空，触发全量重建
+        if data.get("version") != MANIFEST_VERSION:
+            return
+        self.embedder = data.get("embedder")
+        for rel, entry in data.get("files", {}).items():
+            chunks = [ChunkEntry(**c) for c in entry.pop("chunks", [])]
+            self.files[rel] = FileEntry(**entry, chunks=chunks)
+
+    def reset(self, embedder: str | None = None):
+        self.embedder = embedder
+        self.files = {}
+
+    def chunk_lookup(self) -> dict[str, tuple[str, ChunkEntry]]:
+        """块 ID → (文件路径, 块信息)"""
+        return {c.id: (rel, c) for rel, entry in self.files.items() for c in entry.chunks}
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "version": MANIFEST_VERSION,
+            "embedder": self.embedder,
+            "files": {rel: asdict(entry) for rel, entry in sorted(self.files.items())},
+        }
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(payload, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, self.path)
@@ -0,0 +1,290 @@
+"""
+增量索引流水线 - 生产者 / 消费者模型，阶段之间以有界队列连接
+
+    扫描（线程）──► files 队列 ──► 切块 worker × N（线程）──► updates 队列 ──► 向量化 + 写入（单消费者）
+
+- 扫描：遍历项目（遵循 .gitignore），mtime + size 未变的文件在这一步就被跳过
+- 切块：读取变化的文件，内容哈希未变只刷新指纹；否则按 AST 切块，与清单比对出新增 / 过期的块
+- 向量化：跨文件攒批调用 embed_documents，写入向量库后才提交该文件的清单条目
+- 有界队列提供背压：向量化跟不上时，上游自动等待，内存占用不随仓库规模增长
+
+块 ID 为 “路径#内容哈希”，内容不变的块（即使行号移动）不会重新计算向量。
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from refrain.core.logger import log
+from refrain.core.llm.vector import BM25Index, BaseEmbedder, BaseVectorStore, HybridStore, MmapVectorStore
+from refrain.utils.fs import walk_files
+from .chunker import INDEXED_SUFFIXES, Chunk, chunk_file
+from .manifest import ChunkEntry, FileEntry, Manifest
+
+INDEX_DIRNAME = ".refrain/index"
+
+_DONE = object()
+
+
+@dataclass
+class IndexStats:
+    """一次索引运行的统计"""
+    scanned: int = 0
+    unchanged: int = 0
+    changed: int = 0
+    removed: int = 0
+    chunks_embedded: int = 0
+    chunks_reused: int = 0
+    chunks_deleted: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class _FileUpdate:
+    rel: str
+    entry: FileEntry
+    new_chunks: list[Chunk] = field(default_factory=list)
+    stale_ids: list[str] = field(default_factory=list)
+
+
+def embedder_signature(embedder: BaseEmbedder) -> str:
+    """向量模型标识：模型或参数变化时需要全量重建索引"""
+    for attr in ("scope", "config", "model_path"):
+        value = getattr(embedder, attr, None)
+        if value is not None:
+            return f"{type(embedder).__name__}:{value}"
+    return type(embedder).__name__
+
+
+def assign_ids(rel: str, chunks: list[Chunk]) -> list[str]:
+    """块 ID = 路径#内容哈希前缀，同一文件内内容重复的块追加序号"""
+    seen: dict[str, int] = {}
+    ids = []
+    for chunk in chunks:
+        base = f"{rel}#{chunk.hash[:16]}"
+        count = seen.get(base, 0)
+        seen[base] = count + 1
+        ids.append(base if count == 0 else f"{base}~{count}")
+    return ids
+
+
+class Indexer:
+    """
+    项目代码索引器。
+    索引默认存放在 <root>/.refrain/index（清单 manifest.json + 向量库 vectors/ + 词法索引 lexical.npz 及其增量日志），
+    检索时两路结果以 RRF 融合。
+    """
+
+    def __init__(
+        self,
+        root: Path | str,
+        embedder: BaseEmbedder,
+        index_dir: Path | str | None = None,
+        store: BaseVectorStore | None = None,
+        workers: int = 4,
+        queue_size: int = 64,
+        batch_size: int = 64,
+        max_file_bytes: int = 1_000_000,
+    ):
+        self.root = Path(root).resolve()
+        self.embedder = embedder
+        self.index_dir = Path(index_dir) if index_dir else self.root / INDEX_DIRNAME
+        self.manifest = Manifest(self.index_dir / "manifest.json")
+        self._store = store
+        self.workers = workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.max_file_bytes = max_file_bytes
+        self._lookup: dict[str, tuple[str, ChunkEntry]] | None = None
+        self._retriever: HybridStore | None = None
+
+    @property
+    def store(self) -> BaseVectorStore:
+        if self._store is None:
+            self._store = MmapVectorStore(self.index_dir / "vectors")
+        return self._store
+
+    @property
+    def lexical_path(self) -> Path:
+        return self.index_dir / "lexical.npz"
+
+    @property
+    def retriever(self) -> HybridStore:
+        """向量库与 BM25 词法索引的组合，写入与删除同步到两路"""
+        if self._retriever is None:
+            self._retriever = HybridStore(self.store, BM25Index.load(self.lexical_path), self.embedder)
+        return self._retriever
+
+    def close(self):
+        close = getattr(self._store, "close", None)
+        if close:
+            close()
+
+    # ---------- 运行 ----------
+
+    async def run(
+        self,
+        rebuild: bool = False,
+        on_progress: Callable[[IndexStats], None] | None = None,
+    ) -> IndexStats:
+        """执行一次增量索引，rebuild=True 或向量模型变化时全量重建"""
+        started = time.perf_counter()
+        stats = IndexStats()
+        self._lookup = None
+        signature = embedder_signature(self.embedder)
+        # 缺少词法索引（旧版本建立的索引）时同样全量重建
+        missing_lexical = bool(self.manifest.files) and not self.lexical_path.exists()
+        if rebuild or missing_lexical or self.manifest.embedder != signature:
+            if self.manifest.files:
+                log.info(f"索引全量重建 | 向量模型: {signature}")
+            self._reset(signature)
+
+        files_q: asyncio.Queue = asyncio.Queue(self.queue_size)
+        updates_q: asyncio.Queue = asyncio.Queue(self.queue_size)
+        seen: set[str] = set()
+
+        async def scan():
+            candidates = await asyncio.to_thread(self._scan, seen, stats)
+            for item in candidates:
+                await files_q.put(item)
+            for _ in range(self.workers):
+                await files_q.put(_DONE)
+
+        async def chunk_worker():
+            while (item := await files_q.get()) is not _DONE:
+                update = await asyncio.to_thread(self._prepare, *item)
+                if update is not None:
+                    await updates_q.put(update)
+            await updates_q.put(_DONE)
+
+        async def consume():
+            finished = 0
+            batch: list[_FileUpdate] = []
+            while finished < self.workers:
+                item = await updates_q.get()
+                if item is _DONE:
+                    finished += 1
+                else:
+                    batch.append(item)
+                # 攒够一批或上游暂时没有数据时提交
+                if batch and (finished == self.workers or updates_q.empty()
+                              or sum(len(u.new_chunks) for u in batch) >= self.batch_size):
+                    await self._commit(batch, stats)
+                    batch = []
+                    if on_progress:
+                        on_progress(stats)
+
+        await asyncio.gather(scan(), *(chunk_worker() for _ in range(self.workers)), consume())
+
+        removed = [rel for rel in self.manifest.files if rel not in seen]
+        if removed:
+            stale = [c.id for rel in removed for c in self.manifest.files.pop(rel).chunks]
+            await self.retriever.delete(stale)
+            stats.removed = len(removed)
+            stats.chunks_deleted += len(stale)
+        # 词法索引只在有变化时保存，且通常只追加增量日志，耗时与变更量而非仓库规模成正比
+        if self._retriever is not None and self._retriever.lexical.dirty:
+            self._retriever.lexical.save(self.lexical_path)
+        self.manifest.save()
+        stats.seconds = time.perf_counter() - started
+        log.info(
+            f"索引完成 | 扫描 {stats.scanned} | 变更 {stats.changed} | 删除 {stats.removed} "
+            f"| 新向量 {stats.chunks_embedded} | 耗时 {stats.seconds:.3f}s"
+        )
+        return stats
+
+    def _reset(self, signature: str):
+        self.close()
+        self._store = None
+        self._retriever = None
+        shutil.rmtree(self.index_dir / "vectors", ignore_errors=True)
+        self.lexical_path.unlink(missing_ok=True)
+        BM25Index.delta_path(self.lexical_path).unlink(missing_ok=True)
+        self.manifest.reset(signature)
+
+    def _scan(self, seen: set[str], stats: IndexStats) -> list[tuple[str, os.stat_result]]:
+        """遍历项目，返回指纹（mtime + size）发生变化的候选文件"""
+        candidates = []
+        for rel, st in walk_files(self.root):
+            if Path(rel).suffix not in INDEXED_SUFFIXES or st.st_size > self.max_file_bytes:
+                continue
+            seen.add(rel)
+            stats.scanned += 1
+            entry = self.manifest.files.get(rel)
+            if entry is not None and entry.matches_stat(st):
+                stats.unchanged += 1
+            else:
+                candidates.append((rel, st))
+        return candidates
+
+    def _prepare(self, rel: str, st: os.stat_result) -> _FileUpdate | None:
+        """读取并切块单个文件，计算与清单相比新增与过期的块"""
+        try:
+            raw = (self.root / rel).read_bytes()
+        except OSError:
+            return None
+        if b"\0" in raw[:8192]:
+            return None  # 二进制文件
+        digest = hashlib.sha256(raw).hexdigest()
+        old = self.manifest.files.get(rel)
+        if old is not None and old.sha256 == digest:
+            # 仅 mtime 变化（如 touch、切换分支后切回）
+            return _FileUpdate(rel, FileEntry(st.st_mtime_ns, st.st_size, digest, old.chunks))
+
+        chunks = chunk_file(rel, raw.decode("utf-8", errors="replace"))
+        ids = assign_ids(rel, chunks)
+        old_ids = {c.id for c in old.chunks} if old else set()
+        entry = FileEntry(st.st_mtime_ns, st.st_size, digest, [
+            ChunkEntry(chunk_id, c.name, c.kind, c.start, c.end) for chunk_id, c in zip(ids, chunks)
+        ])
+        update = _FileUpdate(rel, entry, stale_ids=sorted(old_ids - set(ids)))
+        for chunk_id, chunk in zip(ids, chunks):
+            if chunk_id not in old_ids:
+                chunk.id = chunk_id
+                update.new_chunks.append(chunk)
+        return update
+
+    async def _commit(self, batch: list[_FileUpdate], stats: IndexStats):
+        """删除过期块、为新块计算向量并写入，最后提交清单条目"""
+        stale = [i for u in batch for i in u.stale_ids]
+        if stale:
+            await self.retriever.delete(stale)
+        chunks = [c for u in batch for c in u.new_chunks]
+        if chunks:
+            vectors = await self.embedder.embed_documents([c.embed_text for c in chunks])
+            await self.retriever.add_texts(
+                [c.text for c in chunks],
+                metadatas=[{"path": c.path, "name": c.name, "kind": c.kind} for c in chunks],
+                ids=[c.id for c in chunks],
+                embeddings=vectors,
+            )
+        for update in batch:
+            old = self.manifest.files.get(update.rel)
+            if old is None or old.sha256 != update.entry.sha256:
+                stats.changed += 1
+                stats.chunks_reused += len(update.entry.chunks) - len(update.new_chunks)
+            self.manifest.files[update.rel] = update.entry
+        stats.chunks_embedded += len(chunks)
+        stats.chunks_deleted += len(stale)
+
+    # ---------- 检索 ----------
+
+    async def search(self, query: str, k: int = 8, mode: str = "auto", **kwargs) -> list[dict]:
+        """
+        混合检索（BM25 + 向量，RRF 融合），结果附带清单中的最新行号。
+        mode 见 HybridStore.search：符号查询默认只走词法检索。
+        """
+        if not self.manifest.files:
+            return []
+        hits = await self.retriever.search(query, k=k, mode=mode, **kwargs)
+        if self._lookup is None:
+            self._lookup = self.manifest.chunk_lookup()
+        for hit in hits:
+            found = self._lookup.get(hit["id"])
+            if found:
+                hit["metadata"] = {**hit["metadata"], "start": found[1].start, "end": found[1].end}
+        return hits
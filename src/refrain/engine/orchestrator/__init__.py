@@ -1 +1,11 @@
 # 调度器模块
+from .tools import Tool, ToolLike, Toolbox, ToolSet, tool
+from .dispatcher import ToolDispatcher, ToolOutcome
+from .speculation import Speculator
+from .agent import AgentEvent, Orchestrator, StepTimeoutError
+
+__all__ = [
+    "Tool", "ToolLike", "Toolbox", "ToolSet", "tool",
+    "ToolDispatcher", "ToolOutcome", "Speculator",
+    "AgentEvent", "Orchestrator", "StepTimeoutError",
+]
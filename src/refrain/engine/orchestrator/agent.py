@@ -0,0 +1,154 @@
+"""
+ReAct 编排器 - 思考 → 调用工具 → 观察 的循环
+
+每一步流式调用 BaseLLM.stream_chat：
+- 增量帧实时转发给界面（AgentEvent.delta）
+- 终局帧的 finish_reason / tool_calls 决定下一步：有工具调用则并发执行并把结果写回对话，否则结束
+- 步数预算（max_steps）与单步超时（step_timeout，覆盖模型生成阶段）防止失控
+- speculative=True 时，只读工具调用在参数拼装完整后即开始执行，与模型生成重叠（见 speculation.py）
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, AsyncIterator, Literal
+
+from refrain.core.llm.chat.base import BaseLLM
+from refrain.core.llm.chat.prompt import PromptBuilder, UsageMeter
+from refrain.core.llm.chat.schemas import LLMResponse, ToolCall
+from refrain.core.logger import log
+from .dispatcher import ToolDispatcher, ToolOutcome
+from .speculation import Speculator
+from .tools import Toolbox
+
+EventType = Literal["delta", "tool_call", "tool_result", "final", "budget_exhausted"]
+
+
+@dataclass
+class AgentEvent:
+    """编排过程中的事件，供界面渲染"""
+    type: EventType
+    step: int
+    content: str | None = None
+    reasoning: str | None = None
+    tool_call: ToolCall | None = None
+    outcome: ToolOutcome | None = None
+    usage: dict[str, int] = field(default_factory=dict)
+
+
+class StepTimeoutError(TimeoutError):
+    """模型在单步时限内未完成生成"""
+
+
+def assistant_message(frame: LLMResponse) -> dict[str, Any]:
+    """将终局帧转换为写回对话的 assistant 消息（含工具调用）"""
+    message: dict[str, Any] = {"role": "assistant", "content": frame.final_content or ""}
+    if frame.tool_calls:
+        message["tool_calls"] = [
+            {"id": tc.id, "type": "function", "function": {"name": tc.function_name, "arguments": tc.function_args}}
+            for tc in frame.tool_calls
+        ]
+    return message
+
+
+async def _with_deadline(stream: AsyncGenerator, deadline: float | None) -> AsyncIterator:
+    """为异步生成器的整体消费设置截止时间"""
+    try:
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise StepTimeoutError("模型生成超时")
+            try:
+                item = await asyncio.wait_for(stream.__anext__(), remaining)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise StepTimeoutError("模型生成超时") from None
+            yield item
+    finally:
+        await stream.aclose()
+
+
+class Orchestrator:
+    """
+    ReAct 编排器。
+    messages 在多次 run 之间保留，可用于多轮任务；tool_timeout 为单个工具调用的默认超时。
+    """
+
+    def __init__(
+        self,
+        llm: BaseLLM,
+        toolbox: Toolbox,
+        system_prompt: str | None = None,
+        max_steps: int = 20,
+        step_timeout: float | None = 300.0,
+        tool_timeout: float = 60.0,
+        max_concurrency: int = 8,
+        speculative: bool = True,
+    ):
+        self.llm = llm
+        self.toolbox = toolbox
+        self.max_steps = max_steps
+        self.step_timeout = step_timeout
+        self.speculative = speculative
+        self.dispatcher = ToolDispatcher(toolbox, timeout=tool_timeout, max_concurrency=max_concurrency)
+        self.messages: list[dict[str, Any]] = []
+        if system_prompt:
+            self.messages.append({"role": "system", "content": system_prompt})
+        self.meter = UsageMeter()
+        self._builder = PromptBuilder()
+
+    @property
+    def usage(self) -> dict[str, int]:
+        return self.meter.totals
+
+    def close(self):
+        self.dispatcher.close()
+
+    async def run(self, task: str | None = None) -> AsyncIterator[AgentEvent]:
+        """执行任务直至模型不再调用工具或步数耗尽，逐步产出事件"""
+        if task:
+            self.messages.append({"role": "user", "content": task})
+        # 工具描述在整个任务内保持同一份规范化序列化结果，保证请求前缀可被缓存
+        self._builder.set_tools(self.toolbox.specs())
+
+        for step in range(1, self.max_steps + 1):
+            final: LLMResponse | None = None
+            messages, specs = self._builder.build(self.messages)
+            speculator = Speculator(self.dispatcher) if self.speculative and specs else None
+            deadline = time.monotonic() + self.step_timeout if self.step_timeout else None
+            # 推测执行需要增量帧携带工具调用快照
+            stream = self.llm.stream_chat(messages, tools=specs, delta_only=speculator is None)
+            try:
+                async for frame in _with_deadline(stream, deadline):
+                    if not frame.is_delta:
+                        final = frame
+                        continue
+                    if speculator is not None and frame.tool_calls:
+                        speculator.observe(frame.tool_calls)
+                    if frame.content or frame.reasoning_content:
+                        yield AgentEvent("delta", step, content=frame.content, reasoning=frame.reasoning_content)
+                if final is None:
+                    raise RuntimeError("模型流在终局帧之前结束")
+            except BaseException:
+                if speculator is not None:
+                    speculator.discard()
+                raise
+            started = speculator.settle(final.tool_calls or []) if speculator is not None else {}
+
+            self.meter.add(final.usage)
+            self.messages.append(assistant_message(final))
+            if not final.tool_calls:
+                yield AgentEvent("final", step, content=final.final_content, usage=dict(self.usage))
+                return
+
+            for call in final.tool_calls:
+                yield AgentEvent("tool_call", step, tool_call=call)
+            outcomes: dict[str, ToolOutcome] = {}
+            async for outcome in self.dispatcher.dispatch(final.tool_calls, started):
+                outcomes[outcome.call.id] = outcome
+                yield AgentEvent("tool_result", step, outcome=outcome)
+            # 工具结果按调用顺序写回，保证对话内容确定
+            self.messages.extend(outcomes[call.id].to_message() for call in final.tool_calls)
+
+        log.warning(f"编排器步数耗尽 | max_steps: {self.max_steps}")
+        yield AgentEvent("budget_exhausted", self.max_steps, usage=dict(self.usage))
@@ -0,0 +1,143 @@
+"""
+工具调度器 - 并发执行同一轮中的多个工具调用
+
+- 执行位置：协程工具在事件循环中，阻塞 I/O 工具在线程池中，CPU 密集型工具在进程池中
+- 并发策略：连续的只读调用组成一组并发执行；有副作用的调用作为屏障单独执行，保证写操作的先后顺序
+- 每个调用单独计时与超时，失败与超时都以错误文本回传给模型，不会中断整轮
+- 结果按完成顺序流式产出，便于界面实时展示
+"""
+import asyncio
+import functools
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Mapping, Sequence
+
+from refrain.core.llm.chat.schemas import ToolCall
+from refrain.core.logger import log
+from .tools import Toolbox, ToolLike, call_by_reference, format_result
+
+
+@dataclass
+class ToolOutcome:
+    """单个工具调用的执行结果"""
+    call: ToolCall
+    content: str
+    error: bool = False
+    seconds: float = 0.0
+
+    def to_message(self) -> dict[str, Any]:
+        return {"role": "tool", "tool_call_id": self.call.id, "content": self.content}
+
+
+def plan_groups(calls: Sequence[ToolCall], toolbox: Toolbox) -> list[list[ToolCall]]:
+    """按只读属性分组：连续只读调用合并为一组，其余调用各自成组"""
+    groups: list[list[ToolCall]] = []
+    previous_read_only = False
+    for call in calls:
+        t = toolbox.lookup(call.function_name)
+        read_only = t is None or t.read_only  # 未知工具只会产生错误，可与其他调用并发
+        if read_only and previous_read_only:
+            groups[-1].append(call)
+        else:
+            groups.append([call])
+        previous_read_only = read_only
+    return groups
+
+
+def parse_args(call: ToolCall) -> dict[str, Any]:
+    raw = call.function_args.strip()
+    if not raw:
+        return {}
+    try:
+        args = json.loads(raw)
+    except json.JSONDecodeError:
+        args = None
+    if not isinstance(args, dict):
+        raise ValueError(f"参数不是合法的 JSON 对象: {raw[:200]}")
+    return args
+
+
+class ToolDispatcher:
+    """
+    工具调度器。
+    timeout：单个调用的默认超时（秒）；max_concurrency：同组内的最大并发数；
+    process_workers：CPU 密集型工具的进程池大小（None 表示按 CPU 数）。
+    """
+
+    def __init__(
+        self,
+        toolbox: Toolbox,
+        timeout: float = 60.0,
+        max_concurrency: int = 8,
+        process_workers: int | None = None,
+        max_output_chars: int = 20_000,
+    ):
+        self.toolbox = toolbox
+        self.timeout = timeout
+        self.max_output_chars = max_output_chars
+        self.process_workers = process_workers
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pool: ProcessPoolExecutor | None = None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    async def dispatch(
+        self,
+        calls: Sequence[ToolCall],
+        started: Mapping[str, "asyncio.Task[ToolOutcome]"] | None = None,
+    ) -> AsyncIterator[ToolOutcome]:
+        """
+        执行一轮工具调用，按完成顺序产出结果。
+        started：已提前启动的任务（按调用 ID），直接等待其结果而不重复执行。
+        """
+        started = started or {}
+        for group in plan_groups(calls, self.toolbox):
+            tasks = [started.get(call.id) or asyncio.create_task(self.execute(call)) for call in group]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    async def execute(self, call: ToolCall) -> ToolOutcome:
+        """执行单个调用（带超时），异常转换为错误结果"""
+        started = time.perf_counter()
+        t = self.toolbox.lookup(call.function_name)
+        if t is None:
+            return ToolOutcome(call, f"错误: 未知工具 '{call.function_name}'", error=True)
+        timeout = getattr(t, "timeout", None) or self.timeout
+        try:
+            args = parse_args(call)
+            async with self._semaphore:
+                result = await asyncio.wait_for(self._invoke(t, args), timeout)
+            return ToolOutcome(call, format_result(result, self.max_output_chars),
+                               seconds=time.perf_counter() - started)
+        except asyncio.TimeoutError:
+            log.warning(f"工具超时 | {call.function_name} | {timeout}s")
+            return ToolOutcome(call, f"错误: 工具 {call.function_name} 执行超时 ({timeout:.0f}s)",
+                               error=True, seconds=time.perf_counter() - started)
+        except Exception as e:
+            log.warning(f"工具失败 | {call.function_name} | {type(e).__name__}: {e}")
+            return ToolOutcome(call, f"错误: {type(e).__name__}: {e}",
+                               error=True, seconds=time.perf_counter() - started)
+
+    async def _invoke(self, t: ToolLike, args: dict[str, Any]) -> Any:
+        # CPU 密集型且函数可按 (模块, 限定名) 导入时交给进程池，避开 GIL；否则退回线程池
+        func = getattr(t, "func", None)
+        reference = getattr(t, "reference", None)
+        ref = reference() if t.cpu_bound and callable(reference) else None
+        if ref is not None and not asyncio.iscoroutinefunction(func):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), functools.partial(call_by_reference, *ref, args))
+        return await t.run(args)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        return self._pool
@@ -0,0 +1,73 @@
+"""
+推测执行 - 模型仍在流式生成时提前执行只读工具调用
+
+stream_chat 的增量帧携带已拼装完成的 tool_calls（见 StreamAccumulator.finished_tool_calls）：
+调用在后续索引出现、参数成为完整的 JSON 对象或流给出 finish_reason 时完成，单个调用的轮次也会在流结束前出现。
+某个调用完成后，若它之前的调用都已就绪并且都是只读的，就立即在后台开始执行，使工具耗时与模型生成重叠。
+终局帧到达后按 (id, 名称, 参数) 核对：一致的结果直接复用，不一致或未出现的推测任务被取消丢弃。
+只读工具没有副作用，丢弃是安全的；遇到写操作或尚未就绪的调用即停止推测，保证读写顺序不变。
+"""
+import asyncio
+import json
+from typing import Sequence
+
+from refrain.core.llm.chat.schemas import ToolCall
+from refrain.core.logger import log
+from .dispatcher import ToolDispatcher, ToolOutcome
+
+
+def args_complete(raw: str) -> bool:
+    """参数是否已是完整的 JSON 对象（空参数视为未就绪，终局帧再决定）"""
+    if not raw.rstrip().endswith("}"):
+        return False
+    try:
+        return isinstance(json.loads(raw), dict)
+    except json.JSONDecodeError:
+        return False
+
+
+def _key(call: ToolCall) -> tuple[str, str, str]:
+    return call.id, call.function_name, call.function_args
+
+
+class Speculator:
+    """单个步骤内的推测执行状态"""
+
+    def __init__(self, dispatcher: ToolDispatcher):
+        self.dispatcher = dispatcher
+        self._tasks: dict[str, tuple[tuple[str, str, str], asyncio.Task[ToolOutcome]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def observe(self, calls: Sequence[ToolCall] | None):
+        """根据增量帧中的工具调用快照启动新就绪的只读调用"""
+        for call in calls or ():
+            if call.id in self._tasks:
+                continue
+            t = self.dispatcher.toolbox.lookup(call.function_name)
+            if not call.id or t is None or not t.read_only or not args_complete(call.function_args):
+                return  # 之后的调用可能依赖此调用的结果（或其副作用），停止推测
+            self._tasks[call.id] = (_key(call), asyncio.create_task(self.dispatcher.execute(call)))
+
+    def settle(self, calls: Sequence[ToolCall]) -> dict[str, asyncio.Task[ToolOutcome]]:
+        """按终局帧核对推测任务：返回可复用的任务，其余全部取消"""
+        final = {call.id: _key(call) for call in calls}
+        reusable = {}
+        for call_id, (key, task) in self._tasks.items():
+            if final.get(call_id) == key:
+                reusable[call_id] = task
+            else:
+                task.cancel()
+        self.hits += len(reusable)
+        self.misses += len(self._tasks) - len(reusable)
+        if self._tasks:
+            log.debug(f"推测执行 | 复用: {len(reusable)} | 丢弃: {len(self._tasks) - len(reusable)}")
+        self._tasks = {}
+        return reusable
+
+    def discard(self):
+        """取消所有未被认领的推测任务（流异常或超时时调用）"""
+        for _, task in self._tasks.values():
+            task.cancel()
+        self.misses += len(self._tasks)
+        self._tasks = {}
@@ -0,0 +1,169 @@
+"""
+工具抽象 - 调度器与工具提供方之间的最小协议
+
+调度器只依赖 Toolbox 协议（specs + lookup）与 Tool 协议（name / read_only / cpu_bound / run），
+技能系统与临时拼装的 ToolSet 都可以作为工具箱传入。
+"""
+import asyncio
+import importlib
+import inspect
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Protocol, get_type_hints, runtime_checkable
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+
+
+@runtime_checkable
+class ToolLike(Protocol):
+    """调度器所需的工具接口"""
+    name: str
+    read_only: bool  # 只读工具之间可以并发执行
+    cpu_bound: bool  # CPU 密集型工具在进程池中执行
+
+    def spec(self) -> dict[str, Any]: ...
+
+    async def run(self, args: dict[str, Any]) -> Any: ...
+
+
+@runtime_checkable
+class Toolbox(Protocol):
+    """工具箱接口：向模型暴露工具描述，并按名称查找工具"""
+
+    def specs(self) -> list[dict[str, Any]]: ...
+
+    def lookup(self, name: str) -> ToolLike | None: ...
+
+
+def schema_from_signature(func: Callable) -> dict[str, Any]:
+    """根据函数签名生成 JSON Schema（仅支持基础类型，无默认值的参数视为必填）"""
+    hints = get_type_hints(func)
+    properties: dict[str, Any] = {}
+    required = []
+    for name, param in inspect.signature(func).parameters.items():
+        if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        hint = hints.get(name, str)
+        origin = getattr(hint, "__origin__", hint)
+        properties[name] = {"type": _JSON_TYPES.get(origin, "string")}
+        if param.default is param.empty:
+            required.append(name)
+    return {"type": "object", "properties": properties, "required": required}
+
+
+@dataclass
+class Tool:
+    """
+    由普通函数构成的工具。
+    func 可以是协程函数（直接在事件循环中执行）或普通函数（在线程池中执行，cpu_bound=True 时交给进程池）。
+    """
+    name: str
+    func: Callable[..., Any]
+    description: str = ""
+    parameters: dict[str, Any] = field(default_factory=dict)
+    read_only: bool = False
+    cpu_bound: bool = False
+    timeout: float | None = None  # 覆盖调度器的默认超时
+
+    def __post_init__(self):
+        if not self.parameters:
+            self.parameters = schema_from_signature(self.func)
+        if not self.description:
+            self.description = inspect.getdoc(self.func) or ""
+
+    def spec(self) -> dict[str, Any]:
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": self.parameters},
+        }
+
+    @property
+    def is_async(self) -> bool:
+        return asyncio.iscoroutinefunction(self.func)
+
+    def reference(self) -> tuple[str, str] | None:
+        """
+        函数的可导入引用 (模块, 限定名)，供进程池按引用调用。
+        @tool 会用 Tool 对象替换模块中的同名函数，直接 pickle 函数会失败；闭包与 lambda 无法引用时返回 None。
+        """
+        module = getattr(self.func, "__module__", None)
+        qualname = getattr(self.func, "__qualname__", "")
+        if not module or not qualname or "<" in qualname:
+            return None
+        return module, qualname
+
+    async def run(self, args: dict[str, Any]) -> Any:
+        """在当前进程中执行（CPU 密集型工具的进程池调度由调度器负责）"""
+        if self.is_async:
+            return await self.func(**args)
+        return await asyncio.to_thread(self.func, **args)
+
+
+def call_by_reference(module: str, qualname: str, args: dict[str, Any]) -> Any:
+    """进程池中的调用入口：按引用导入函数（被 @tool 替换为 Tool 时取其原函数）后执行"""
+    target: Any = importlib.import_module(module)
+    for part in qualname.split("."):
+        target = getattr(target, part)
+    if isinstance(target, Tool):
+        target = target.func
+    return target(**args)
+
+
+def tool(
+    name: str | None = None,
+    description: str | None = None,
+    read_only: bool = False,
+    cpu_bound: bool = False,
+    timeout: float | None = None,
+    parameters: dict[str, Any] | None = None,
+) -> Callable[[Callable], Tool]:
+    """装饰器：将函数包装为 Tool，描述默认取函数文档字符串"""
+    def wrap(func: Callable) -> Tool:
+        return Tool(
+            name=name or func.__name__,
+            func=func,
+            description=description or "",
+            parameters=parameters or {},
+            read_only=read_only,
+            cpu_bound=cpu_bound,
+            timeout=timeout,
+        )
+    return wrap
+
+
+class ToolSet:
+    """简单的工具箱实现：按名称保存一组工具"""
+
+    def __init__(self, tools: Iterable[ToolLike] = ()):
+        self._tools: dict[str, ToolLike] = {}
+        for t in tools:
+            self.add(t)
+
+    def add(self, t: ToolLike) -> ToolLike:
+        if t.name in self._tools:
+            raise ValueError(f"工具名称重复: {t.name}")
+        self._tools[t.name] = t
+        return t
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def specs(self) -> list[dict[str, Any]]:
+        return [t.spec() for t in self._tools.values()]
+
+    def lookup(self, name: str) -> ToolLike | None:
+        return self._tools.get(name)
+
+
+def format_result(result: Any, limit: int = 20_000) -> str:
+    """将工具返回值序列化为回传给模型的文本，过长时截断"""
+    if isinstance(result, str):
+        text = result
+    else:
+        text = json.dumps(result, ensure_ascii=False, default=str)
+    if len(text) > limit:
+        text = text[:limit] + f"\n...[已截断，原始长度 {len(text)} 字符]"
+    return text
@@ -1 +1,5 @@
 # Skills 工具层
+from .base import Skill, SkillContext
+from .registry import SkillRegistry, register_skill
+
+__all__ = ["Skill", "SkillContext", "SkillRegistry", "register_skill"]
@@ -1 +1,4 @@
 # 技能基类模块
+from .skill import Skill, SkillContext
+
+__all__ = ["Skill", "SkillContext"]
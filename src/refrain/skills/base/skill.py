@@ -0,0 +1,135 @@
+"""
+技能基类 - 声明式参数 + 预编译校验
+
+技能以类声明：类属性描述名称与调度属性（read_only / cpu_bound / timeout），
+参数由 Args（Pydantic 模型）给出，未声明时由 execute 的类型注解生成。
+参数模型与工具描述在每个类上只构建一次并缓存；调用时用模型上预编译的 pydantic-core 校验器
+校验 ToolCall.args_dict，类型不符或缺少参数会以错误文本回传给模型。
+"""
+import asyncio
+import functools
+import inspect
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, ClassVar
+
+from pydantic import BaseModel, ConfigDict, create_model
+
+if TYPE_CHECKING:
+    from refrain.utils.fs import FileTransaction
+
+_CAMEL_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+
+@dataclass
+class SkillContext:
+    """技能运行上下文（工作区根目录等），由注册中心在实例化技能时注入"""
+    root: Path = field(default_factory=Path.cwd)
+    # 模型最近一次读到的文件版本（绝对路径 -> 内容哈希），写入前据此检测并发修改
+    file_versions: dict[str, str] = field(default_factory=dict)
+    # 非 None 时文件技能只把修改暂存到事务中，由调用方展示差异并经用户确认后再提交
+    transaction: "FileTransaction | None" = None
+
+    def __post_init__(self):
+        self.root = Path(self.root).resolve()
+
+
+class Skill:
+    """
+    技能基类。子类声明 name / description（默认取类名与文档字符串）并实现 execute，
+    execute 可以是协程函数或普通函数（普通函数在线程池中执行，cpu_bound=True 时由调度器交给进程池）。
+
+        class ReadFile(Skill):
+            '''读取文件内容'''
+            read_only = True
+
+            def execute(self, path: str, start_line: int = 1) -> str: ...
+    """
+    name: ClassVar[str] = ""
+    description: ClassVar[str] = ""
+    read_only: ClassVar[bool] = False
+    cpu_bound: ClassVar[bool] = False
+    timeout: ClassVar[float | None] = None
+    Args: ClassVar[type[BaseModel] | None] = None  # 显式参数模型，优先于 execute 的签名
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not cls.__dict__.get("name"):
+            cls.name = _CAMEL_BOUNDARY.sub("_", cls.__name__).lower()
+        if not cls.__dict__.get("description"):
+            cls.description = inspect.getdoc(cls) or ""
+
+    def __init__(self, context: SkillContext | None = None):
+        self.context = context or SkillContext()
+
+    # ---------- 声明（按类缓存） ----------
+
+    @classmethod
+    def args_model(cls) -> type[BaseModel]:
+        return _args_model(cls)
+
+    @classmethod
+    def tool_spec(cls) -> dict[str, Any]:
+        """OpenAI 工具描述（每个类只生成一次）"""
+        return _tool_spec(cls)
+
+    def spec(self) -> dict[str, Any]:
+        return self.tool_spec()
+
+    # ---------- 调用 ----------
+
+    def validate(self, args: dict[str, Any]) -> dict[str, Any]:
+        """校验并转换参数，返回 execute 的关键字参数"""
+        model = self.args_model()
+        params = model.model_validate(args)
+        return {name: getattr(params, name) for name in model.model_fields}
+
+    @property
+    def func(self):
+        """同步技能的可调用入口（校验 + 执行），供调度器在进程池中执行"""
+        return None if asyncio.iscoroutinefunction(self.execute) else self._call
+
+    def _call(self, **args: Any) -> Any:
+        return self.execute(**self.validate(args))
+
+    async def run(self, args: dict[str, Any]) -> Any:
+        kwargs = self.validate(args)
+        if asyncio.iscoroutinefunction(self.execute):
+            return await self.execute(**kwargs)
+        return await asyncio.to_thread(self.execute, **kwargs)
+
+    def execute(self, **kwargs: Any) -> Any:
+        raise NotImplementedError
+
+
+@functools.cache
+def _args_model(cls: type[Skill]) -> type[BaseModel]:
+    if cls.Args is not None:
+        return cls.Args
+    fields: dict[str, Any] = {}
+    for name, param in inspect.signature(cls.execute).parameters.items():
+        if name == "self" or param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        annotation = Any if param.annotation is param.empty else param.annotation
+        fields[name] = (annotation, ... if param.default is param.empty else param.default)
+    return create_model(f"{cls.__name__}Args", __config__=ConfigDict(extra="forbid"), **fields)
+
+
+def _strip_titles(schema: Any) -> Any:
+    """去掉 Pydantic 自动生成的 title 字段，缩短发送给模型的工具描述"""
+    if isinstance(schema, dict):
+        return {k: _strip_titles(v) for k, v in schema.items() if not (k == "title" and isinstance(v, str))}
+    if isinstance(schema, list):
+        return [_strip_titles(v) for v in schema]
+    return schema
+
+
+@functools.cache
+def _tool_spec(cls: type[Skill]) -> dict[str, Any]:
+    parameters = _strip_titles(_args_model(cls).model_json_schema())
+    parameters.pop("additionalProperties", None)
+    return {
+        "type": "function",
+        "function": {"name": cls.name, "description": cls.description, "parameters": parameters},
+    }
@@ -1 +1,11 @@
 # 技能注册中心模块
+from .registry import (
+    BUILTIN_SKILLS,
+    ENTRY_POINT_GROUP,
+    LazySkill,
+    SkillEntry,
+    SkillRegistry,
+    register_skill,
+)
+
+__all__ = ["BUILTIN_SKILLS", "ENTRY_POINT_GROUP", "LazySkill", "SkillEntry", "SkillRegistry", "register_skill"]
@@ -0,0 +1,242 @@
+"""
+技能注册中心 - 发现、描述缓存与惰性加载
+
+- 发现：内置技能表（BUILTIN_SKILLS）、入口点组 `refrain.skills`（第三方包）、@register_skill 装饰的类
+- 描述缓存：技能以 "模块:类名" 登记，工具描述与调度属性写入 ~/.refrain/cache/skills.json，
+  以模块源文件的 mtime/size 作为指纹，并叠加 refrain 版本与技能基类源文件的指纹（基类或 _tool_spec
+  变化时全部失效）；指纹未变时直接读取缓存，不导入技能模块
+- 惰性加载：lookup 返回轻量代理，只有真正调用技能时才导入模块并实例化
+"""
+import importlib
+import importlib.util
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from importlib.metadata import PackageNotFoundError, entry_points, version
+from pathlib import Path
+from typing import Any, Iterable
+
+from refrain.core.logger import log
+from ..base import Skill, SkillContext
+from ..base import skill as base_module
+
+ENTRY_POINT_GROUP = "refrain.skills"
+
+# 名称 -> "模块:类名"（与 CLI 的惰性子命令表同样按名称登记）
+BUILTIN_SKILLS: dict[str, str] = {
+    "read_file": "refrain.skills.toolbox.files:ReadFile",
+    "list_files": "refrain.skills.toolbox.files:ListFiles",
+    "replace_in_file": "refrain.skills.toolbox.files:ReplaceInFile",
+    "write_file": "refrain.skills.toolbox.files:WriteFile",
+    "search_code": "refrain.skills.toolbox.search:SearchCode",
+    "find_files": "refrain.skills.toolbox.search:FindFiles",
+}
+
+# @register_skill 登记的类（导入其模块时生效）
+DECLARED_SKILLS: dict[str, type[Skill]] = {}
+
+
+def register_skill(cls: type[Skill]) -> type[Skill]:
+    """类装饰器：将技能登记到全局表，之后创建的注册中心都会包含它"""
+    DECLARED_SKILLS[cls.name] = cls
+    return cls
+
+
+def load_target(target: str) -> type[Skill]:
+    module_name, _, attr = target.partition(":")
+    cls = getattr(importlib.import_module(module_name), attr)
+    if not (isinstance(cls, type) and issubclass(cls, Skill)):
+        raise TypeError(f"{target} 不是 Skill 子类")
+    return cls
+
+
+def _file_fingerprint(path: str) -> str:
+    st = os.stat(path)
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+@lru_cache(maxsize=None)
+def base_fingerprint() -> str:
+    """所有技能共享的指纹部分：refrain 版本 + 技能基类（含 _tool_spec）源文件"""
+    try:
+        package_version = version("refrain")
+    except PackageNotFoundError:
+        package_version = "dev"
+    return f"{package_version}|{_file_fingerprint(base_module.__file__)}"
+
+
+def fingerprint(target: str) -> str | None:
+    """模块源文件的 mtime/size 指纹（叠加 base_fingerprint）；无法定位源文件时返回 None（不缓存）"""
+    try:
+        spec = importlib.util.find_spec(target.partition(":")[0])
+    except (ImportError, ValueError):
+        return None
+    if spec is None or not spec.origin or not os.path.isfile(spec.origin):
+        return None
+    return f"{base_fingerprint()}|{_file_fingerprint(spec.origin)}"
+
+
+@dataclass
+class SkillEntry:
+    """注册中心中的一项：调度所需的属性与工具描述，技能类按需加载"""
+    name: str
+    target: str | None
+    spec: dict[str, Any]
+    read_only: bool = False
+    cpu_bound: bool = False
+    timeout: float | None = None
+    cls: type[Skill] | None = None
+
+    @classmethod
+    def from_class(cls, skill_cls: type[Skill], target: str | None = None) -> "SkillEntry":
+        return cls(skill_cls.name, target, skill_cls.tool_spec(), skill_cls.read_only,
+                   skill_cls.cpu_bound, skill_cls.timeout, skill_cls)
+
+    def to_cache(self) -> dict[str, Any]:
+        return {"name": self.name, "spec": self.spec, "read_only": self.read_only,
+                "cpu_bound": self.cpu_bound, "timeout": self.timeout}
+
+
+class LazySkill:
+    """技能代理：调度属性来自注册表，首次执行时才加载真实技能"""
+
+    def __init__(self, entry: SkillEntry, registry: "SkillRegistry"):
+        self.entry = entry
+        self.registry = registry
+        self.name = entry.name
+        self.read_only = entry.read_only
+        self.cpu_bound = entry.cpu_bound
+        self.timeout = entry.timeout
+
+    def spec(self) -> dict[str, Any]:
+        return self.entry.spec
+
+    @property
+    def func(self):
+        return self.registry.load(self.name).func
+
+    async def run(self, args: dict[str, Any]) -> Any:
+        return await self.registry.load(self.name).run(args)
+
+
+class SkillRegistry:
+    """
+    技能注册中心，实现编排器的 Toolbox 协议（specs + lookup）。
+    cache_path 为 None 时使用 ~/.refrain/cache/skills.json；传入 False 关闭描述缓存。
+    """
+
+    def __init__(
+        self,
+        context: SkillContext | None = None,
+        builtins: bool = True,
+        discover_entry_points: bool = True,
+        cache_path: Path | str | None | bool = None,
+    ):
+        self.context = context or SkillContext()
+        if cache_path is None:
+            from refrain.core.llm.chat.cache import cache_dir
+            cache_path = cache_dir() / "skills.json"
+        self.cache_path = Path(cache_path) if cache_path is not False else None
+        self._entries: dict[str, SkillEntry] = {}
+        self._instances: dict[str, Skill] = {}
+        self._proxies: dict[str, LazySkill] = {}
+        self._specs: list[dict[str, Any]] | None = None
+        self._cache = self._load_cache()
+        self._cache_dirty = False
+
+        targets = dict(BUILTIN_SKILLS) if builtins else {}
+        if discover_entry_points:
+            targets.update((ep.name, ep.value) for ep in entry_points(group=ENTRY_POINT_GROUP))
+        for target in targets.values():
+            self.register(target)
+        for skill_cls in DECLARED_SKILLS.values():
+            self.register(skill_cls)
+        self._save_cache()
+
+    # ---------- 登记 ----------
+
+    def register(self, skill: type[Skill] | str) -> SkillEntry:
+        """登记技能类或 "模块:类名" 目标（后者优先使用描述缓存，不导入模块）"""
+        if isinstance(skill, str):
+            entry = self._entry_for_target(skill)
+        else:
+            entry = SkillEntry.from_class(skill)
+        if entry.name in self._entries and self._entries[entry.name].target != entry.target:
+            log.warning(f"技能名称重复，后登记者生效 | {entry.name}")
+        self._entries[entry.name] = entry
+        self._instances.pop(entry.name, None)
+        self._proxies.pop(entry.name, None)
+        self._specs = None
+        return entry
+
+    def _entry_for_target(self, target: str) -> SkillEntry:
+        fp = fingerprint(target)
+        cached = self._cache.get(target)
+        if fp is not None and cached and cached.get("fingerprint") == fp:
+            return SkillEntry(target=target, **{k: cached[k] for k in ("name", "spec", "read_only", "cpu_bound", "timeout")})
+        entry = SkillEntry.from_class(load_target(target), target)
+        if fp is not None:
+            self._cache[target] = {**entry.to_cache(), "fingerprint": fp}
+            self._cache_dirty = True
+        return entry
+
+    # ---------- 描述缓存 ----------
+
+    def _load_cache(self) -> dict[str, dict[str, Any]]:
+        if self.cache_path is None or not self.cache_path.exists():
+            return {}
+        try:
+            return json.loads(self.cache_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self):
+        if self.cache_path is None or not self._cache_dirty:
+            return
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+            tmp.write_text(json.dumps(self._cache, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(self.cache_path)
+            self._cache_dirty = False
+        except OSError as e:
+            log.warning(f"技能描述缓存写入失败 | {e}")
+
+    # ---------- Toolbox 协议 ----------
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def names(self) -> list[str]:
+        return list(self._entries)
+
+    def specs(self, names: Iterable[str] | None = None) -> list[dict[str, Any]]:
+        """全部（或指定名称的）工具描述；全量列表只构建一次"""
+        if names is not None:
+            return [self._entries[n].spec for n in names if n in self._entries]
+        if self._specs is None:
+            self._specs = [entry.spec for entry in self._entries.values()]
+        return self._specs
+
+    def lookup(self, name: str) -> LazySkill | None:
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        proxy = self._proxies.get(name)
+        if proxy is None:
+            proxy = self._proxies[name] = LazySkill(entry, self)
+        return proxy
+
+    def load(self, name: str) -> Skill:
+        """导入并实例化技能（每个注册中心内只实例化一次）"""
+        skill = self._instances.get(name)
+        if skill is None:
+            entry = self._entries[name]
+            if entry.cls is None:
+                entry.cls = load_target(entry.target)
+            skill = self._instances[name] = entry.cls(self.context)
+        return skill
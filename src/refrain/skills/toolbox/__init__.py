@@ -1 +1 @@
-# 工具箱模块
+# 工具箱模块（技能由注册中心按 "模块:类名" 惰性导入，此处不做预先导入）
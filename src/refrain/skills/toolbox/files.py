@@ -0,0 +1,109 @@
+"""
+文件技能 - 供编排器读取与修改项目文件
+
+所有路径都相对工作区根目录（SkillContext.root）解析，越界访问直接拒绝。
+读取时记录文件版本，修改时以该版本做乐观并发校验：文件在模型读取之后被其他会话或用户改动，
+修改会被拒绝并提示重新读取，而不是覆盖他人的改动。写入均为加锁的原子写入。
+SkillContext.transaction 非空时修改只暂存到事务（读取会看到暂存的内容），由调用方确认后统一提交，
+提交时再按模型首次修改前读到的磁盘版本做并发校验。
+"""
+from pathlib import Path
+
+from refrain.utils.fs import FileConflictError, content_hash, read_versioned, walk_files, write_file
+from ..base import Skill
+
+
+class FileSkill(Skill):
+    """文件技能的公共基类：提供受限于工作区的路径解析"""
+
+    def resolve(self, path: str) -> Path:
+        root = self.context.root
+        target = (root / path).resolve()
+        if target != root and root not in target.parents:
+            raise PermissionError(f"路径超出项目目录: {path}")
+        return target
+
+    def load(self, target: Path) -> tuple[str, str]:
+        """读取 (内容, 版本)，优先返回事务中暂存的内容"""
+        tx = self.context.transaction
+        staged = tx.pending(target) if tx is not None else None
+        if staged is not None and staged[0] is not None:
+            return staged[0].decode(tx.encoding), content_hash(staged[0])
+        return read_versioned(target)
+
+    def read(self, target: Path) -> tuple[str, str]:
+        """读取并记录版本"""
+        text, version = self.load(target)
+        self.context.file_versions[str(target)] = version
+        return text, version
+
+    def write(self, target: Path, content: str, expected: str | None):
+        tx = self.context.transaction
+        if tx is not None:
+            staged = tx.pending(target)
+            # 同一文件多次修改时沿用首次暂存时的磁盘版本，提交时据此校验
+            tx.write(target, content, staged[1] if staged is not None else expected)
+            self.context.file_versions[str(target)] = content_hash(content.encode(tx.encoding))
+            return
+        try:
+            version = write_file(target, content, expected_hash=expected)
+        except FileConflictError:
+            self.context.file_versions.pop(str(target), None)  # 需要重新读取
+            raise
+        self.context.file_versions[str(target)] = version
+
+    def expected_version(self, target: Path, current: str | None = None) -> str | None:
+        """模型上次读到的版本；与当前版本不一致时拒绝修改"""
+        seen = self.context.file_versions.get(str(target))
+        if seen is not None and current is not None and seen != current:
+            self.context.file_versions.pop(str(target), None)
+            raise FileConflictError(target, seen, current)
+        return seen
+
+
+class ReadFile(FileSkill):
+    """读取文件内容（带行号）。end_line 为 0 表示读到文件末尾"""
+    read_only = True
+
+    def execute(self, path: str, start_line: int = 1, end_line: int = 0) -> str:
+        text, _ = self.read(self.resolve(path))
+        lines = text.splitlines()
+        end = end_line or len(lines)
+        return "\n".join(f"{i:>5}| {line}" for i, line in enumerate(lines[start_line - 1:end], start_line))
+
+
+class ListFiles(FileSkill):
+    """列出目录下未被 .gitignore 忽略的文件"""
+    read_only = True
+
+    def execute(self, path: str = ".", limit: int = 500) -> str:
+        files = []
+        for rel, _ in walk_files(self.resolve(path)):
+            files.append(rel)
+            if len(files) >= limit:
+                files.append(f"...（仅显示前 {limit} 个）")
+                break
+        return "\n".join(files)
+
+
+class ReplaceInFile(FileSkill):
+    """将文件中唯一出现的 old 片段替换为 new（old 需包含足够上下文以唯一定位）"""
+
+    def execute(self, path: str, old: str, new: str) -> str:
+        target = self.resolve(path)
+        content, version = self.load(target)
+        self.expected_version(target, version)
+        count = content.count(old)
+        if count != 1:
+            raise ValueError(f"old 片段在文件中出现 {count} 次，需要恰好 1 次")
+        self.write(target, content.replace(old, new, 1), version)
+        return f"已修改 {path}"
+
+
+class WriteFile(FileSkill):
+    """写入整个文件（不存在时创建）"""
+
+    def execute(self, path: str, content: str) -> str:
+        target = self.resolve(path)
+        self.write(target, content, self.expected_version(target))
+        return f"已写入 {path}（{len(content)} 字符）"
@@ -0,0 +1,225 @@
+"""
+代码搜索技能 - 正则搜索（grep）与文件查找（glob）
+
+- 遍历：walk_parallel 以线程池并行 scandir，目录扫描与该目录下文件的搜索在同一个任务中完成
+- 过滤：.gitignore 与默认忽略目录整棵剪枝；文件头 8KB 含 NUL 视为二进制跳过
+- 读取：小文件一次性读入，大文件使用 mmap，由 re 直接在映射上匹配，不复制整个文件
+- 模式按 (pattern, 选项) 预编译并缓存；总匹配数超过上限后停止调度新目录（恰好达到上限不算截断）
+- 结果按文件聚合并排序（定义行命中优先，测试文件靠后），排序后再按上限截取，以紧凑文本返回给模型
+"""
+import functools
+import mmap
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from refrain.utils.fs import parse_rule, walk_parallel
+from ..base import Skill
+
+BINARY_SNIFF_BYTES = 8192
+MAX_LINE_CHARS = 200
+_DEFINITION = re.compile(rb"^\s*(?:async\s+def|def|class)\s")
+
+
+@dataclass
+class FileMatches:
+    """单个文件中的匹配行"""
+    path: str
+    lines: list[tuple[int, str]] = field(default_factory=list)
+    definitions: int = 0
+
+    @property
+    def score(self) -> float:
+        score = len(self.lines) + 5 * self.definitions
+        parts = self.path.split("/")
+        if any(p.startswith("test") or p == "tests" for p in parts):
+            score *= 0.5
+        return score - 0.1 * len(parts)
+
+
+@functools.lru_cache(maxsize=128)
+def compile_pattern(pattern: str, ignore_case: bool = False, fixed_strings: bool = False) -> re.Pattern[bytes]:
+    """预编译搜索模式（在字节上匹配，避免逐文件解码）"""
+    source = re.escape(pattern) if fixed_strings else pattern
+    return re.compile(source.encode("utf-8"), re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+
+
+@functools.lru_cache(maxsize=64)
+def compile_glob(glob: str):
+    """glob 使用 gitignore 语法：不含 / 时匹配任意层级的文件名，含 / 时相对根目录锚定"""
+    rule = parse_rule(glob)
+    if rule is None:
+        raise ValueError(f"无效的 glob 模式: {glob!r}")
+    return rule
+
+
+def _count_newlines(buf, start: int, end: int) -> int:
+    if isinstance(buf, bytes):
+        return buf.count(b"\n", start, end)
+    return buf[start:end].count(b"\n")  # mmap 没有 count，按段复制计数
+
+
+def search_file(
+    path: Path | str,
+    pattern: re.Pattern[bytes],
+    max_matches: int = 20,
+    mmap_threshold: int = 1 << 20,
+) -> FileMatches | None:
+    """在单个文件中搜索，每行最多记录一次；二进制文件、无匹配或不可读时返回 None"""
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return None
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size >= mmap_threshold else f.read()
+    except (OSError, ValueError):
+        return None
+    try:
+        if b"\0" in buf[:BINARY_SNIFF_BYTES]:
+            return None
+        result = FileMatches(str(path))
+        pos, line_no, counted = 0, 1, 0
+        while len(result.lines) < max_matches and pos <= len(buf):
+            m = pattern.search(buf, pos)
+            if m is None:
+                break
+            line_start = buf.rfind(b"\n", 0, m.start()) + 1
+            line_end = buf.find(b"\n", m.start())
+            if line_end < 0:
+                line_end = len(buf)
+            line_no += _count_newlines(buf, counted, line_start)
+            counted = line_start
+            raw = buf[line_start:line_end]
+            if _DEFINITION.match(raw):
+                result.definitions += 1
+            text = raw.decode("utf-8", errors="replace").rstrip("\r").strip()
+            result.lines.append((line_no, text[:MAX_LINE_CHARS]))
+            pos = line_end + 1
+        return result if result.lines else None
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+
+
+class CodeSearcher:
+    """
+    并行代码搜索器。
+    workers：目录扫描线程数；max_file_size：超过该大小的文件跳过（字节）。
+    """
+
+    def __init__(self, root: Path | str, workers: int = 8, max_file_size: int = 50 << 20, mmap_threshold: int = 1 << 20):
+        self.root = Path(root)
+        self.workers = workers
+        self.max_file_size = max_file_size
+        self.mmap_threshold = mmap_threshold
+
+    def grep(
+        self,
+        pattern: str,
+        glob: str | None = None,
+        ignore_case: bool = False,
+        fixed_strings: bool = False,
+        max_results: int = 100,
+        max_per_file: int = 20,
+    ) -> tuple[list[FileMatches], bool]:
+        """返回 (按相关度排序的文件匹配, 是否因超过上限而截断)"""
+        regex = compile_pattern(pattern, ignore_case, fixed_strings)
+        rule = compile_glob(glob) if glob else None
+        stop = threading.Event()
+
+        def visit(files):
+            found = []
+            for rel, st in files:
+                if stop.is_set():
+                    break
+                if st.st_size > self.max_file_size or (rule is not None and not rule.matches(rel, False)):
+                    continue
+                matches = search_file(self.root / rel, regex, max_per_file, self.mmap_threshold)
+                if matches is not None:
+                    matches.path = rel
+                    found.append(matches)
+            return found
+
+        results: list[FileMatches] = []
+        total = 0
+        walker = walk_parallel(self.root, visit, self.workers)
+        try:
+            for found in walker:
+                results.extend(found)
+                total += sum(len(m.lines) for m in found)
+                if total > max_results:
+                    stop.set()
+                    break
+        finally:
+            walker.close()
+        results.sort(key=lambda m: (-m.score, m.path))
+        return _take_lines(results, max_results), stop.is_set()
+
+    def find(self, glob: str, limit: int = 200) -> tuple[list[str], bool]:
+        """
+        按 glob 查找文件，返回 (排序后的相对路径, 是否截断)。
+        只匹配路径、不读文件，因此总是遍历完整棵树：并行遍历的完成顺序不固定，
+        提前停止会得到随机的子集，完整遍历后截取才能保证相同调用返回相同结果。
+        """
+        rule = compile_glob(glob)
+        paths: list[str] = []
+        for found in walk_parallel(self.root, lambda files: [rel for rel, _ in files if rule.matches(rel, False)],
+                                   self.workers):
+            paths.extend(found)
+        return sorted(paths)[:limit], len(paths) > limit
+
+
+def _take_lines(results: list[FileMatches], limit: int) -> list[FileMatches]:
+    """按排序后的顺序截取至多 limit 行匹配（最后一个文件可能只保留部分行）"""
+    taken, remaining = [], limit
+    for m in results:
+        if remaining <= 0:
+            break
+        if len(m.lines) > remaining:
+            m.lines = m.lines[:remaining]
+        taken.append(m)
+        remaining -= len(m.lines)
+    return taken
+
+
+def format_matches(results: list[FileMatches], truncated: bool) -> str:
+    """紧凑文本：每个文件一行路径，其下为 `行号: 内容`"""
+    if not results:
+        return "无匹配"
+    total = sum(len(m.lines) for m in results)
+    lines = [f"{total} 处匹配，{len(results)} 个文件" + ("（已达上限，结果不完整）" if truncated else "")]
+    for m in results:
+        lines.append(m.path)
+        lines.extend(f"  {no}: {text}" for no, text in m.lines)
+    return "\n".join(lines)
+
+
+class SearchCode(Skill):
+    """在项目中按正则搜索代码（跳过二进制与被忽略的文件），返回按相关度排序的匹配行。glob 可限定文件范围，如 *.py"""
+    read_only = True
+
+    def execute(
+        self,
+        pattern: str,
+        glob: str = "",
+        ignore_case: bool = False,
+        fixed_strings: bool = False,
+        max_results: int = 100,
+    ) -> str:
+        results, truncated = CodeSearcher(self.context.root).grep(
+            pattern, glob or None, ignore_case, fixed_strings, max_results
+        )
+        return format_matches(results, truncated)
+
+
+class FindFiles(Skill):
+    """按 glob 查找文件（gitignore 语法：*.py 匹配任意层级，src/**/test_*.py 相对项目根）"""
+    read_only = True
+
+    def execute(self, pattern: str, limit: int = 200) -> str:
+        paths, truncated = CodeSearcher(self.context.root).find(pattern, limit)
+        if not paths:
+            return "无匹配文件"
+        return "\n".join(paths) + (f"\n...（仅显示前 {limit} 个）" if truncated else "")
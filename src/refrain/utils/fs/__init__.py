@@ -1 +1,21 @@
 # 文件系统操作模块
+from .ignore import DEFAULT_IGNORES, IgnoreRules, parse_rule, walk_files, walk_parallel
+from .lock import FileLock, LockTimeoutError
+from .ops import (
+    ABSENT,
+    FileConflictError,
+    FileTransaction,
+    atomic_write,
+    content_hash,
+    file_hash,
+    read_file,
+    read_versioned,
+    write_file,
+)
+
+__all__ = [
+    "DEFAULT_IGNORES", "IgnoreRules", "parse_rule", "walk_files", "walk_parallel",
+    "FileLock", "LockTimeoutError",
+    "ABSENT", "FileConflictError", "FileTransaction", "atomic_write", "content_hash", "file_hash",
+    "read_file", "read_versioned", "write_file",
+]
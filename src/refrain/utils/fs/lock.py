@@ -0,0 +1,100 @@
+"""
+文件锁 - 跨进程的按文件建议锁
+
+- 每个目标文件对应 ~/.refrain/locks/ 下的一个锁文件（按绝对路径哈希命名），不在工作区中留下杂项
+- 锁粒度为单个文件：多个会话修改不同文件时互不阻塞
+- POSIX 使用 fcntl.flock，Windows 使用 msvcrt.locking；非阻塞尝试 + 退避轮询，超时抛出 LockTimeoutError
+- 锁与打开的文件描述一一对应，同一进程内的不同线程同样互斥
+"""
+import hashlib
+import os
+import time
+from pathlib import Path
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+class LockTimeoutError(TimeoutError):
+    """在超时时间内未能获得文件锁"""
+
+
+def lock_dir() -> Path:
+    from refrain.core.config import ConfigManager
+    return ConfigManager.CONFIG_DIR / "locks"
+
+
+def lock_path_for(target: Path | str, directory: Path | None = None) -> Path:
+    key = hashlib.sha1(str(Path(target).resolve()).encode("utf-8")).hexdigest()
+    return (directory or lock_dir()) / f"{key}.lock"
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        if os.name == "nt":
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd: int):
+    if os.name == "nt":
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class FileLock:
+    """
+    单个文件的排他建议锁，可作为上下文管理器使用：
+        with FileLock(path, timeout=10):
+            ...
+    timeout 为 None 时无限等待；lock_directory 默认 ~/.refrain/locks。
+    """
+
+    def __init__(self, target: Path | str, timeout: float | None = 30.0, lock_directory: Path | None = None):
+        self.target = Path(target)
+        self.timeout = timeout
+        self.path = lock_path_for(target, lock_directory)
+        self._fd: int | None = None
+
+    @property
+    def locked(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self) -> "FileLock":
+        if self._fd is not None:
+            raise RuntimeError(f"文件锁不可重入: {self.target}")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        delay = 0.001
+        while not _try_lock(fd):
+            if deadline is not None and time.monotonic() >= deadline:
+                os.close(fd)
+                raise LockTimeoutError(f"等待文件锁超时 ({self.timeout}s): {self.target}")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        self._fd = fd
+        return self
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            _unlock(self._fd)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> "FileLock":
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
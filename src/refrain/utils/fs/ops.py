@@ -0,0 +1,197 @@
+"""
+安全文件操作 - 原子写入、乐观并发与多文件事务
+
+- 原子写入：同目录临时文件 → 写入 → fsync → os.replace → fsync 目录，读者只会看到旧内容或新内容
+- 乐观并发：读取时得到内容哈希（版本），写入时携带 expected_hash，文件在此期间被他人修改则拒绝写入
+- 写入时持有目标文件的建议锁（见 lock.py），校验与替换之间不会被其他会话插入
+- 多文件事务：按固定顺序加锁（避免死锁）、先全部校验再依次写入，任一步失败按逆序回滚
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from .lock import FileLock
+
+# 表示"文件不存在"的版本号：expected_hash=ABSENT 要求目标文件尚未创建
+ABSENT = "absent"
+
+
+class FileConflictError(RuntimeError):
+    """文件在读取之后被修改，拒绝覆盖"""
+
+    def __init__(self, path: Path | str, expected: str, actual: str):
+        super().__init__(f"文件已被修改: {path}（期望版本 {expected[:12]}，实际 {actual[:12]}）")
+        self.path = Path(path)
+        self.expected = expected
+        self.actual = actual
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path: Path | str) -> str:
+    """文件当前版本（内容 SHA-256），不存在时返回 ABSENT"""
+    try:
+        return content_hash(Path(path).read_bytes())
+    except FileNotFoundError:
+        return ABSENT
+
+
+def read_file(path: Path | str, encoding: str = "utf-8") -> str:
+    """读取文本（保留原始换行符）"""
+    return Path(path).read_bytes().decode(encoding)
+
+
+def read_versioned(path: Path | str, encoding: str = "utf-8") -> tuple[str, str]:
+    """读取文本并返回 (内容, 版本)，版本可作为之后写入的 expected_hash"""
+    data = Path(path).read_bytes()
+    return data.decode(encoding), content_hash(data)
+
+
+def _fsync_dir(directory: Path):
+    if os.name == "nt":
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: Path | str, data: str | bytes, encoding: str = "utf-8", fsync: bool = True) -> str:
+    """原子替换文件内容（保留原有权限位），返回新版本"""
+    path = Path(path)
+    if isinstance(data, str):
+        data = data.encode(encoding)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        try:
+            os.chmod(tmp, path.stat().st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    if fsync:
+        _fsync_dir(path.parent)
+    return content_hash(data)
+
+
+def _check_version(path: Path, expected_hash: str | None) -> str:
+    actual = file_hash(path)
+    if expected_hash is not None and actual != expected_hash:
+        raise FileConflictError(path, expected_hash, actual)
+    return actual
+
+
+def write_file(
+    path: Path | str,
+    content: str | bytes,
+    expected_hash: str | None = None,
+    encoding: str = "utf-8",
+    timeout: float | None = 30.0,
+) -> str:
+    """
+    加锁后原子写入，返回新版本。
+    expected_hash：期望的当前版本（read_versioned 的返回值或 ABSENT），不一致时抛出 FileConflictError；None 表示不校验。
+    """
+    path = Path(path)
+    with FileLock(path, timeout):
+        _check_version(path, expected_hash)
+        return atomic_write(path, content, encoding)
+
+
+class FileTransaction:
+    """
+    多文件事务：
+        with FileTransaction() as tx:
+            tx.write("a.py", new_a, expected_hash=ver_a)
+            tx.delete("old.py")
+    正常退出 with 时提交，块内抛出异常时放弃；提交失败时已写入的文件恢复原状并重新抛出异常。
+    """
+
+    def __init__(self, timeout: float | None = 30.0, encoding: str = "utf-8"):
+        self.timeout = timeout
+        self.encoding = encoding
+        self._ops: dict[Path, tuple[bytes | None, str | None]] = {}  # 路径 -> (新内容，None 表示删除; 期望版本)
+        self.committed = False
+
+    def write(self, path: Path | str, content: str | bytes, expected_hash: str | None = None):
+        if isinstance(content, str):
+            content = content.encode(self.encoding)
+        self._ops[Path(path).resolve()] = (content, expected_hash)
+
+    def delete(self, path: Path | str, expected_hash: str | None = None):
+        self._ops[Path(path).resolve()] = (None, expected_hash)
+
+    def pending(self, path: Path | str) -> tuple[bytes | None, str | None] | None:
+        """已暂存的操作 (新内容，None 表示删除; 期望版本)；未暂存时返回 None"""
+        return self._ops.get(Path(path).resolve())
+
+    @property
+    def paths(self) -> list[Path]:
+        return list(self._ops)
+
+    def commit(self) -> dict[Path, str]:
+        """提交全部操作，返回各文件的新版本（删除的文件为 ABSENT）"""
+        if self.committed:
+            raise RuntimeError("事务已提交")
+        locks = [FileLock(p, self.timeout) for p in self._ops]
+        locks.sort(key=lambda lock: str(lock.path))  # 固定加锁顺序，多个事务之间不会死锁
+        try:
+            for lock in locks:
+                lock.acquire()
+            for path, (_, expected) in self._ops.items():
+                _check_version(path, expected)
+            versions = self._apply()
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        self.committed = True
+        return versions
+
+    def _apply(self) -> dict[Path, str]:
+        applied: list[tuple[Path, bytes | None]] = []
+        versions: dict[Path, str] = {}
+        try:
+            for path, (content, _) in self._ops.items():
+                original = path.read_bytes() if path.exists() else None
+                if content is None:
+                    if original is not None:
+                        path.unlink()
+                    versions[path] = ABSENT
+                else:
+                    versions[path] = atomic_write(path, content)
+                applied.append((path, original))
+        except BaseException:
+            for path, original in reversed(applied):
+                if original is None:
+                    path.unlink(missing_ok=True)
+                else:
+                    atomic_write(path, original)
+            raise
+        return versions
+
+    def __enter__(self) -> "FileTransaction":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
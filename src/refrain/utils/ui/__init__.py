@@ -1 +1,7 @@
 # UI 渲染模块
+from .stream_render import StreamRenderer, MarkdownBlockSplitter
+from .diff import FileDiff, diff_opcodes, group_hunks
+from .prompt import AsyncPrompt, cancel_on_interrupt
+
+__all__ = ["StreamRenderer", "MarkdownBlockSplitter", "FileDiff", "diff_opcodes", "group_hunks",
+           "AsyncPrompt", "cancel_on_interrupt"]
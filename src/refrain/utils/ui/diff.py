@@ -0,0 +1,356 @@
+"""
+差异引擎与渲染 - 面向大文件的行级 diff
+
+- 行先映射为整数 ID，比较只做整数相等判断
+- 每个区间先裁掉公共前后缀（生成文件的局部修改通常只剩很小的中间段）
+- 再以双方都只出现一次的行为锚点（patience diff），锚点序列取最长递增子序列，区间被切成若干小段
+- 无锚点的小段用线性空间的 Myers 算法（中间蛇分治）求最短编辑脚本；
+  编辑距离超过 max_cost 时该段直接视为整体替换，避免病态输入退化为平方级耗时
+- 行内高亮只对被渲染的替换块逐行做词元级 diff，渲染按块惰性生成并可分页
+"""
+import re
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Hashable, Iterator, Sequence
+
+from rich.console import Console, Group
+from rich.text import Text
+
+Opcode = tuple[str, int, int, int, int]  # 与 difflib.SequenceMatcher.get_opcodes 相同的格式
+
+_TOKEN = re.compile(r"\w+|\s+|[^\w\s]")
+
+
+# ============ 算法 ============
+
+def _intern(a: Sequence[Hashable], b: Sequence[Hashable]) -> tuple[list[int], list[int]]:
+    ids: dict[Hashable, int] = {}
+    return [ids.setdefault(x, len(ids)) for x in a], [ids.setdefault(x, len(ids)) for x in b]
+
+
+class _Differ:
+    def __init__(self, a: list[int], b: list[int], max_cost: int):
+        self.a = a
+        self.b = b
+        self.max_cost = max_cost
+        self.matches: list[tuple[int, int, int]] = []  # (i, j, 长度)，按位置递增
+
+    def run(self, alo: int, ahi: int, blo: int, bhi: int):
+        a, b = self.a, self.b
+        # 公共前缀
+        start = alo
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            alo += 1
+            blo += 1
+        prefix = alo - start
+        # 公共后缀
+        end = ahi
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+        suffix = end - ahi
+
+        if prefix:
+            self.matches.append((alo - prefix, blo - prefix, prefix))
+        if alo < ahi and blo < bhi:
+            anchors = self._anchors(alo, ahi, blo, bhi)
+            if anchors:
+                i, j = alo, blo
+                for ai, bj in anchors:
+                    self.run(i, ai, j, bj)
+                    self.matches.append((ai, bj, 1))
+                    i, j = ai + 1, bj + 1
+                self.run(i, ahi, j, bhi)
+            else:
+                self._myers(alo, ahi, blo, bhi)
+        if suffix:
+            self.matches.append((ahi, bhi, suffix))
+
+    def _anchors(self, alo: int, ahi: int, blo: int, bhi: int) -> list[tuple[int, int]]:
+        """双方各只出现一次的行，按 a 中顺序取 b 下标的最长递增子序列"""
+        count_a: dict[int, int] = {}
+        for x in self.a[alo:ahi]:
+            count_a[x] = count_a.get(x, 0) + 1
+        pos_b: dict[int, int] = {}
+        count_b: dict[int, int] = {}
+        for j in range(blo, bhi):
+            x = self.b[j]
+            count_b[x] = count_b.get(x, 0) + 1
+            pos_b[x] = j
+        pairs = [
+            (i, pos_b[x]) for i in range(alo, ahi)
+            if count_a[x := self.a[i]] == 1 and count_b.get(x) == 1
+        ]
+        if not pairs:
+            return []
+        # 耐心排序求 LIS
+        tails: list[int] = []
+        tail_idx: list[int] = []
+        prev = [-1] * len(pairs)
+        for n, (_, j) in enumerate(pairs):
+            k = bisect_left(tails, j)
+            if k == len(tails):
+                tails.append(j)
+                tail_idx.append(n)
+            else:
+                tails[k] = j
+                tail_idx[k] = n
+            prev[n] = tail_idx[k - 1] if k else -1
+        result = []
+        n = tail_idx[-1]
+        while n >= 0:
+            result.append(pairs[n])
+            n = prev[n]
+        return result[::-1]
+
+    def _myers(self, alo: int, ahi: int, blo: int, bhi: int):
+        """线性空间 Myers：找到中间蛇后对两侧递归"""
+        if alo >= ahi or blo >= bhi:
+            return
+        snake = self._middle_snake(alo, ahi, blo, bhi)
+        if snake is None:
+            return  # 超出代价上限：整段视为替换
+        x0, y0, x1, y1 = snake
+        self.run(alo, x0, blo, y0)
+        if x1 > x0:
+            self.matches.append((x0, y0, x1 - x0))
+        self.run(x1, ahi, y1, bhi)
+
+    def _middle_snake(self, alo: int, ahi: int, blo: int, bhi: int) -> tuple[int, int, int, int] | None:
+        a, b = self.a, self.b
+        n, m = ahi - alo, bhi - blo
+        delta = n - m
+        odd = delta & 1
+        max_d = min((n + m + 1) // 2, self.max_cost)
+        offset = max_d + 1
+        vf = [0] * (2 * offset + 1)
+        vb = [0] * (2 * offset + 1)
+        for d in range(max_d + 1):
+            # 正向
+            for k in range(-d, d + 1, 2):
+                if k == -d or (k != d and vf[offset + k - 1] < vf[offset + k + 1]):
+                    x = vf[offset + k + 1]
+                else:
+                    x = vf[offset + k - 1] + 1
+                y = x - k
+                x0, y0 = x, y
+                while x < n and y < m and a[alo + x] == b[blo + y]:
+                    x += 1
+                    y += 1
+                vf[offset + k] = x
+                kr = delta - k
+                if odd and -(d - 1) <= kr <= d - 1 and x + vb[offset + kr] >= n:
+                    return alo + x0, blo + y0, alo + x, blo + y
+            # 反向（在倒序坐标上前进）
+            for kr in range(-d, d + 1, 2):
+                if kr == -d or (kr != d and vb[offset + kr - 1] < vb[offset + kr + 1]):
+                    x = vb[offset + kr + 1]
+                else:
+                    x = vb[offset + kr - 1] + 1
+                y = x - kr
+                x0, y0 = x, y
+                while x < n and y < m and a[ahi - 1 - x] == b[bhi - 1 - y]:
+                    x += 1
+                    y += 1
+                vb[offset + kr] = x
+                k = delta - kr
+                if not odd and -d <= k <= d and x + vf[offset + k] >= n:
+                    return ahi - x, bhi - y, ahi - x0, bhi - y0
+        return None
+
+
+def diff_opcodes(a: Sequence[Hashable], b: Sequence[Hashable], max_cost: int = 512) -> list[Opcode]:
+    """计算 a → b 的编辑操作，返回 difflib 风格的 opcode 列表"""
+    ia, ib = _intern(a, b)
+    differ = _Differ(ia, ib, max_cost)
+    differ.run(0, len(ia), 0, len(ib))
+    matches = sorted(differ.matches)
+
+    opcodes: list[Opcode] = []
+    i = j = 0
+    for mi, mj, size in [*matches, (len(ia), len(ib), 0)]:
+        if i < mi and j < mj:
+            opcodes.append(("replace", i, mi, j, mj))
+        elif i < mi:
+            opcodes.append(("delete", i, mi, j, j))
+        elif j < mj:
+            opcodes.append(("insert", i, i, j, mj))
+        if size:
+            if opcodes and opcodes[-1][0] == "equal":
+                _, i1, _, j1, _ = opcodes.pop()
+                opcodes.append(("equal", i1, mi + size, j1, mj + size))
+            else:
+                opcodes.append(("equal", mi, mi + size, mj, mj + size))
+        i, j = mi + size, mj + size
+    return opcodes
+
+
+def group_hunks(opcodes: list[Opcode], context: int = 3) -> list[list[Opcode]]:
+    """按上下文行数将 opcode 分组为差异块（与 difflib.get_grouped_opcodes 一致）"""
+    if not opcodes or (len(opcodes) == 1 and opcodes[0][0] == "equal"):
+        return []
+    codes = list(opcodes)
+    tag, i1, i2, j1, j2 = codes[0]
+    if tag == "equal":
+        codes[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    tag, i1, i2, j1, j2 = codes[-1]
+    if tag == "equal":
+        codes[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+    hunks, group = [], []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, i1 + context, j1, j1 + context))
+            hunks.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        hunks.append(group)
+    return hunks
+
+
+def tokenize_line(line: str) -> list[str]:
+    return _TOKEN.findall(line)
+
+
+def inline_changes(old: str, new: str) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+    """词元级行内 diff，返回两行中被修改部分的字符区间"""
+    ta, tb = tokenize_line(old), tokenize_line(new)
+    pa = [0]
+    for t in ta:
+        pa.append(pa[-1] + len(t))
+    pb = [0]
+    for t in tb:
+        pb.append(pb[-1] + len(t))
+    spans_a, spans_b = [], []
+    for tag, i1, i2, j1, j2 in diff_opcodes(ta, tb, max_cost=256):
+        if tag == "equal":
+            continue
+        if i2 > i1:
+            spans_a.append((pa[i1], pa[i2]))
+        if j2 > j1:
+            spans_b.append((pb[j1], pb[j2]))
+    return spans_a, spans_b
+
+
+# ============ 渲染 ============
+
+@dataclass
+class Hunk:
+    opcodes: list[Opcode]
+
+    @property
+    def old_range(self) -> tuple[int, int]:
+        return self.opcodes[0][1], self.opcodes[-1][2]
+
+    @property
+    def new_range(self) -> tuple[int, int]:
+        return self.opcodes[0][3], self.opcodes[-1][4]
+
+    @property
+    def header(self) -> str:
+        (a1, a2), (b1, b2) = self.old_range, self.new_range
+        return f"@@ -{a1 + 1},{a2 - a1} +{b1 + 1},{b2 - b1} @@"
+
+    @property
+    def line_count(self) -> int:
+        """渲染后的行数（含块头）"""
+        return 1 + sum(
+            (i2 - i1) if tag == "equal" else (i2 - i1) + (j2 - j1)
+            for tag, i1, i2, j1, j2 in self.opcodes
+        )
+
+
+class FileDiff:
+    """
+    单个文件的差异：opcode 在构造时一次算出，每个块的渲染（含行内高亮）按需进行。
+        diff = FileDiff(old_text, new_text, "a.py")
+        diff.print(console, page=0, page_lines=80)
+    """
+
+    def __init__(self, old: str, new: str, path: str = "", context: int = 3, max_cost: int = 512):
+        self.path = path
+        self.old_lines = old.splitlines()
+        self.new_lines = new.splitlines()
+        self.opcodes = diff_opcodes(self.old_lines, self.new_lines, max_cost)
+        self.hunks = [Hunk(g) for g in group_hunks(self.opcodes, context)]
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.hunks)
+
+    @property
+    def stats(self) -> tuple[int, int]:
+        """(新增行数, 删除行数)"""
+        added = sum(j2 - j1 for tag, _, _, j1, j2 in self.opcodes if tag in ("insert", "replace"))
+        removed = sum(i2 - i1 for tag, i1, i2, _, _ in self.opcodes if tag in ("delete", "replace"))
+        return added, removed
+
+    def unified(self) -> str:
+        """纯文本统一 diff（无文件头）"""
+        out = []
+        for hunk in self.hunks:
+            out.append(hunk.header)
+            for tag, i1, i2, j1, j2 in hunk.opcodes:
+                if tag == "equal":
+                    out.extend(" " + line for line in self.old_lines[i1:i2])
+                    continue
+                out.extend("-" + line for line in self.old_lines[i1:i2])
+                out.extend("+" + line for line in self.new_lines[j1:j2])
+        return "\n".join(out)
+
+    def render_hunk(self, hunk: Hunk) -> Text:
+        text = Text()
+        text.append(hunk.header + "\n", style="cyan")
+        for tag, i1, i2, j1, j2 in hunk.opcodes:
+            if tag == "equal":
+                for line in self.old_lines[i1:i2]:
+                    text.append(f" {line}\n", style="dim")
+                continue
+            old = self.old_lines[i1:i2]
+            new = self.new_lines[j1:j2]
+            pairs = min(len(old), len(new)) if tag == "replace" else 0
+            spans = [inline_changes(old[n], new[n]) for n in range(pairs)]
+            for n, line in enumerate(old):
+                self._append_line(text, "-", line, "red", spans[n][0] if n < pairs else None)
+            for n, line in enumerate(new):
+                self._append_line(text, "+", line, "green", spans[n][1] if n < pairs else None)
+        text.rstrip()
+        return text
+
+    @staticmethod
+    def _append_line(text: Text, sign: str, line: str, color: str, spans: list[tuple[int, int]] | None):
+        start = len(text)
+        text.append(f"{sign}{line}\n", style=color)
+        for s, e in spans or ():
+            text.stylize(f"bold {color} reverse", start + 1 + s, start + 1 + e)
+
+    def iter_renderables(self) -> Iterator[Text]:
+        for hunk in self.hunks:
+            yield self.render_hunk(hunk)
+
+    def pages(self, page_lines: int = 80) -> list[list[Hunk]]:
+        """按行数预算分页（单个超长块独占一页）"""
+        pages, current, used = [], [], 0
+        for hunk in self.hunks:
+            if current and used + hunk.line_count > page_lines:
+                pages.append(current)
+                current, used = [], 0
+            current.append(hunk)
+            used += hunk.line_count
+        if current:
+            pages.append(current)
+        return pages
+
+    def summary(self) -> Text:
+        added, removed = self.stats
+        text = Text.assemble((self.path or "(未命名)", "bold"), "  ", (f"+{added}", "green"), " ", (f"-{removed}", "red"))
+        return text
+
+    def print(self, console: Console, page: int | None = None, page_lines: int = 80):
+        """打印摘要与差异块；指定 page 时只渲染该页"""
+        console.print(self.summary())
+        if not self.hunks:
+            return
+        hunks = self.hunks if page is None else self.pages(page_lines)[page]
+        console.print(Group(*(self.render_hunk(h) for h in hunks)))
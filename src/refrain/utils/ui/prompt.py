@@ -0,0 +1,102 @@
+"""
+异步交互 - 不阻塞事件循环的输入与 Ctrl-C 取消
+
+- AsyncPrompt：终端中使用 prompt_toolkit 的 prompt_async，等待输入期间事件循环照常运行后台任务；
+  非终端（管道、测试）或缺少 prompt_toolkit 时退回到守护线程中读取：等待可被取消，
+  被取消时读取线程不阻塞进程退出，读到的行留给下一次 ask
+- cancel_on_interrupt：在作用域内把 SIGINT 转换为对指定任务的取消，而不是在任意位置抛出 KeyboardInterrupt，
+  流式请求因此能够在 finally 中关闭底层连接
+"""
+import asyncio
+import signal
+import sys
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+
+
+class AsyncPrompt:
+    """
+    异步读取一行输入。与内置 input 一致：Ctrl-C 抛出 KeyboardInterrupt，Ctrl-D / 输入结束抛出 EOFError。
+    """
+
+    def __init__(self, message: str = "❯ ", color: str = "1;36"):
+        self.message = message
+        self.color = color
+        self._session = None
+        self._pending: Future | None = None  # 非终端模式下尚未被取走的一行输入
+
+    def _get_session(self):
+        if self._session is None and sys.stdin.isatty() and sys.stdout.isatty():
+            try:
+                from prompt_toolkit import PromptSession
+            except ImportError:
+                return None
+            self._session = PromptSession()
+        return self._session
+
+    async def ask(self) -> str:
+        session = self._get_session()
+        if session is not None:
+            from prompt_toolkit.formatted_text import ANSI
+            return await session.prompt_async(ANSI(f"\x1b[{self.color}m{self.message}\x1b[0m"))
+        return await self._read_line()
+
+    async def _read_line(self) -> str:
+        """
+        在守护线程中读取一行（语义同 input）。不使用 asyncio.to_thread：取消后阻塞的 input
+        会占住默认线程池，事件循环关闭时要等到下一次回车才能退出。
+        """
+        sys.stdout.write(self.message)
+        sys.stdout.flush()
+        if self._pending is None:
+            self._pending = Future()
+            threading.Thread(target=self._readline_into, args=(self._pending,), daemon=True).start()
+        # shield：取消只结束本次等待，不丢弃读取中的那一行
+        line = await asyncio.shield(asyncio.wrap_future(self._pending))
+        self._pending = None
+        if line is None:
+            raise EOFError
+        return line
+
+    @staticmethod
+    def _readline_into(future: Future):
+        try:
+            line = sys.stdin.readline()
+        except (OSError, ValueError):  # stdin 已关闭，按输入结束处理
+            line = ""
+        future.set_result(line.rstrip("\r\n") if line else None)
+
+
+@dataclass
+class InterruptState:
+    interrupted: bool = False
+
+
+@contextmanager
+def cancel_on_interrupt(task: asyncio.Task) -> Iterator[InterruptState]:
+    """
+    作用域内按下 Ctrl-C 时取消 task 并标记 interrupted。
+    不支持 add_signal_handler 的平台（Windows）上保持默认行为。
+    """
+    state = InterruptState()
+    loop = asyncio.get_running_loop()
+
+    def on_interrupt():
+        state.interrupted = True
+        task.cancel()
+
+    previous = signal.getsignal(signal.SIGINT)
+    try:
+        loop.add_signal_handler(signal.SIGINT, on_interrupt)
+        installed = True
+    except (NotImplementedError, RuntimeError, ValueError):
+        installed = False
+    try:
+        yield state
+    finally:
+        if installed:
+            loop.remove_signal_handler(signal.SIGINT)
+            signal.signal(signal.SIGINT, previous)
@@ -0,0 +1,186 @@
+"""
+流式渲染引擎 - 为打字机式输出提供恒定的单块渲染代价
+
+- 已完成的 Markdown 块（空行分隔、且不在代码围栏内）立即冻结：渲染一次后打印到滚动区，不再重绘
+- Live 区域只保留尾部仍在生成的块，以及思考链的最后若干行
+- 思考链在正文开始时整段打印到滚动区；正文之后再出现的思考链另起一段，同样先在 Live 中显示再冻结
+- 重绘由 Live 以固定帧率驱动，feed() 本身只做追加与切块，不触发渲染
+"""
+import re
+from collections import deque
+from rich.console import Console, Group
+from rich.live import Live
+from rich.markdown import Markdown
+from rich.panel import Panel
+from rich.text import Text
+
+# 围栏起始行：至少三个相同的 ` 或 ~（其后可跟语言标识）
+_FENCE_OPEN = re.compile(r"(`{3,}|~{3,})")
+
+
+class MarkdownBlockSplitter:
+    """增量切分 Markdown 文本：返回新完成的块，并保留尾部未完成的块"""
+
+    def __init__(self):
+        self._lines: list[str] = []
+        self._partial: list[str] = []  # 尚未换行的片段，换行时才拼接，避免长行反复复制
+        self._fence: str | None = None
+
+    def _closes_fence(self, stripped: str) -> bool:
+        """CommonMark：闭合行只含与起始相同的围栏字符，且数量不少于起始围栏（首尾空白除外）"""
+        fence = self._fence
+        return len(stripped) >= len(fence) and stripped == fence[0] * len(stripped)
+
+    def feed(self, text: str) -> list[str]:
+        """追加文本，返回本次新完成的块"""
+        if "\n" not in text:
+            self._partial.append(text)
+            return []
+
+        self._partial.append(text)
+        *complete, tail = "".join(self._partial).split("\n")
+        self._partial = [tail] if tail else []
+        blocks: list[str] = []
+        for line in complete:
+            stripped = line.strip()
+            if self._fence:
+                self._lines.append(line)
+                if self._closes_fence(stripped):
+                    self._fence = None
+                continue
+            opening = _FENCE_OPEN.match(stripped)
+            if opening:
+                self._fence = opening.group(1)
+                self._lines.append(line)
+            elif not stripped:
+                if self._lines:
+                    blocks.append("\n".join(self._lines))
+                    self._lines = []
+            else:
+                self._lines.append(line)
+        return blocks
+
+    @property
+    def open_block(self) -> str:
+        """尾部仍在生成的块"""
+        partial = "".join(self._partial)
+        if not self._lines:
+            return partial
+        return "\n".join(self._lines) + "\n" + partial
+
+    def flush(self) -> str:
+        """结束切分，返回剩余内容"""
+        rest = self.open_block
+        self._lines, self._partial, self._fence = [], [], None
+        return rest
+
+
+class _LiveView:
+    """Live 区域的惰性视图：仅在刷新帧到来且状态变化时重新构建渲染对象"""
+
+    def __init__(self, renderer: "StreamRenderer"):
+        self._renderer = renderer
+        self._version = -1
+        self._cached = Text("Thinking...", style="dim italic")
+
+    def __rich_console__(self, console, options):
+        r = self._renderer
+        if r.version != self._version:
+            self._version = r.version
+            self._cached = r.build_view()
+        yield self._cached
+
+
+class StreamRenderer:
+    """
+    流式对话渲染器：
+        with StreamRenderer(console) as renderer:
+            async for chunk in llm.stream_chat(...):
+                renderer.feed(chunk.content, chunk.reasoning_content)
+    """
+
+    def __init__(self, console: Console, fps: float = 15.0, thinking_lines: int = 8):
+        self.console = console
+        self.version = 0
+        self._splitter = MarkdownBlockSplitter()
+        self._reasoning: list[str] = []
+        self._reasoning_tail: deque[str] = deque(maxlen=thinking_lines)
+        self._reasoning_partial: list[str] = []  # 尚未换行的片段，与切块器同样换行时才拼接
+        self._live = Live(
+            _LiveView(self), console=console,
+            refresh_per_second=fps, transient=True,
+        )
+
+    def __enter__(self) -> "StreamRenderer":
+        self._live.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.finish()
+        finally:
+            self._live.stop()
+
+    # ---------- 输入 ----------
+
+    def feed(self, content: str | None = None, reasoning: str | None = None):
+        """追加增量内容（O(增量) 代价，不触发渲染）"""
+        if reasoning:
+            self._feed_reasoning(reasoning)
+        if content:
+            self._freeze_reasoning()
+            for block in self._splitter.feed(content):
+                self._print(Markdown(block))
+        if reasoning or content:
+            self.version += 1
+
+    def finish(self):
+        """冻结所有剩余内容"""
+        self._freeze_reasoning()
+        rest = self._splitter.flush()
+        if rest.strip():
+            self._print(Markdown(rest))
+        self.version += 1
+
+    # ---------- 内部 ----------
+
+    def _feed_reasoning(self, text: str):
+        self._reasoning.append(text)
+        self._reasoning_partial.append(text)
+        if "\n" in text:
+            *lines, tail = "".join(self._reasoning_partial).split("\n")
+            self._reasoning_tail.extend(lines)
+            self._reasoning_partial = [tail] if tail else []
+
+    def _freeze_reasoning(self):
+        """正文输出时，将尚未打印的思考链一次性打印到滚动区；之后到达的思考链另起一段"""
+        if not self._reasoning:
+            return
+        self._print(self._thinking_panel("".join(self._reasoning)))
+        self._reasoning = []
+        self._reasoning_tail.clear()
+        self._reasoning_partial = []
+
+    def _thinking_panel(self, text: str) -> Panel:
+        return Panel(
+            Text(text, style="dim italic"),
+            title="Thinking", title_align="left",
+            border_style="dim", padding=(0, 1)
+        )
+
+    def _print(self, renderable):
+        # Live 运行期间，console.print 的内容会出现在 Live 区域上方并保留
+        self._live.console.print(renderable)
+
+    def build_view(self):
+        """构建 Live 区域内容：思考链尾部 + 尚未完成的 Markdown 块"""
+        elements = []
+        if self._reasoning:
+            tail = "\n".join([*self._reasoning_tail, "".join(self._reasoning_partial)])
+            elements.append(self._thinking_panel(tail))
+        open_block = self._splitter.open_block
+        if open_block.strip():
+            elements.append(Markdown(open_block))
+        if not elements:
+            return Text("Thinking...", style="dim italic")
+        return Group(*elements)
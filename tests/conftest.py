@@ -24,3 +24,12 @@ if __name__ == "__main__":
 def project_root():
     """获取项目根目录"""
     return Path(__file__).parent.parent
+
+
+@pytest.fixture(autouse=True, scope="session")
+def discard_llm_metrics():
+    """测试中产生的模型请求指标不在退出时写入 ~/.refrain/metrics.json"""
+    yield
+    from refrain.core.llm.chat import metrics
+    if metrics._registry is not None:
+        metrics._registry.reset()
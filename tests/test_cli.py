@@ -1,6 +1,9 @@
 """
 CLI 命令测试
 """
+import re
+import subprocess
+import sys
 import pytest
 from typer.testing import CliRunner
 from refrain.cli import app
@@ -28,3 +31,171 @@ def test_edit_command_file_not_exist():
     result = runner.invoke(app, ["edit", "nonexistent.py", "修改代码"])
     # 应该报错
     assert result.exit_code != 0
+
+
+# ============ 启动耗时回归 ============
+
+# 以 `python -X importtime` 统计的导入耗时预算 (ms)，远高于实测值，只拦截数量级的退化
+IMPORT_BUDGET_MS = 2000
+MODULE_BUDGET_MS = 300
+# 这些命令绝不应触发的重量级依赖（按导入的模块判断，不依赖机器速度）
+HEAVY_MODULES = ["openai", "keyring", "questionary", "refrain.cli.commands.chat"]
+
+_PROBE = """
+import sys
+from refrain.cli import app
+try:
+    app(sys.argv[1:], standalone_mode=False)
+except SystemExit:
+    pass
+print("LOADED=" + ",".join(sorted(sys.modules)), file=sys.stderr)
+"""
+
+
+def _import_profile(*args) -> tuple[float, dict[str, float], set[str]]:
+    """返回 (顶层导入累计耗时 ms, 各模块自身耗时 ms, 已加载模块)"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE, *args],
+        capture_output=True, text=True, timeout=60,
+    )
+    total_us, self_us = 0, {}
+    for own, cumulative, indent, name in re.findall(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)", proc.stderr):
+        self_us[name] = int(own)
+        if not indent:  # 只累加顶层导入的累计值，避免重复计算子模块
+            total_us += int(cumulative)
+    loaded = set(proc.stderr.rsplit("LOADED=", 1)[-1].strip().split(","))
+    return total_us / 1000, {name: us / 1000 for name, us in self_us.items()}, loaded
+
+
+@pytest.mark.parametrize("args", [["version"], ["model", "list"], ["--help"]])
+def test_startup_import_budget(args):
+    """测试常用命令的启动导入开销：不加载重量级 SDK 与无关子命令，总耗时与单模块耗时在宽松预算内"""
+    total_ms, self_ms, loaded = _import_profile(*args)
+    assert "refrain.cli" in loaded  # 探针正常运行
+    assert not loaded & set(HEAVY_MODULES)
+    assert self_ms and total_ms < IMPORT_BUDGET_MS
+    slow = {name: ms for name, ms in self_ms.items() if ms > MODULE_BUDGET_MS}
+    assert not slow
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="依赖 loop.add_signal_handler")
+def test_chat_interrupt_cancels_stream_and_keeps_partial():
+    """测试 Ctrl-C：取消进行中的流并关闭底层响应，已生成的部分回答保留在上下文中"""
+    import asyncio
+    import os
+    import signal
+    from refrain.cli.commands.chat import ChatSession
+    from refrain.core.llm import LLMResponse
+
+    closed = []
+
+    class _EndlessLLM:
+        async def stream_chat(self, messages, tools=None, **kwargs):
+            try:
+                yield LLMResponse(content="partial ", is_delta=True)
+                yield LLMResponse(content="answer", is_delta=True)
+                await asyncio.sleep(30)  # 失控的生成
+                yield LLMResponse(final_content="never")
+            finally:
+                closed.append(True)
+
+    async def run():
+        session = ChatSession()
+        session.llm = _EndlessLLM()
+        session.context.append({"role": "user", "content": "hi"})
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.2, os.kill, os.getpid(), signal.SIGINT)
+        started = loop.time()
+        await session._process_response()
+        return session, loop.time() - started
+
+    session, elapsed = asyncio.run(run())
+    assert elapsed < 5
+    assert closed == [True]
+    assert session.messages[-1] == {"role": "assistant", "content": "partial answer"}
+
+
+def test_stats_command(tmp_path, monkeypatch):
+    """测试 stats 命令：展示累计指标并导出 Prometheus textfile"""
+    from refrain.core.llm.chat import metrics
+
+    path = tmp_path / "metrics.json"
+    monkeypatch.setattr(metrics, "metrics_path", lambda: path)
+    result = runner.invoke(app, ["stats"])
+    assert result.exit_code == 0 and "暂无" in result.stdout
+
+    registry = metrics.MetricsRegistry()
+    stats = registry.profile("deepseek")
+    stats.requests, stats.retries = 3, 1
+    stats.histograms["ttft"].record(0.25)
+    registry.save(path)
+
+    textfile = tmp_path / "refrain.prom"
+    result = runner.invoke(app, ["stats", "--prometheus", str(textfile)])
+    assert result.exit_code == 0
+    assert "deepseek" in result.stdout and "250ms" in result.stdout
+    assert 'refrain_llm_retries_total{profile="deepseek"} 1' in textfile.read_text(encoding="utf-8")
+
+    assert runner.invoke(app, ["stats", "--reset"]).exit_code == 0
+    assert not path.exists()
+
+
+def test_edit_reports_provider_error(tmp_path, monkeypatch):
+    """测试 edit：模型流中途出错时打印一行错误并以非零状态退出"""
+    from refrain.cli.commands import edit
+    from refrain.core.llm import LLMResponse
+
+    class _BrokenLLM:
+        async def stream_chat(self, messages, tools=None, **kwargs):
+            yield LLMResponse(content="正在修改", is_delta=True)
+            raise RuntimeError("upstream 502")
+
+    target = tmp_path / "a.py"
+    target.write_text("x = 1\n", encoding="utf-8")
+    monkeypatch.setattr(edit, "get_llm_backend", lambda: _BrokenLLM())
+    monkeypatch.chdir(tmp_path)
+    result = runner.invoke(app, ["edit", str(target), "改成 2"])
+    assert result.exit_code == 1
+    assert "编辑失败: RuntimeError: upstream 502" in result.stdout
+    assert "Traceback" not in result.stdout
+
+
+def test_edit_stages_writes_until_confirmed(tmp_path, monkeypatch):
+    """测试 edit：写操作先暂存，中途失败也展示差异；用户拒绝时工作区不变，确认后才写入"""
+    import json as _json
+    from refrain.cli.commands import edit
+    from refrain.core.llm import LLMResponse, ToolCall
+
+    target = tmp_path / "a.py"
+    target.write_text("x = 1\n", encoding="utf-8")
+    legacy = tmp_path / "legacy.txt"
+    legacy.write_bytes("旧内容\n".encode("gbk"))
+    calls = [
+        ToolCall(id="1", function_name="write_file", function_args=_json.dumps({"path": "a.py", "content": "x = 2\n"})),
+        ToolCall(id="2", function_name="replace_in_file",
+                 function_args=_json.dumps({"path": "a.py", "old": "x = 2", "new": "x = 3"})),
+        ToolCall(id="3", function_name="write_file", function_args=_json.dumps({"path": "legacy.txt", "content": "新内容\n"})),
+    ]
+
+    class _FailingAfterWriteLLM:
+        def __init__(self):
+            self.steps = 0
+
+        async def stream_chat(self, messages, tools=None, **kwargs):
+            self.steps += 1
+            if self.steps > 1:
+                raise RuntimeError("upstream 502")
+            yield LLMResponse(final_content="", tool_calls=calls)
+
+    monkeypatch.setattr(edit, "get_llm_backend", lambda: _FailingAfterWriteLLM())
+    monkeypatch.chdir(tmp_path)
+    result = runner.invoke(app, ["edit", str(target), "改成 3"], input="n\n")
+    assert result.exit_code == 1
+    assert "+x = 3" in result.stdout and "新内容" in result.stdout and "编辑失败" in result.stdout
+    assert target.read_text(encoding="utf-8") == "x = 1\n"  # 拒绝后未写入
+    assert legacy.read_bytes() == "旧内容\n".encode("gbk")
+
+    result = runner.invoke(app, ["edit", str(target), "改成 3"], input="y\n")
+    assert "已应用 2 个文件" in result.stdout
+    assert target.read_text(encoding="utf-8") == "x = 3\n"
+    assert legacy.read_text(encoding="utf-8") == "新内容\n"
@@ -19,3 +19,958 @@ def test_llm_client():
     # from refrain.core.llm import llm_client
     # assert llm_client is not None
     pass
+
+
+# ============ 流式累加器 ============
+
+def _tool_delta(index, call_id=None, name=None, arguments=None):
+    from types import SimpleNamespace
+    return SimpleNamespace(
+        index=index, id=call_id,
+        function=SimpleNamespace(name=name, arguments=arguments),
+    )
+
+
+def test_stream_accumulator_assembles_tool_calls():
+    """测试工具调用碎片拼装，未变化时复用同一对象"""
+    from refrain.core.llm.chat.stream import StreamAccumulator
+
+    acc = StreamAccumulator()
+    acc.add_content("Hello")
+    acc.add_content(", world")
+    acc.add_tool_deltas([_tool_delta(0, "call_1", "read_file", '{"path": ')])
+    first = acc.tool_calls()
+    assert acc.tool_calls() is first
+
+    acc.add_tool_deltas([_tool_delta(0, arguments='"a.py"}'), _tool_delta(1, "call_2", "search", "{}")])
+    calls = acc.tool_calls()
+    assert calls is not first
+    assert calls[0].args_dict == {"path": "a.py"}
+    assert calls[1].function_name == "search"
+
+    acc.finish_reason = "tool_calls"
+    final = acc.final_frame()
+    assert final.final_content == "Hello, world"
+    assert final.finish_reason == "tool_calls"
+    assert final.tool_calls[0] is calls[0]
+
+
+def test_stream_accumulator_delta_only_frame():
+    """测试 delta_only 模式下增量帧不携带工具调用快照；默认只携带已完成的调用，且不重复拼接参数"""
+    from refrain.core.llm.chat.stream import StreamAccumulator
+
+    acc = StreamAccumulator()
+    acc.add_tool_deltas([_tool_delta(0, "call_1", "read_file", "{}")])
+    frame = acc.delta_frame("x", None, None, delta_only=True)
+    assert frame.is_delta and frame.content == "x"
+    assert frame.tool_calls is None
+
+    acc.add_tool_deltas([_tool_delta(1, "call_2", "write_file", '{"content": "')])
+    for _ in range(1000):  # 长参数流式期间不物化正在拼装的调用
+        acc.add_tool_deltas([_tool_delta(1, arguments="x")])
+        assert [c.id for c in acc.delta_frame("y", None, None).tool_calls] == ["call_1"]
+    assert acc._tools[1].call is None
+    acc.add_tool_deltas([_tool_delta(1, arguments='"}')])
+    assert [c.id for c in acc.delta_frame("z", None, None).tool_calls] == ["call_1", "call_2"]  # 参数完整即完成
+    assert len(acc.final_frame().tool_calls[1].args_dict["content"]) == 1000
+
+    # 单个调用：参数不是 JSON 对象时等到 finish_reason 才视为完成
+    acc = StreamAccumulator()
+    acc.add_tool_deltas([_tool_delta(0, "call_1", "ping", "")])
+    assert acc.finished_tool_calls() is None
+    acc.finish_reason = "tool_calls"
+    assert [c.id for c in acc.delta_frame(None, None, "tool_calls").tool_calls] == ["call_1"]
+
+
+# ============ 共享传输层 ============
+
+def test_http_client_shared_per_base_url():
+    """测试同一事件循环内按 base_url 共享连接池，并在关闭后重建"""
+    import asyncio
+    from refrain.core.llm.chat.transport import get_http_client, aclose_http_clients
+
+    async def scenario():
+        a = get_http_client("https://api.example.com")
+        b = get_http_client("https://api.example.com")
+        c = get_http_client("https://other.example.com", max_connections=4)
+        assert a is b and a is not c
+        await aclose_http_clients()
+        assert a.is_closed and c.is_closed
+        assert get_http_client("https://api.example.com") is not a
+        await aclose_http_clients()
+
+    asyncio.run(scenario())
+
+
+def test_provider_reuses_shared_pool():
+    """测试多个后端实例复用同一个连接池，连接池参数不会透传给 SDK"""
+    import asyncio
+    from refrain.core.llm.chat.openai_provider import OpenAIProvider
+    from refrain.core.llm.chat.transport import aclose_http_clients
+
+    p1 = OpenAIProvider(api_key="k", base_url="https://api.example.com", keepalive_expiry=10)
+    p2 = OpenAIProvider(api_key="k", base_url="https://api.example.com", keepalive_expiry=10)
+    assert p1.pool_params == {"keepalive_expiry": 10} and "keepalive_expiry" not in p1.extra_kwargs
+
+    async def scenario():
+        assert p1.client is p1.client
+        assert p2.client is not p1.client
+        assert p1._pool.http_client is p2._pool.http_client
+        await aclose_http_clients()
+
+    asyncio.run(scenario())
+
+
+def test_backend_cache_keys_on_resolved_api_key(monkeypatch):
+    """测试后端实例按解析后的 API Key 缓存：同一 Profile 的 Key 变化后重建实例"""
+    from types import SimpleNamespace
+    from refrain.core.config import ModelProfile
+    from refrain.core.llm.chat import factory
+
+    profile = ModelProfile(name="p", provider="openai", model="m", api_key_env="REFRAIN_TEST_KEY",
+                           base_url="https://api.example.com")
+    config = SimpleNamespace(config=SimpleNamespace(fallback_models=[], profiles={"p": profile}))
+    monkeypatch.setattr(factory, "get_user_config", lambda: config)
+
+    monkeypatch.setenv("REFRAIN_TEST_KEY", "k1")
+    first = factory.get_llm_backend(alias="p")
+    assert factory.get_llm_backend(alias="p") is first
+    monkeypatch.setenv("REFRAIN_TEST_KEY", "k2")
+    second = factory.get_llm_backend(alias="p")
+    assert second is not first and second.api_key == "k2"
+
+
+# ============ 响应缓存 ============
+
+class _CountingLLM:
+    """记录调用次数的假后端"""
+    default_model = "fake-model"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def chat(self, messages, tools=None, tool_choice="auto", **kwargs):
+        from refrain.core.llm import LLMResponse
+        self.calls += 1
+        return LLMResponse(content=f"answer {self.calls}", final_content=f"answer {self.calls}")
+
+    async def structured_chat(self, messages, response_model, **kwargs):
+        self.calls += 1
+        return None if messages[-1]["content"] == "unparseable" else response_model(label="bug")
+
+    async def stream_chat(self, messages, tools=None, tool_choice="auto", **kwargs):
+        from refrain.core.llm import LLMResponse
+        from refrain.core.llm.chat.schemas import ToolCall
+        self.calls += 1
+        for piece in ("Hello ", "world"):
+            yield LLMResponse(content=piece, is_delta=True)
+        calls = [ToolCall(id=f"c{i}", function_name="grep", function_args="{}") for i in range(2)] if tools else None
+        yield LLMResponse(final_content="Hello world", tool_calls=calls,
+                          finish_reason="tool_calls" if tools else "stop")
+
+
+def test_cached_llm_chat_and_structured(tmp_path):
+    """测试 chat / structured_chat 命中缓存，且磁盘缓存可跨实例复用"""
+    import asyncio
+    from pydantic import BaseModel
+    from refrain.core.llm.chat.cache import CachedLLM, DiskCache
+    from refrain.core.llm.chat.metrics import InstrumentedLLM, MetricsRegistry
+
+    class Intent(BaseModel):
+        label: str
+
+    backend = _CountingLLM()
+    disk = DiskCache(tmp_path / "llm.sqlite")
+    llm = CachedLLM(backend, disk=disk)
+    messages = [{"role": "user", "content": "hi"}]
+
+    async def scenario():
+        first = await llm.chat(messages)
+        assert (await llm.chat(messages)).content == first.content
+        assert (await llm.chat(messages, temperature=0)).content != first.content
+        assert (await llm.structured_chat(messages, Intent)).label == "bug"
+        assert (await llm.structured_chat(messages, Intent)).label == "bug"
+        assert backend.calls == 3
+        # 新实例仅共享磁盘缓存
+        fresh = CachedLLM(_CountingLLM(), disk=disk)
+        assert (await fresh.chat(messages)).content == first.content
+        assert fresh.backend.calls == 0
+        # 缓存键不含包装层次：套上指标层后仍命中同一 Profile 的缓存
+        instrumented = CachedLLM(InstrumentedLLM(_CountingLLM(), "fake-model", MetricsRegistry()), disk=disk)
+        assert (await instrumented.chat(messages)).content == first.content
+        assert CachedLLM(_CountingLLM(), disk=disk, profile="other")._key("chat", messages) != llm._key("chat", messages)
+        # 结构化解析失败（None）不写入缓存
+        failing = [{"role": "user", "content": "unparseable"}]
+        assert await llm.structured_chat(failing, Intent) is None
+        assert await llm.structured_chat(failing, Intent) is None and backend.calls == 5
+
+    asyncio.run(scenario())
+
+
+def test_cached_llm_stream_replay():
+    """测试流式响应被缓存，并在回放模式下以合成增量帧输出"""
+    import asyncio
+    from refrain.core.llm.chat.cache import CachedLLM, CacheMissError, MemoryCache
+
+    memory = MemoryCache()
+    recorder = CachedLLM(_CountingLLM(), memory=memory)
+    replayer = CachedLLM(_CountingLLM(), memory=memory, replay=True, replay_chunk_size=4)
+    messages = [{"role": "user", "content": "stream"}]
+
+    async def collect(llm, msgs, **kwargs):
+        return [frame async for frame in llm.stream_chat(msgs, **kwargs)]
+
+    async def scenario():
+        await collect(recorder, messages)
+        frames = await collect(replayer, messages, delta_only=True)
+        assert "".join(f.content for f in frames if f.content) == "Hello world"
+        assert frames[-1].final_content == "Hello world"
+        assert replayer.backend.calls == 0
+        assert all(f.tool_calls is None and not f.finish_reason for f in frames[:-2])
+
+        # 工具调用与供应商的帧语义一致：正文之后逐个完成，每帧只附带已完成的调用
+        tools = [{"type": "function", "function": {"name": "grep"}}]
+        await collect(recorder, messages, tools=tools)
+        frames = await collect(replayer, messages, tools=tools)
+        deltas = frames[:-1]
+        assert [len(f.tool_calls or []) for f in deltas] == [0, 0, 0, 1, 2]
+        assert [f.tool_calls_started for f in deltas] == [0, 0, 0, 1, 2]
+        assert [f.finish_reason for f in deltas] == [None] * 4 + ["tool_calls"]
+        assert frames[-1].tool_calls == deltas[-1].tool_calls
+        frames = await collect(replayer, messages, tools=tools, delta_only=True)
+        assert all(f.tool_calls is None for f in frames[:-1]) and frames[-2].tool_calls_started == 2
+        with pytest.raises(CacheMissError):
+            await collect(replayer, [{"role": "user", "content": "other"}])
+
+    asyncio.run(scenario())
+
+
+# ============ 批量调度 ============
+
+def test_batch_chat_ordered_with_partial_failure():
+    """测试批量对话：结果按输入顺序返回，失败单独记录，并发数受限"""
+    import asyncio
+    from refrain.core.llm import BaseLLM, LLMResponse
+    from refrain.core.llm.chat.tokens import estimate_messages_tokens
+
+    class EchoLLM(BaseLLM):
+        def __init__(self):
+            self.active = 0
+            self.peak = 0
+
+        async def chat(self, messages, tools=None, tool_choice="auto", **kwargs):
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await asyncio.sleep(0.01)
+            self.active -= 1
+            text = messages[-1]["content"]
+            if text == "boom":
+                raise RuntimeError("provider error")
+            return LLMResponse(content=text.upper())
+
+        async def structured_chat(self, messages, response_model, **kwargs):
+            return response_model(text=messages[-1]["content"] * 40)
+
+        async def stream_chat(self, messages, tools=None, tool_choice="auto", **kwargs):
+            yield LLMResponse()
+
+    llm = EchoLLM()
+    prompts = ["a", "b", "boom", "c", "d", "e"]
+    conversations = [[{"role": "user", "content": p}] for p in prompts]
+    result = asyncio.run(llm.batch_chat(conversations, concurrency=2))
+
+    assert [r.content if r else None for r in result.results] == ["A", "B", None, "C", "D", "E"]
+    assert list(result.errors) == [2] and not result.ok
+    assert llm.peak <= 2
+
+    # 结构化批量完成后按输出对象补扣 TPM
+    from pydantic import BaseModel
+    from refrain.core.llm.chat.batch import RateLimiter
+
+    class Out(BaseModel):
+        text: str
+
+    llm.rate_limiter = RateLimiter(tpm=100_000)
+    result = asyncio.run(llm.batch_structured_chat(conversations[:2], Out))
+    assert result.ok and result.results[0].text == "a" * 40
+    assert llm.rate_limiter.tokens.tokens < 100_000 - sum(estimate_messages_tokens(c) for c in conversations[:2])
+
+
+def test_token_bucket_throttles():
+    """测试令牌桶耗尽后按补充速率等待"""
+    import asyncio
+    import time
+    from refrain.core.llm.chat.batch import TokenBucket
+
+    async def scenario():
+        bucket = TokenBucket(per_minute=600)  # 每秒补充 10 个
+        await bucket.acquire(600)
+        start = time.monotonic()
+        await bucket.acquire(1)
+        return time.monotonic() - start
+
+    assert asyncio.run(scenario()) >= 0.05
+
+    # 进程级共享的桶可在多个事件循环中先后使用
+    shared = TokenBucket(per_minute=6000)
+
+    async def contend():
+        await asyncio.gather(*(shared.acquire(50) for _ in range(4)))
+
+    for _ in range(2):
+        shared.tokens = 0
+        asyncio.run(contend())
+
+
+# ============ 弹性路由 ============
+
+class _ScriptedLLM:
+    """按脚本返回结果或抛出异常的假后端"""
+    rate_limiter = None
+
+    def __init__(self, name, script=(), delay=0.0):
+        self.name = name
+        self.script = list(script)
+        self.delay = delay
+        self.calls = 0
+
+    async def _step(self):
+        import asyncio
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        outcome = self.script.pop(0) if self.script else None
+        if isinstance(outcome, Exception):
+            raise outcome
+
+    async def chat(self, messages, tools=None, tool_choice="auto", **kwargs):
+        from refrain.core.llm import LLMResponse
+        await self._step()
+        return LLMResponse(content=self.name)
+
+    async def stream_chat(self, messages, tools=None, tool_choice="auto", **kwargs):
+        from refrain.core.llm import LLMResponse
+        await self._step()
+        yield LLMResponse(content=self.name, is_delta=True)
+        yield LLMResponse(final_content=self.name)
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_router_retries_then_fails_over():
+    """测试 429 重试、5xx 耗尽后转移，以及 4xx 不转移"""
+    import asyncio
+    from refrain.core.llm.chat.router import RouterLLM, RetryPolicy
+
+    retry = RetryPolicy(max_attempts=2, base_delay=0.001)
+    primary = _ScriptedLLM("primary", [_StatusError(429)])
+    router = RouterLLM([("a", primary), ("b", _ScriptedLLM("backup"))], retry=retry)
+    assert asyncio.run(router.chat([])).content == "primary"
+    assert primary.calls == 2
+
+    failing = _ScriptedLLM("primary", [_StatusError(503), _StatusError(502)])
+    router = RouterLLM([("a", failing), ("b", _ScriptedLLM("backup"))], retry=retry)
+    assert asyncio.run(router.chat([])).content == "backup"
+
+    bad_request = RouterLLM([("a", _ScriptedLLM("p", [_StatusError(400)])), ("b", _ScriptedLLM("b"))], retry=retry)
+    with pytest.raises(_StatusError):
+        asyncio.run(bad_request.chat([]))
+
+
+def test_router_hedges_slow_stream():
+    """测试首帧超过对冲阈值时由备用路由完成流式请求"""
+    import asyncio
+    from refrain.core.llm.chat.router import RouterLLM
+
+    slow = _ScriptedLLM("slow", delay=1.0)
+    router = RouterLLM([("a", slow), ("b", _ScriptedLLM("fast"))], hedge_after=0.02)
+
+    async def scenario():
+        return [f async for f in router.stream_chat([])]
+
+    frames = asyncio.run(scenario())
+    assert frames[0].content == "fast" and frames[-1].final_content == "fast"
+
+
+def test_circuit_breaker_opens_and_recovers():
+    """测试熔断器在连续失败后打开，冷却后进入半开状态"""
+    from refrain.core.llm.chat.router import CircuitBreaker
+
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "half-open" and breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+# ============ 向量存储 ============
+
+def test_numpy_vector_store_search_filter_delete():
+    """测试 NumPy 向量存储：Top-K、元数据过滤、墓碑删除与压缩"""
+    import asyncio
+    import numpy as np
+    from refrain.core.llm.vector import NumpyVectorStore
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 8)).astype(np.float32)
+    store = NumpyVectorStore(initial_capacity=4, compact_ratio=0.5)
+
+    async def scenario():
+        ids = await store.add_texts(
+            [f"doc {i}" for i in range(50)],
+            metadatas=[{"lang": "py" if i % 2 else "md"} for i in range(50)],
+            embeddings=vectors,
+        )
+        hits = await store.similarity_search(vectors[7].tolist(), k=3)
+        assert hits[0]["id"] == ids[7] and hits[0]["score"] > 0.99
+        assert len(hits) == 3
+
+        only_md = await store.similarity_search(vectors[7].tolist(), k=5, filter={"lang": "md"})
+        assert all(h["metadata"]["lang"] == "md" for h in only_md)
+
+        assert await store.delete([ids[7]])
+        hits = await store.similarity_search(vectors[7].tolist(), k=1)
+        assert hits[0]["id"] != ids[7]
+
+        await store.delete(ids[:40])
+        assert len(store) == 10 and store._size == 10  # 已触发压缩
+
+        # 批内重复 ID：最后一次出现生效，删除后不留下无法访问的存活行
+        await store.add_texts(["first", "second"], embeddings=vectors[:2], ids=["d", "d"])
+        assert len(store) == 11 and int(store._alive[:store._size].sum()) == 11
+        assert (await store.similarity_search(vectors[1].tolist(), k=1))[0]["text"] == "second"
+        await store.delete(["d"])
+        assert int(store._alive[:store._size].sum()) == len(store) == 10
+        assert all(h["id"] != "d" for h in await store.similarity_search(vectors[0].tolist(), k=20))
+
+    asyncio.run(scenario())
+
+
+def test_mmap_vector_store_persists_and_compacts(tmp_path):
+    """测试持久化索引：重新打开后可检索，覆盖与删除不重写文件，压缩后数据一致"""
+    import asyncio
+    import numpy as np
+    from refrain.core.llm.vector import MmapVectorStore
+
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(20, 6)).astype(np.float32)
+    ids = [f"chunk-{i}" for i in range(20)]
+
+    async def scenario():
+        store = MmapVectorStore(tmp_path, dtype="float16", background_compaction=False, block_rows=8)
+        await store.add_texts([f"text {i}" for i in range(20)], ids=ids, embeddings=vectors,
+                              metadatas=[{"file": f"f{i % 3}.py"} for i in range(20)])
+        store.close()
+
+        reopened = MmapVectorStore(tmp_path, compact_ratio=0.5, background_compaction=False, block_rows=8)
+        hits = await reopened.similarity_search(vectors[3].tolist(), k=2)
+        assert hits[0]["id"] == "chunk-3" and hits[0]["text"] == "text 3"
+        filtered = await reopened.similarity_search(vectors[3].tolist(), k=20, filter={"file": "f0.py"})
+        assert {h["metadata"]["file"] for h in filtered} == {"f0.py"} and len(filtered) == 7
+
+        # 同 ID 覆盖：旧行成为墓碑
+        await reopened.add_texts(["text 3 v2"], ids=["chunk-3"], embeddings=vectors[3:4])
+        assert len(reopened) == 20
+        assert (await reopened.similarity_search(vectors[3].tolist(), k=1))[0]["text"] == "text 3 v2"
+
+        # 写入失败（元数据无法序列化）整体回滚：墓碑撤销、向量文件截回，之后的写入不受影响
+        rows_before = reopened._seg.rows
+        with pytest.raises(TypeError):
+            await reopened.add_texts(["bad"], ids=["chunk-4"], embeddings=vectors[4:5], metadatas=[{"x": object()}])
+        assert reopened._seg.rows == rows_before and len(reopened) == 20
+        assert (await reopened.similarity_search(vectors[4].tolist(), k=1))[0]["id"] == "chunk-4"
+        await reopened.add_texts(["dup a", "dup b"], ids=["dup", "dup"], embeddings=vectors[5:7])
+        assert len(reopened) == 21 and reopened._seg.rows == rows_before + 1
+        await reopened.delete(["dup"])
+
+        await reopened.delete(ids[:12])
+        assert reopened._seg.gen == 1 and reopened._seg.rows == 8
+        reopened.close()
+
+        final = MmapVectorStore(tmp_path)
+        assert len(final) == 8
+        hits = await final.similarity_search(vectors[15].tolist(), k=1)
+        assert hits[0]["id"] == "chunk-15"
+
+    asyncio.run(scenario())
+
+
+def test_mmap_vector_store_replays_writes_during_compaction(tmp_path):
+    """测试压缩重写阶段不持锁：期间的覆盖、新增与删除在切换时重放，超过分块大小的批量删除，旧连接关闭"""
+    import asyncio
+    import sqlite3
+    import threading
+    import numpy as np
+    from refrain.core.llm.vector import MmapVectorStore
+
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(1201, 4)).astype(np.float32)
+    ids = [f"c{i}" for i in range(1200)]
+
+    async def scenario():
+        store = MmapVectorStore(tmp_path, compact_ratio=0.99, background_compaction=False)
+        await store.add_texts([f"t{i}" for i in range(1200)], ids=ids, embeddings=vectors[:1200])
+        assert await store.delete(ids[:1100])
+        assert len(store) == 100 and store._seg.gen == 0
+
+        entered, resume = threading.Event(), threading.Event()
+        copy_rows = store._copy_rows
+
+        def paused_copy(cursor, matrix, new):
+            # 只拦截第一次（不持锁的重写阶段）
+            store._copy_rows = copy_rows
+            entered.set()
+            resume.wait(5)
+            copy_rows(cursor, matrix, new)
+
+        store._copy_rows = paused_copy
+        old = store._seg
+        compactor = threading.Thread(target=store.compact)
+        compactor.start()
+        assert await asyncio.to_thread(entered.wait, 5)
+
+        # 重写进行中：写入与检索不等待压缩
+        await store.add_texts(["t1150 v2", "fresh"], ids=["c1150", "fresh"], embeddings=vectors[[1150, 1200]])
+        await store.delete(["c1199"])
+        assert (await store.similarity_search(vectors[1200].tolist(), k=1))[0]["id"] == "fresh"
+        resume.set()
+        await asyncio.to_thread(compactor.join)
+
+        assert store._seg.gen == 1 and len(store) == 100 and store._seg.rows == 102
+        with pytest.raises(sqlite3.ProgrammingError):
+            old.conn.execute("SELECT 1")
+        assert (await store.similarity_search(vectors[1150].tolist(), k=1))[0]["text"] == "t1150 v2"
+        assert all(h["id"] != "c1199" for h in await store.similarity_search(vectors[1199].tolist(), k=100))
+        store.close()
+
+        reopened = MmapVectorStore(tmp_path)
+        assert len(reopened) == 100 and reopened._seg.gen == 1
+
+    asyncio.run(scenario())
+
+
+def test_ivf_vector_store_recall_and_incremental_insert():
+    """测试 IVF 近似检索：训练后的召回率、PQ 精排、增量写入与压缩后倒排表一致"""
+    import asyncio
+    import numpy as np
+    from refrain.core.llm.vector import IVFVectorStore, benchmark_recall
+
+    rng = np.random.default_rng(2)
+    centers = rng.normal(size=(16, 16))
+    vectors = (centers[rng.integers(0, 16, 1500)] + 0.2 * rng.normal(size=(1500, 16))).astype(np.float32)
+    queries = vectors[rng.choice(1500, 20, replace=False)] + 0.05 * rng.normal(size=(20, 16))
+
+    async def scenario(**options):
+        store = IVFVectorStore(nlist=16, nprobe=4, train_threshold=1000, **options)
+        ids = await store.add_texts([f"v{i}" for i in range(1000)], embeddings=vectors[:1000])
+        assert store.is_trained
+        # 训练后的增量写入直接进入倒排表
+        ids += await store.add_texts([f"v{i}" for i in range(1000, 1500)], embeddings=vectors[1000:])
+        hits = await store.similarity_search(vectors[1200].tolist(), k=1)
+        assert hits[0]["id"] == ids[1200]
+
+        report = await benchmark_recall(store, queries, k=10)
+        assert report["recall"] >= 0.9
+
+        await store.delete(ids[:600])
+        assert store._size == 900  # 已压缩
+        assert sum(len(p) for p in store._lists) == 900
+        hits = await store.similarity_search(vectors[1300].tolist(), k=1)
+        assert hits[0]["id"] == ids[1300]
+
+    asyncio.run(scenario())
+    asyncio.run(scenario(pq_m=8, rerank=8))
+
+    # pq_m 不能整除维度：构造时即报错；维度未知时首次写入报错且不写入任何行、不进入已训练状态
+    with pytest.raises(ValueError):
+        IVFVectorStore(dim=10, pq_m=3)
+    lazy = IVFVectorStore(pq_m=3, train_threshold=1)
+    with pytest.raises(ValueError):
+        asyncio.run(lazy.add_texts(["a"], embeddings=rng.normal(size=(1, 10))))
+    assert not lazy.is_trained and len(lazy) == 0
+
+
+def test_openai_embedder_batches_and_caches(tmp_path):
+    """测试向量模型：按 token 预算分批、批内去重、磁盘缓存命中后零请求"""
+    import asyncio
+    from refrain.core.llm.vector import OpenAIEmbedder, EmbeddingCache
+
+    class _FakeEmbedder(OpenAIEmbedder):
+        def __init__(self, **kwargs):
+            super().__init__(api_key="sk-test", **kwargs)
+            self.batches: list[list[str]] = []
+
+        async def _embed_batch(self, texts):
+            self.batches.append(texts)
+            return [[float(len(t)), 1.0] for t in texts]
+
+    cache = EmbeddingCache(tmp_path / "embeddings.sqlite")
+    texts = [f"chunk {i} " * 10 for i in range(10)] + ["chunk 0 " * 10]
+
+    async def scenario():
+        embedder = _FakeEmbedder(batch_tokens=60, max_batch_size=3, cache=cache)
+        vectors = await embedder.embed_documents(texts)
+        assert len(vectors) == 11 and vectors[0] == vectors[10]
+        assert sum(len(b) for b in embedder.batches) == 10  # 重复文本只请求一次
+        assert all(len(b) <= 3 for b in embedder.batches) and len(embedder.batches) >= 4
+
+        again = _FakeEmbedder(cache=cache)
+        assert await again.embed_documents(texts) == vectors
+        assert again.batches == []
+
+        other_model = _FakeEmbedder(model="other-model", cache=cache)
+        await other_model.embed_text(texts[0])
+        assert len(other_model.batches) == 1  # 缓存按模型隔离
+
+    asyncio.run(scenario())
+
+
+def test_hashing_embedder_offline_and_parallel():
+    """测试离线哈希向量模型：标识符拆分、语义相近排序、进程池编码结果与单进程一致"""
+    import asyncio
+    import numpy as np
+    from refrain.core.llm.vector import HashingEmbedder, get_local_embedder
+    from refrain.core.llm.vector.local_embedder import split_identifier
+
+    assert split_identifier("HTTPServerError") == ["http", "server", "error"]
+    assert isinstance(get_local_embedder("missing.onnx"), HashingEmbedder)
+    # 找不到向量 Profile 时回退到本地模型，而不是沿用不支持 /embeddings 的对话 Profile
+    from refrain.core.llm.vector import get_embedder
+    assert isinstance(get_embedder("no-such-profile"), HashingEmbedder)
+
+    docs = [
+        "def get_user_config(): return ConfigManager()",
+        "class HTTPServerError(Exception): pass",
+        "async def stream_chat(self, messages): ...",
+    ] * 4
+    embedder = HashingEmbedder(dim=256, workers=2, parallel_threshold=8, chunk_size=3)
+    try:
+        vectors = np.array(asyncio.run(embedder.embed_documents(docs)))
+        assert vectors.shape == (12, 256)
+        assert np.allclose(vectors, embedder.encode(docs), atol=1e-6)
+        query = np.array(asyncio.run(embedder.embed_text("user config")))
+        assert int(np.argmax(vectors[:3] @ query)) == 0
+    finally:
+        embedder.close()
+
+
+def test_bm25_identifier_search_and_persistence(tmp_path):
+    """测试 BM25：标识符拆分命中、删除后压缩、保存与加载结果一致"""
+    from refrain.core.llm.vector import BM25Index
+
+    index = BM25Index(compact_ratio=0.5)
+    index.add(
+        ["a", "b", "c"],
+        [
+            "def get_user_config(): return ConfigManager()",
+            "class HTTPServerError(Exception): pass",
+            "def load_user_profile(user_id): ...",
+        ],
+        [{"lang": "py"}, {"lang": "py"}, {"lang": "md"}],
+    )
+    assert index.search("getUserConfig", k=1)[0]["id"] == "a"
+    assert index.search("server error", k=1)[0]["id"] == "b"
+    assert [h["id"] for h in index.search("user", k=5, filter={"lang": "md"})] == ["c"]
+
+    index.add(["a"], ["def fetch_remote(): pass"])  # 覆盖
+    assert "a" not in [h["id"] for h in index.search("get_user_config")]
+    index.delete(["b"])
+    index.save(tmp_path / "lexical.npz")
+    loaded = BM25Index.load(tmp_path / "lexical.npz")
+    assert len(loaded) == 2
+    assert loaded.search("fetch remote") == index.search("fetch remote")
+
+    # 批内重复 ID：只保留最后一次出现，删除后不留存活行
+    index.add(["d", "d"], ["def foo(): pass", "def bar(): pass"])
+    assert [h["text"] for h in index.search("bar")] == ["def bar(): pass"]
+    assert index.search("foo") == []
+    index.delete(["d"])
+    assert sum(index._alive) == len(index) == 2
+
+    # 文档频率只统计存活文档：墓碑不应拉低 IDF
+    idf = BM25Index(compact_ratio=1.0)
+    idf.add(["x", "y", "z"], ["alpha", "alpha beta", "gamma"])
+    idf.delete(["x"])
+    fresh = BM25Index()
+    fresh.add(["y", "z"], ["alpha beta", "gamma"])
+    assert idf.search("alpha")[0]["score"] == fresh.search("alpha")[0]["score"]
+
+    # 增量保存：小改动只追加日志，快照文件不重写；无改动时 save 为空操作
+    big = BM25Index()
+    big.add([f"doc{i}" for i in range(50)], [f"def func_{i}(): return {i}" for i in range(50)])
+    path = tmp_path / "big.npz"
+    big.save(path)
+    snapshot = path.read_bytes()
+    big.add(["doc3"], ["def renamed_three(): pass"])
+    big.delete(["doc4"])
+    big.save(path)
+    assert path.read_bytes() == snapshot and BM25Index.delta_path(path).exists()
+    assert not big.dirty
+    reloaded = BM25Index.load(path)
+    assert len(reloaded) == 49 and reloaded.search("renamed_three")[0]["id"] == "doc3"
+    assert "doc4" not in [h["id"] for h in reloaded.search("func_4", k=50)] and not reloaded.dirty
+    reloaded.add([f"new{i}" for i in range(20)], [f"def extra_{i}(): pass" for i in range(20)])
+    reloaded.save(path)  # 增量超过阈值：重写快照并清空日志
+    assert not BM25Index.delta_path(path).exists()
+    assert len(BM25Index.load(path)) == 69
+
+
+def test_hybrid_store_fuses_and_routes_symbol_queries():
+    """测试混合检索：RRF 融合两路结果，符号查询不调用向量模型"""
+    import asyncio
+    from refrain.core.llm.vector import HashingEmbedder, HybridStore, NumpyVectorStore, reciprocal_rank_fusion
+
+    fused = reciprocal_rank_fusion([[{"id": "x"}, {"id": "y"}], [{"id": "y"}, {"id": "z"}]], k=3)
+    assert [h["id"] for h in fused] == ["y", "x", "z"] and fused[0]["sources"] == [0, 1]
+
+    class _CountingEmbedder(HashingEmbedder):
+        calls = 0
+
+        async def embed_text(self, text):
+            self.calls += 1
+            return await super().embed_text(text)
+
+    embedder = _CountingEmbedder(dim=128)
+    store = HybridStore(NumpyVectorStore(embedder=embedder))
+    texts = [
+        "def parse_tokens(text): return text.split()",
+        "async def stream_chat(messages): yield frame",
+        "class TokenBucket: refill tokens at a fixed rate",
+    ]
+
+    async def scenario():
+        await store.add_texts(texts, ids=["p", "s", "t"])
+        hits = await store.search("parse_tokens", k=2)
+        assert hits[0]["id"] == "p" and embedder.calls == 0
+        hits = await store.search("rate limiting token bucket", k=2)
+        assert hits[0]["id"] == "t" and embedder.calls == 1
+        await store.delete(["t"])
+        assert len(store) == 2
+        assert all(h["id"] != "t" for h in await store.search("token bucket", k=3, mode="hybrid"))
+
+    asyncio.run(scenario())
+
+
+def test_context_window_policies():
+    """测试上下文窗口：增量计数、旧思考链移除、滚动摘要与整轮滑动窗口"""
+    import asyncio
+    from refrain.core.llm.chat.context import ContextWindow, SlidingWindow, TurnSummary
+    from refrain.core.llm.chat.tokens import estimate_messages_tokens
+
+    def turn(n):
+        return [
+            {"role": "user", "content": f"question {n} " + "x" * 400},
+            {"role": "assistant", "content": f"answer {n} " + "y" * 400, "reasoning_content": "z" * 400},
+        ]
+
+    window = ContextWindow(budget=1000, low_water=0.5)
+    window.pin({"role": "system", "content": "sys"})
+    for n in range(6):
+        window.extend(turn(n))
+    assert window.total_tokens == estimate_messages_tokens(window.messages)
+
+    class _Summarizer:
+        calls = 0
+
+        async def structured_chat(self, messages, response_model, **kwargs):
+            self.calls += 1
+            assert "question 0" in messages[1]["content"]
+            return TurnSummary(summary="earlier turns", open_items=["fix bug"])
+
+    llm = _Summarizer()
+    sent = asyncio.run(window.fit(llm))
+    assert llm.calls == 1
+    assert sent[0]["content"] == "sys" and "earlier turns" in sent[1]["content"]
+    assert [m["content"].split()[1] for m in sent[2:]] == ["4", "4", "5", "5"]  # 保留最近两轮
+    assert "reasoning_content" not in sent[3] and "reasoning_content" in sent[5]
+    assert window.total_tokens == estimate_messages_tokens(window.messages)
+
+    # 无模型时只滑动窗口：按整轮丢弃，降到低水位，最后一轮始终保留
+    window = ContextWindow(budget=1000, low_water=0.5, policies=[SlidingWindow()])
+    window.pin({"role": "system", "content": "sys"})
+    for n in range(6):
+        window.extend(turn(n))
+    sent = asyncio.run(window.fit())
+    assert sent[0]["role"] == "system" and sent[1]["role"] == "user"
+    assert sent[-1]["content"].startswith("answer 5")
+    assert window.total_tokens <= 1000
+    window.clear()
+    assert window.messages == [{"role": "system", "content": "sys"}]
+
+
+def test_cached_token_usage_and_stable_prompt_prefix():
+    """测试前缀缓存：两种协议的缓存命中 token 提取，请求前缀逐字节稳定"""
+    import json
+    from types import SimpleNamespace
+    from refrain.core.llm.chat.prompt import PromptBuilder, UsageMeter
+    from refrain.core.llm.chat.stream import extract_usage
+
+    deepseek = SimpleNamespace(prompt_tokens=100, completion_tokens=10, prompt_cache_hit_tokens=80,
+                               prompt_cache_miss_tokens=20, completion_tokens_details=None)
+    openai = SimpleNamespace(prompt_tokens=200, completion_tokens=5, completion_tokens_details=None,
+                             prompt_tokens_details=SimpleNamespace(cached_tokens=128))
+    assert extract_usage(deepseek)["cached_tokens"] == 80
+    assert extract_usage(openai)["cached_tokens"] == 128
+    assert extract_usage(None)["cached_tokens"] == 0
+
+    meter = UsageMeter()
+    meter.add(extract_usage(deepseek))
+    meter.add(extract_usage(openai))
+    assert meter.cache_hit_ratio == (80 + 128) / 300
+
+    tool_a = {"type": "function", "function": {"name": "a", "parameters": {"type": "object", "properties": {}}}}
+    tool_b = {"function": {"parameters": {"properties": {}, "type": "object"}, "name": "b"}, "type": "function"}
+    history = [{"content": "hi", "role": "user"}, {"role": "assistant", "content": "yo", "tool_calls": None}]
+
+    first, tools_1 = PromptBuilder("sys", [tool_b, tool_a]).build(history, dynamic="time: 1")
+    second, tools_2 = PromptBuilder("sys", [tool_a, tool_b]).build(
+        [*history, {"role": "user", "content": "more"}], dynamic="time: 2")
+    assert json.dumps(tools_1) == json.dumps(tools_2)
+    assert json.dumps(first[:-1]) == json.dumps(second[:len(first) - 1])  # 动态信息之前的前缀一致
+    assert first[1] == {"role": "user", "content": "hi"} and "tool_calls" not in first[2]
+    assert first[-1]["content"] == "time: 1"
+
+
+def test_trace_writer_batches_rotates_and_compresses(tmp_path):
+    """测试对话追踪：后台批量写入紧凑 JSONL，超过大小上限滚动并压缩，队列满时丢弃"""
+    import gzip
+    import json
+    import threading
+    from refrain.core.llm.chat.schemas import LLMResponse
+    from refrain.core.llm.chat.trace import TraceWriter
+    from refrain.core.logger import Sampler
+
+    writer = TraceWriter(tmp_path, max_bytes=2000, flush_interval=0.05)
+    response = LLMResponse(content="好的", final_content="好的", usage={"prompt_tokens": 3})
+    for i in range(20):
+        assert writer.record({"kind": "chat", "messages": [{"role": "user", "content": f"问题 {i}"}],
+                              "response": response})
+    writer.flush()
+    writer.close()
+
+    rotated = sorted(tmp_path.glob("*.jsonl.gz"))
+    assert rotated, "超过 max_bytes 后应滚动并压缩"
+    lines = []
+    for path in rotated:
+        lines += gzip.decompress(path.read_bytes()).decode("utf-8").splitlines()
+    lines += [l for p in tmp_path.glob("*.jsonl") for l in p.read_text(encoding="utf-8").splitlines()]
+    records = [json.loads(l) for l in lines]
+    assert len(records) == writer.written == 20
+    assert {r["messages"][0]["content"] for r in records} == {f"问题 {i}" for i in range(20)}
+    assert records[0]["response"]["final_content"] == "好的" and "ts" in records[0]
+    assert ", " not in lines[0] and "问题" in lines[0]  # 紧凑且保留中文
+
+    # 同一秒内多次滚动：序号文件名互不覆盖，记录不丢失
+    many = TraceWriter(tmp_path / "many", max_bytes=200, batch_size=1, flush_interval=0.05)
+    for i in range(30):
+        many.record({"kind": "chat", "i": i})
+    many.close()
+    recovered = []
+    for path in (tmp_path / "many").iterdir():
+        data = gzip.decompress(path.read_bytes()) if path.suffix == ".gz" else path.read_bytes()
+        recovered += [json.loads(l)["i"] for l in data.decode("utf-8").splitlines()]
+    assert sorted(recovered) == list(range(30))
+    assert len(list((tmp_path / "many").glob("*.gz"))) >= 5
+
+    gate = threading.Event()
+    full = TraceWriter(tmp_path / "full", max_queue=1)
+    full._write = lambda entries: gate.wait()  # 模拟磁盘阻塞
+    results = [full.record({"kind": "chat"}) for _ in range(50)]
+    assert results.count(True) <= 2 and full.dropped == results.count(False)  # 入队从不阻塞
+    gate.set()
+    full.close()
+
+    sampler = Sampler(every=3)
+    assert [sampler() for _ in range(7)] == [True, False, False, True, False, False, True]
+    timed = Sampler(interval=60)
+    assert timed() and not timed()
+
+
+def test_request_metrics_histograms_and_instrumented_stream(tmp_path):
+    """测试请求指标：HDR 直方图精度与合并，流式请求区分上游等待与本地处理耗时、ttft_tool 取首个调用碎片，持久化与 Prometheus 导出"""
+    import asyncio
+    import random
+    from refrain.core.llm import LLMResponse
+    from refrain.core.llm.chat.metrics import Histogram, InstrumentedLLM, MetricsRegistry
+    from refrain.core.llm.chat.schemas import ToolCall
+
+    rng = random.Random(0)
+    samples = sorted(rng.lognormvariate(-2, 1) for _ in range(5000))
+    hist, other = Histogram(), Histogram()
+    for i, value in enumerate(samples):
+        (hist if i % 2 else other).record(value)
+    hist.merge(other)
+    assert hist.count == 5000 and len(hist.counts) < 1000
+    for q in (0.5, 0.9, 0.99):
+        exact = samples[int(q * len(samples)) - 1]
+        assert abs(hist.percentile(q) - exact) / exact < 0.02
+    assert Histogram.from_dict(hist.to_dict()).percentile(0.9) == hist.percentile(0.9)
+
+    class SlowProvider:
+        rate_limiter = None
+        default_model = "m"
+
+        async def stream_chat(self, messages, tools=None, tool_choice="auto", **kwargs):
+            await asyncio.sleep(0.05)
+            yield LLMResponse(content="你", is_delta=True)
+            await asyncio.sleep(0.01)
+            yield LLMResponse(is_delta=True, tool_calls=[ToolCall(id="1", function_name="f", function_args="{}")])
+            yield LLMResponse(final_content="你", usage={"completion_tokens": 40})
+
+    registry = MetricsRegistry()
+    llm = InstrumentedLLM(SlowProvider(), "deepseek", registry)
+
+    async def consume():
+        async for _ in llm.stream_chat([]):
+            await asyncio.sleep(0.04)  # 模拟渲染
+
+    asyncio.run(consume())
+    stats = registry.profile("deepseek")
+    h = stats.histograms
+    assert stats.requests == 1 and stats.output_tokens == 40
+    # 只比较各项测量之间的关系，不依赖绝对耗时（负载高的机器上 sleep 会被拉长）
+    assert h["ttft_tool"].percentile(0.5) > h["ttft"].percentile(0.5) > h["chunk_gap"].max
+    assert h["consume"].count == 3 and h["chunk_gap"].count == 2
+    assert h["chunk_gap"].max < h["consume"].min  # 不含消费方处理帧的时间
+
+    # ttft_tool 在首个工具调用碎片到达时记录，不等参数拼装完成
+    from refrain.core.llm.chat.metrics import ProfileStats, RequestTimer
+    from refrain.core.llm.chat.stream import StreamAccumulator
+    acc = StreamAccumulator()
+    acc.add_tool_deltas([_tool_delta(0, "c0", "grep", '{"pa')])
+    frame = acc.delta_frame(None, None, None)
+    assert frame.tool_calls is None and frame.tool_calls_started == 1
+    timer = RequestTimer(ProfileStats())
+    timer.frame(frame)
+    assert timer.first_tool is not None and timer.stats.histograms["ttft_tool"].count == 1
+    assert h["tokens_per_sec"].count == 1
+
+    path = tmp_path / "metrics.json"
+    registry.save(path)
+    loaded = MetricsRegistry.load(path)
+    loaded.merge(registry)
+    assert loaded.profile("deepseek").requests == 2
+    text = loaded.prometheus()
+    assert 'refrain_llm_requests_total{profile="deepseek"} 2' in text
+    assert 'refrain_llm_ttft_seconds{profile="deepseek",quantile="0.99"}' in text
+    assert "refrain_llm_ttft_seconds_count" in text
+
+    # 重试次数写入路由 / 后端指定的注册表，而不是全局注册表
+    from refrain.core.llm.chat import metrics as metrics_module
+    from refrain.core.llm.chat.router import RouterLLM, RetryPolicy
+    router_registry = MetricsRegistry()
+    router = RouterLLM([("a", _ScriptedLLM("ok", [_StatusError(429)]))],
+                       retry=RetryPolicy(max_attempts=2, base_delay=0.001), metrics=router_registry)
+    asyncio.run(router.chat([]))
+    assert router_registry.profile("a").retries == 1
+
+    # persist_metrics 在锁内合并到已有文件
+    previous, metrics_module._registry = metrics_module._registry, router_registry
+    assert metrics_module.persist_metrics(path).profile("deepseek").requests == 1
+    assert MetricsRegistry.load(path).profile("a").retries == 1 and router_registry.empty
+    metrics_module._registry = previous
@@ -0,0 +1,317 @@
+"""
+Engine 模块测试
+"""
+import asyncio
+import json
+import pytest
+from pathlib import Path
+
+from refrain.engine.orchestrator import tool
+
+
+def test_chunk_python_on_ast_boundaries():
+    """测试 AST 切块：装饰器归入定义、模块级语句合并、大类按方法拆分"""
+    from refrain.engine.indexer import chunk_python
+
+    source = (
+        "import os\n"
+        "X = 1\n"
+        "\n"
+        "@decorator\n"
+        "def top():\n"
+        "    return X\n"
+        "\n"
+        "class Big:\n"
+        "    '''doc'''\n"
+        "    attr = 1\n"
+        "    def a(self):\n"
+        "        return 1\n"
+        "    def b(self):\n"
+        "        return 2\n"
+    )
+    chunks = chunk_python("m.py", source, max_lines=4)
+    layout = [(c.kind, c.name, c.start, c.end) for c in chunks]
+    assert layout == [
+        ("module", "<module>", 1, 3),
+        ("function", "top", 4, 6),
+        ("class", "Big", 8, 10),
+        ("method", "Big.a", 11, 12),
+        ("method", "Big.b", 13, 14),
+    ]
+    assert chunk_python("bad.py", "def (:\n")[0].kind == "text"
+
+
+def test_indexer_incremental_reindex(tmp_path):
+    """测试增量索引：未变化文件不读取，单行修改只重新计算一个块，删除文件同步清理"""
+    from refrain.core.llm.vector import HashingEmbedder
+    from refrain.engine.indexer import Indexer
+
+    project = tmp_path / "proj"
+    (project / "pkg").mkdir(parents=True)
+    (project / ".gitignore").write_text("ignored.py\n")
+    (project / "ignored.py").write_text("def secret():\n    pass\n")
+    (project / "pkg" / "a.py").write_text(
+        "def load_config(path):\n    return open(path).read()\n\n"
+        "def parse_tokens(text):\n    return text.split()\n"
+    )
+    (project / "pkg" / "b.py").write_text("class Cache:\n    def get(self, key):\n        return key\n")
+    (project / "README.md").write_text("# Demo\n\nA demo project.\n")
+
+    async def scenario():
+        indexer = Indexer(project, HashingEmbedder(dim=128), workers=2, batch_size=2)
+        stats = await indexer.run()
+        assert (stats.scanned, stats.changed, stats.chunks_embedded) == (3, 3, 4)
+        assert "ignored.py" not in indexer.manifest.files
+
+        stats = await indexer.run()
+        assert stats.unchanged == 3 and stats.chunks_embedded == 0
+
+        # 在文件头插入一行：行号整体后移，但只有被修改的函数需要重新计算向量
+        (project / "pkg" / "a.py").write_text(
+            "def load_config(path, encoding='utf-8'):\n    return open(path).read()\n\n"
+            "def parse_tokens(text):\n    return text.split()\n"
+        )
+        stats = await indexer.run()
+        assert (stats.changed, stats.chunks_embedded, stats.chunks_reused, stats.chunks_deleted) == (1, 1, 1, 1)
+
+        hits = await indexer.search("parse tokens split text", k=1)
+        assert hits[0]["metadata"]["name"] == "parse_tokens" and hits[0]["metadata"]["start"] == 4
+
+        (project / "pkg" / "b.py").unlink()
+        stats = await indexer.run()
+        assert stats.removed == 1 and len(indexer.store) == 3
+        indexer.close()
+
+        # 重新打开：清单与向量库均已持久化
+        reopened = Indexer(project, HashingEmbedder(dim=128))
+        assert (await reopened.run()).chunks_embedded == 0
+        # 更换向量模型参数时全量重建
+        rebuilt = await Indexer(project, HashingEmbedder(dim=64)).run()
+        assert rebuilt.chunks_embedded == 3
+        reopened.close()
+
+    asyncio.run(scenario())
+
+
+class _ToolScriptLLM:
+    """按脚本逐步返回工具调用或最终回答的假模型"""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.seen = []
+
+    async def stream_chat(self, messages, tools=None, **kwargs):
+        from refrain.core.llm import LLMResponse
+        from refrain.core.llm.chat.schemas import ToolCall
+        self.seen.append([dict(m) for m in messages])
+        step = self.script.pop(0)
+        if isinstance(step, str):
+            yield LLMResponse(content=step, is_delta=True)
+            yield LLMResponse(final_content=step, finish_reason="stop")
+            return
+        calls = [ToolCall(id=f"c{i}", function_name=name, function_args=args) for i, (name, args) in enumerate(step)]
+        yield LLMResponse(final_content="", tool_calls=calls, finish_reason="tool_calls")
+
+
+def test_orchestrator_runs_read_only_tools_concurrently():
+    """测试编排器：同轮只读工具并发执行，超时/未知工具回传错误，结果按调用顺序写回"""
+    from refrain.engine.orchestrator import Orchestrator, ToolSet
+
+    running = []
+    peak = 0
+
+    @tool(read_only=True)
+    async def slow_read(name: str) -> str:
+        """读取"""
+        nonlocal peak
+        running.append(name)
+        peak = max(peak, len(running))
+        await asyncio.sleep(0.05)
+        running.remove(name)
+        return f"content of {name}"
+
+    @tool(read_only=True, timeout=0.05)
+    async def hang() -> str:
+        await asyncio.sleep(5)
+
+    llm = _ToolScriptLLM([
+        [("slow_read", '{"name": "a"}'), ("slow_read", '{"name": "b"}'), ("slow_read", '{"name": "c"}'),
+         ("hang", ""), ("missing", "{}")],
+        "done",
+    ])
+    orchestrator = Orchestrator(llm, ToolSet([slow_read, hang]), system_prompt="sys")
+
+    async def run():
+        return [e async for e in orchestrator.run("task")]
+
+    events = asyncio.run(run())
+
+    assert peak == 3  # 三个只读调用同时处于执行中
+    assert [e.type for e in events].count("tool_result") == 5
+    assert events[-1].type == "final" and events[-1].content == "done"
+
+    tool_messages = [m for m in orchestrator.messages if m["role"] == "tool"]
+    assert [m["tool_call_id"] for m in tool_messages] == ["c0", "c1", "c2", "c3", "c4"]
+    assert tool_messages[1]["content"] == "content of b"
+    assert "超时" in tool_messages[3]["content"]
+    assert "未知工具" in tool_messages[4]["content"]
+    assert llm.seen[1][2]["tool_calls"][0]["function"]["name"] == "slow_read"
+
+
+def test_orchestrator_serializes_writes_and_enforces_budget():
+    """测试写工具作为屏障按顺序执行，且步数耗尽时停止"""
+    from refrain.engine.orchestrator import Orchestrator, ToolSet, tool
+
+    order = []
+
+    @tool()
+    async def write(tag: str) -> str:
+        await asyncio.sleep(0.05 if tag == "first" else 0)
+        order.append(tag)
+        return "ok"
+
+    step = [("write", '{"tag": "first"}'), ("write", '{"tag": "second"}')]
+    llm = _ToolScriptLLM([step, step, "never reached"])
+    orchestrator = Orchestrator(llm, ToolSet([write]), max_steps=2)
+
+    async def run():
+        return [e async for e in orchestrator.run("task")]
+
+    events = asyncio.run(run())
+    assert order == ["first", "second", "first", "second"]
+    assert events[-1].type == "budget_exhausted"
+
+
+# 与常见用法一致：@tool 用 Tool 对象替换模块中的同名函数（进程池无法直接 pickle 原函数）
+@tool(name="worker_pid", cpu_bound=True)
+def worker_pid(n: int) -> list[int]:
+    """返回执行所在的进程号与计算结果"""
+    import os
+    return [os.getpid(), sum(i * i for i in range(n))]
+
+
+def test_dispatcher_runs_cpu_bound_tool_in_process_pool():
+    """测试 cpu_bound 工具：模块中的同名对象已是 Tool 时仍能按引用在子进程中执行"""
+    import os
+    from refrain.core.llm.chat.schemas import ToolCall
+    from refrain.engine.orchestrator import ToolDispatcher, ToolSet
+
+    dispatcher = ToolDispatcher(ToolSet([worker_pid, tool(cpu_bound=True)(lambda n: n)]), process_workers=1)
+    try:
+        outcome = asyncio.run(dispatcher.execute(ToolCall(id="1", function_name="worker_pid", function_args='{"n": 10}')))
+        assert not outcome.error, outcome.content
+        pid, total = json.loads(outcome.content)
+        assert total == 285 and pid != os.getpid()
+        # 无法按引用导入的函数（lambda）退回线程池执行
+        local = asyncio.run(dispatcher.execute(ToolCall(id="2", function_name="<lambda>", function_args='{"n": 3}')))
+        assert local.content == "3"
+    finally:
+        dispatcher.close()
+
+
+def test_file_skills_stay_inside_root(tmp_path: Path):
+    """测试文件技能：读写与唯一替换，拒绝越界路径"""
+    from refrain.skills import SkillContext, SkillRegistry
+
+    (tmp_path / "a.py").write_text("x = 1\ny = 2\n", encoding="utf-8")
+    tools = SkillRegistry(SkillContext(tmp_path), discover_entry_points=False, cache_path=False)
+
+    async def call(name, **args):
+        return await tools.lookup(name).run(args)
+
+    assert asyncio.run(call("read_file", path="a.py", start_line=2)) == "    2| y = 2"
+    asyncio.run(call("replace_in_file", path="a.py", old="y = 2", new="y = 3"))
+    assert (tmp_path / "a.py").read_text(encoding="utf-8") == "x = 1\ny = 3\n"
+    with pytest.raises(ValueError):
+        asyncio.run(call("replace_in_file", path="a.py", old="nope", new=""))
+    with pytest.raises(PermissionError):
+        asyncio.run(call("read_file", path="../outside.txt"))
+    assert tools.lookup("read_file").read_only and not tools.lookup("write_file").read_only
+
+    # 读取之后文件被外部修改：拒绝基于旧内容的修改，重新读取后可以继续
+    from refrain.utils.fs import FileConflictError
+    asyncio.run(call("read_file", path="a.py"))
+    (tmp_path / "a.py").write_text("x = 1\ny = 4\n", encoding="utf-8")
+    with pytest.raises(FileConflictError):
+        asyncio.run(call("replace_in_file", path="a.py", old="x = 1", new="x = 0"))
+    asyncio.run(call("read_file", path="a.py"))
+    asyncio.run(call("replace_in_file", path="a.py", old="x = 1", new="x = 0"))
+    assert (tmp_path / "a.py").read_text(encoding="utf-8") == "x = 0\ny = 4\n"
+
+
+def test_orchestrator_speculates_read_only_calls():
+    """测试推测执行：参数完整后即在流结束前开始执行（含单调用的轮次），终局帧不一致的推测结果被丢弃"""
+    from types import SimpleNamespace
+    from refrain.core.llm.chat.schemas import ToolCall
+    from refrain.core.llm.chat.stream import StreamAccumulator
+    from refrain.engine.orchestrator import Orchestrator, ToolDispatcher, ToolSet, tool
+    from refrain.engine.orchestrator.speculation import Speculator
+
+    timeline = []
+
+    @tool(read_only=True)
+    async def read(name: str) -> str:
+        timeline.append(f"start:{name}")
+        await asyncio.sleep(0.05)
+        return name.upper()
+
+    def delta(index, call_id=None, name=None, arguments=None):
+        return SimpleNamespace(index=index, id=call_id, function=SimpleNamespace(name=name, arguments=arguments))
+
+    class _ProviderLikeLLM:
+        """与 OpenAIProvider 相同：碎片经 StreamAccumulator 累积后产出增量帧与终局帧"""
+
+        def __init__(self, chunks):
+            self.chunks = chunks
+            self.turn = 0
+
+        async def stream_chat(self, messages, tools=None, delta_only=False, **kwargs):
+            self.turn += 1
+            acc = StreamAccumulator()
+            if self.turn > 1:
+                acc.add_content("done")
+                yield acc.final_frame()
+                return
+            for chunk in self.chunks:
+                acc.add_tool_deltas(chunk)
+                yield acc.delta_frame(None, None, None, delta_only)
+                await asyncio.sleep(0.02)  # 模型仍在生成
+            acc.finish_reason = "tool_calls"
+            yield acc.delta_frame(None, None, "tool_calls", delta_only)
+            timeline.append("final")
+            yield acc.final_frame()
+
+    async def run(chunks, speculative=True):
+        orchestrator = Orchestrator(_ProviderLikeLLM(chunks), ToolSet([read]), speculative=speculative)
+        [e async for e in orchestrator.run("task")]
+        return [m["content"] for m in orchestrator.messages if m["role"] == "tool"]
+
+    two_calls = [
+        [delta(0, "c0", "read", '{"name": ')],
+        [delta(0, arguments='"a"}')],
+        [delta(1, "c1", "read", '{"name": "dra')],
+        [delta(1, arguments='ft"}')],
+    ]
+    assert asyncio.run(run(two_calls)) == ["A", "DRAFT"]
+    assert timeline == ["start:a", "start:draft", "final"]  # 两个读取都在终局帧之前开始
+
+    # 单个调用的轮次同样在流结束前开始执行
+    timeline.clear()
+    assert asyncio.run(run([[delta(0, "c0", "read", '{"name": "solo"}')]])) == ["SOLO"]
+    assert timeline == ["start:solo", "final"]
+
+    # 关闭推测执行：工具在终局帧之后才执行
+    timeline.clear()
+    asyncio.run(run(two_calls, speculative=False))
+    assert timeline[0] == "final"
+
+    # 终局帧与推测不一致：推测任务被取消丢弃，只复用一致的结果
+    async def settle():
+        speculator = Speculator(ToolDispatcher(ToolSet([read])))
+        speculator.observe([ToolCall(id="c0", function_name="read", function_args='{"name": "a"}'),
+                            ToolCall(id="c1", function_name="read", function_args='{"name": "draft"}')])
+        reusable = speculator.settle([ToolCall(id="c0", function_name="read", function_args='{"name": "a"}'),
+                                      ToolCall(id="c1", function_name="read", function_args='{"name": "b"}')])
+        return list(reusable), speculator.misses
+
+    assert asyncio.run(settle()) == (["c0"], 1)
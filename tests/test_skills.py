@@ -0,0 +1,148 @@
+"""
+Skills 模块测试
+"""
+import asyncio
+import sys
+import pytest
+from pathlib import Path
+
+
+def test_skill_schema_derived_once_and_validated():
+    """测试技能描述：由类型注解生成并按类缓存，参数经预编译校验器转换"""
+    from pydantic import ValidationError
+    from refrain.skills import Skill
+
+    class CountLines(Skill):
+        """统计行数"""
+        read_only = True
+
+        def execute(self, path: str, limit: int = 10, tags: list[str] | None = None) -> int:
+            return limit
+
+    spec = CountLines.tool_spec()
+    assert spec is CountLines().spec()  # 同一个缓存对象
+    fn = spec["function"]
+    assert fn["name"] == "count_lines" and fn["description"] == "统计行数"
+    assert fn["parameters"]["required"] == ["path"]
+    assert fn["parameters"]["properties"]["limit"] == {"type": "integer", "default": 10}
+
+    skill = CountLines()
+    assert asyncio.run(skill.run({"path": "a", "limit": "3"})) == 3  # 宽松模式下字符串转为整数
+    with pytest.raises(ValidationError):
+        skill.validate({"limit": 1})  # 缺少 path
+    with pytest.raises(ValidationError):
+        skill.validate({"path": "a", "bogus": 1})  # 未声明的参数
+
+
+def test_registry_uses_cached_specs_without_importing(tmp_path: Path, monkeypatch):
+    """测试注册中心：描述缓存命中时不导入技能模块，调用时才加载"""
+    from refrain.engine.orchestrator import ToolDispatcher
+    from refrain.core.llm.chat.schemas import ToolCall
+    from refrain.skills import SkillRegistry
+
+    (tmp_path / "demo_skill_mod.py").write_text(
+        "from refrain.skills import Skill\n"
+        "class Shout(Skill):\n"
+        "    '''大写'''\n"
+        "    read_only = True\n"
+        "    def execute(self, text: str) -> str:\n"
+        "        return text.upper()\n",
+        encoding="utf-8",
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    cache = tmp_path / "skills.json"
+
+    def build():
+        registry = SkillRegistry(builtins=False, discover_entry_points=False, cache_path=cache)
+        registry.register("demo_skill_mod:Shout")
+        registry._save_cache()
+        return registry
+
+    build()
+    assert cache.exists()
+    sys.modules.pop("demo_skill_mod")
+
+    registry = build()
+    assert "demo_skill_mod" not in sys.modules
+    assert registry.specs()[0]["function"]["name"] == "shout"
+    assert registry.lookup("shout").read_only
+
+    dispatcher = ToolDispatcher(registry)
+    ok = asyncio.run(dispatcher.execute(ToolCall(id="1", function_name="shout", function_args='{"text": "hi"}')))
+    assert ok.content == "HI" and "demo_skill_mod" in sys.modules
+    bad = asyncio.run(dispatcher.execute(ToolCall(id="2", function_name="shout", function_args="{}")))
+    assert bad.error and "ValidationError" in bad.content
+    sys.modules.pop("demo_skill_mod")
+
+    # 基类或 refrain 版本变化（base_fingerprint 不同）时缓存失效，重新导入技能模块
+    from refrain.skills.registry import registry as registry_module
+    monkeypatch.setattr(registry_module, "base_fingerprint", lambda: "changed")
+    build()
+    assert "demo_skill_mod" in sys.modules
+    sys.modules.pop("demo_skill_mod")
+
+
+def test_register_skill_decorator():
+    """测试装饰器登记的技能会出现在新建的注册中心中"""
+    from refrain.skills import Skill, SkillRegistry, register_skill
+    from refrain.skills.registry.registry import DECLARED_SKILLS
+
+    @register_skill
+    class Ping(Skill):
+        """连通性检查"""
+        read_only = True
+
+        async def execute(self) -> str:
+            return "pong"
+
+    try:
+        registry = SkillRegistry(discover_entry_points=False, cache_path=False)
+        assert {"ping", "read_file", "write_file"} <= set(registry.names())
+        assert asyncio.run(registry.lookup("ping").run({})) == "pong"
+    finally:
+        DECLARED_SKILLS.pop("ping")
+
+
+def test_code_search_skips_binary_and_ignored_files(tmp_path: Path):
+    """测试代码搜索：跳过二进制与忽略文件、mmap 路径、定义行优先、达到上限时截断"""
+    from refrain.skills.toolbox.search import CodeSearcher, format_matches
+
+    (tmp_path / ".gitignore").write_text("build/\n", encoding="utf-8")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "gen.py").write_text("load_config()\n", encoding="utf-8")
+    (tmp_path / "blob.bin").write_bytes(b"\0\0load_config")
+    (tmp_path / "pkg" / "tests").mkdir(parents=True)
+    (tmp_path / "pkg" / "tests" / "test_cfg.py").write_text(
+        "def test_it():\n    load_config()\n    load_config()\n", encoding="utf-8")
+    (tmp_path / "pkg" / "cfg.py").write_text(
+        "import os\n\ndef load_config(path):\n    return path\n", encoding="utf-8")
+    (tmp_path / "pkg" / "notes.md").write_text("load_config\n", encoding="utf-8")
+
+    searcher = CodeSearcher(tmp_path, workers=4, mmap_threshold=1)  # 全部走 mmap
+    results, truncated = searcher.grep(r"load_config\(")
+    assert not truncated
+    assert [m.path for m in results] == ["pkg/cfg.py", "pkg/tests/test_cfg.py"]
+    assert results[0].lines == [(3, "def load_config(path):")]
+    assert results[1].lines == [(2, "load_config()"), (3, "load_config()")]
+
+    results, _ = CodeSearcher(tmp_path).grep("LOAD_CONFIG", glob="*.md", ignore_case=True)
+    assert [m.path for m in results] == ["pkg/notes.md"]
+
+    results, truncated = CodeSearcher(tmp_path).grep("load_config", max_results=1)
+    assert truncated and "已达上限" in format_matches(results, truncated)
+    assert sum(len(m.lines) for m in results) == 1
+
+    # 先排序再截取：保留相关度最高的匹配，而不是先完成扫描的目录
+    results, truncated = CodeSearcher(tmp_path, workers=4).grep(r"load_config\(", max_results=2)
+    assert truncated
+    assert [(m.path, m.lines) for m in results] == [
+        ("pkg/cfg.py", [(3, "def load_config(path):")]), ("pkg/tests/test_cfg.py", [(2, "load_config()")])
+    ]
+
+    results, truncated = CodeSearcher(tmp_path).grep(r"load_config\(", max_results=3)
+    assert not truncated and sum(len(m.lines) for m in results) == 3  # 恰好达到上限不算截断
+
+    paths, truncated = CodeSearcher(tmp_path).find("pkg/**/*.py")
+    assert paths == ["pkg/cfg.py", "pkg/tests/test_cfg.py"] and not truncated
+    assert CodeSearcher(tmp_path).find("pkg/**/*.py", limit=2) == (paths, False)
+    assert CodeSearcher(tmp_path).find("pkg/**/*.py", limit=1) == (["pkg/cfg.py"], True)
@@ -7,18 +7,215 @@ from pathlib import Path
 
 def test_read_file(sample_python_file):
     """测试文件读取"""
-    # TODO: 实现 fs 模块后取消注释
-    # from refrain.utils.fs import read_file
-    # content = read_file(sample_python_file)
-    # assert "def hello" in content
-    pass
+    from refrain.utils.fs import read_file
+    content = read_file(sample_python_file)
+    assert "def hello" in content
 
 
 def test_write_file(tmp_path):
-    """测试文件写入"""
-    # TODO: 实现 fs 模块后取消注释
-    # from refrain.utils.fs import write_file
-    # test_file = tmp_path / "test.txt"
-    # write_file(test_file, "Hello, World!")
-    # assert test_file.read_text() == "Hello, World!"
-    pass
+    """测试文件写入：原子替换且不残留临时文件，版本不一致时拒绝写入"""
+    from refrain.utils.fs import ABSENT, FileConflictError, read_versioned, write_file
+    test_file = tmp_path / "test.txt"
+    write_file(test_file, "Hello, World!", expected_hash=ABSENT)
+    assert test_file.read_text() == "Hello, World!"
+
+    _, version = read_versioned(test_file)
+    test_file.write_text("changed by someone else")
+    with pytest.raises(FileConflictError):
+        write_file(test_file, "stale edit", expected_hash=version)
+    assert test_file.read_text() == "changed by someone else"
+    assert [p.name for p in tmp_path.iterdir()] == ["test.txt"]
+
+
+def test_file_lock_is_per_file(tmp_path):
+    """测试文件锁：同一文件互斥（线程间同样生效），不同文件互不阻塞"""
+    from refrain.utils.fs import FileLock, LockTimeoutError
+    locks = tmp_path / "locks"
+    with FileLock(tmp_path / "a.py", lock_directory=locks):
+        with FileLock(tmp_path / "b.py", timeout=0.1, lock_directory=locks):
+            pass
+        with pytest.raises(LockTimeoutError):
+            FileLock(tmp_path / "a.py", timeout=0.05, lock_directory=locks).acquire()
+    with FileLock(tmp_path / "a.py", timeout=0.1, lock_directory=locks):
+        pass
+
+
+def test_file_transaction_rolls_back(tmp_path, monkeypatch):
+    """测试多文件事务：校验失败时不写任何文件，写入中途失败时回滚已写入的文件"""
+    from refrain.utils.fs import FileConflictError, FileTransaction, file_hash
+    from refrain.utils.fs import ops
+
+    a, b = tmp_path / "a.txt", tmp_path / "b.txt"
+    a.write_text("a0")
+    b.write_text("b0")
+
+    with pytest.raises(FileConflictError):
+        with FileTransaction() as tx:
+            tx.write(a, "a1")
+            tx.write(b, "b1", expected_hash="stale")
+    assert (a.read_text(), b.read_text()) == ("a0", "b0")
+
+    real_write = ops.atomic_write
+
+    def failing_write(path, data, *args, **kwargs):
+        if path.name == "b.txt":
+            raise OSError("disk full")
+        return real_write(path, data, *args, **kwargs)
+
+    monkeypatch.setattr(ops, "atomic_write", failing_write)
+    tx = FileTransaction()
+    tx.write(a, "a1", expected_hash=file_hash(a))
+    tx.write(tmp_path / "new.txt", "n")
+    tx.write(b, "b1")
+    with pytest.raises(OSError):
+        tx.commit()
+    assert (a.read_text(), b.read_text()) == ("a0", "b0")
+    assert not (tmp_path / "new.txt").exists()
+
+    monkeypatch.setattr(ops, "atomic_write", real_write)
+    with FileTransaction() as tx:
+        tx.write(a, "a1")
+        tx.delete(b)
+    assert a.read_text() == "a1" and not b.exists()
+
+
+def test_markdown_block_splitter():
+    """测试流式 Markdown 切块：空行分隔，代码围栏内不切分"""
+    from refrain.utils.ui import MarkdownBlockSplitter
+
+    splitter = MarkdownBlockSplitter()
+    assert splitter.feed("# Title\npara") == []
+    blocks = splitter.feed("graph\n\n```py\nx = 1\n\ny = 2\n```\n\ntail")
+    assert blocks == ["# Title\nparagraph", "```py\nx = 1\n\ny = 2\n```"]
+    assert splitter.open_block == "tail"
+    assert splitter.flush() == "tail"
+
+    # 围栏内的 ```python 不是闭合行；闭合需要相同字符且不少于起始长度
+    blocks = splitter.feed("````md\n```python\n\n```\n````  \n\nnext\n\n")
+    assert blocks == ["````md\n```python\n\n```\n````  ", "next"]
+    for ch in "ab":  # 无换行的片段逐个累积
+        splitter.feed(ch)
+    assert splitter.open_block == "ab"
+    assert splitter.feed("c\n\n") == ["abc"]
+
+
+def test_stream_renderer_freezes_blocks():
+    """测试渲染器将完成的块与思考链冻结输出"""
+    from io import StringIO
+    from rich.console import Console
+    from refrain.utils.ui import StreamRenderer
+
+    console = Console(file=StringIO(), force_terminal=False, width=60)
+    with StreamRenderer(console) as renderer:
+        renderer.feed(reasoning="plan step\n")
+        renderer.feed(content="first block\n\nsecond")
+    output = console.file.getvalue()
+    assert output.index("plan step") < output.index("first block") < output.index("second")
+
+    # 正文之后到达的思考链不会丢失：先显示在 Live 区域，再冻结为新的一段
+    console = Console(file=StringIO(), force_terminal=False, width=60)
+    with StreamRenderer(console) as renderer:
+        renderer.feed(reasoning="plan")
+        renderer.feed(content="answer\n\n")
+        renderer.feed(reasoning="re")
+        renderer.feed(reasoning="check\nmore")
+        assert "recheck" in renderer.build_view().renderables[0].renderable.plain
+        renderer.feed(content="done")
+    output = console.file.getvalue()
+    assert output.index("plan") < output.index("answer") < output.index("recheck") < output.index("more") < output.index("done")
+
+
+def test_async_prompt_fallback_is_cancellable(monkeypatch):
+    """测试非终端输入：等待可被取消且不拖住事件循环退出，未取走的一行留给下一次读取，输入结束抛出 EOFError"""
+    import asyncio
+    import os
+    import sys
+    from refrain.utils.ui import AsyncPrompt
+
+    read_fd, write_fd = os.pipe()
+    monkeypatch.setattr(sys, "stdin", os.fdopen(read_fd, "r"))
+    prompt = AsyncPrompt("> ")
+
+    async def cancelled():
+        task = asyncio.create_task(prompt.ask())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancelled())  # 读取线程仍在阻塞，但事件循环照常关闭
+
+    async def answered():
+        os.write(write_fd, b"hello\nworld\n")
+        assert await prompt.ask() == "hello"
+        assert await prompt.ask() == "world"
+        os.close(write_fd)
+        with pytest.raises(EOFError):
+            await prompt.ask()
+
+    asyncio.run(answered())
+    sys.stdin.close()
+
+
+def test_gitignore_rules_and_walk(tmp_path):
+    """测试 .gitignore 匹配：锚定、目录规则、取反、嵌套 .gitignore 与目录剪枝"""
+    from refrain.utils.fs import IgnoreRules, walk_files
+
+    rules = IgnoreRules.from_lines(["*.log", "!keep.log", "/build", "docs/**/*.tmp", "cache/"])
+    assert rules.is_ignored("a/b/debug.log")
+    assert not rules.is_ignored("a/keep.log")
+    assert rules.is_ignored("build", is_dir=True) and not rules.is_ignored("src/build", is_dir=True)
+    assert rules.is_ignored("docs/x/y/z.tmp") and not rules.is_ignored("src/z.tmp")
+    assert rules.is_ignored("src/cache", is_dir=True) and not rules.is_ignored("src/cache")
+
+    for rel in ["main.py", "debug.log", "build/out.py", "pkg/mod.py", "pkg/gen.py", "pkg/data/x.py", ".git/HEAD"]:
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_text("x")
+    (tmp_path / ".gitignore").write_text("*.log\n/build/\n")
+    (tmp_path / "pkg" / ".gitignore").write_text("gen.py\ndata/\n")
+
+    files = [rel for rel, _ in walk_files(tmp_path)]
+    assert files == [".gitignore", "main.py", "pkg/.gitignore", "pkg/mod.py"]
+
+
+def test_diff_opcodes_reconstruct_target():
+    """测试行级 diff：opcode 连续覆盖两侧，且按 opcode 可以还原出新序列"""
+    import random
+    from refrain.utils.ui import diff_opcodes
+
+    rng = random.Random(0)
+    for _ in range(500):
+        a = [rng.choice("abcd") for _ in range(rng.randint(0, 20))]
+        b = [rng.choice("abcd") for _ in range(rng.randint(0, 20))]
+        rebuilt, i, j = [], 0, 0
+        for tag, i1, i2, j1, j2 in diff_opcodes(a, b):
+            assert (i1, j1) == (i, j)
+            if tag == "equal":
+                assert a[i1:i2] == b[j1:j2]
+            rebuilt += b[j1:j2]
+            i, j = i2, j2
+        assert (i, j) == (len(a), len(b)) and rebuilt == b
+
+    # 最短编辑：与 difflib 的经典示例一致
+    opcodes = diff_opcodes("abcabba", "cbabac")
+    assert sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == "equal") == 4
+
+
+def test_file_diff_on_large_file():
+    """测试大文件 diff：2 万行中的局部修改，块头与行内高亮正确"""
+    from refrain.utils.ui import FileDiff
+    from refrain.utils.ui.diff import inline_changes
+
+    old = [f"value_{i} = compute({i})" for i in range(20000)]
+    new = list(old)
+    new[100] = "value_100 = compute(101)"
+    new.insert(15000, "extra = 1")
+
+    diff = FileDiff("\n".join(old), "\n".join(new), "gen.py")
+    assert diff.stats == (2, 1)
+    assert [h.header for h in diff.hunks] == ["@@ -98,7 +98,7 @@", "@@ -14998,6 +14998,7 @@"]
+    assert "-value_100 = compute(100)\n+value_100 = compute(101)" in diff.unified()
+    assert len(diff.pages(page_lines=8)) == 2
+
+    old_spans, new_spans = inline_changes("x = compute(100)", "x = compute(101)")
+    assert old_spans == [(12, 15)] and new_spans == [(12, 15)]